@@ -0,0 +1,165 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+from question_bank import ANY
+
+if TYPE_CHECKING:
+    from irt import BankItems, ItemInformationTable
+
+logger = logging.getLogger(__name__)
+
+# Item difficulty on the ability scale for questions without IRT parameters
+DEFAULT_DIFFICULTY = {"easy": -1.0, "medium": 0.0, "hard": 1.0}
+
+
+def item_parameters(question: dict) -> Tuple[float, float, float]:
+    """3PL (discrimination, difficulty, guessing) of a question.
+
+    Questions may carry calibrated `discrimination`, `irt_difficulty` and
+    `guessing` fields; otherwise the difficulty label is mapped onto the
+    ability scale and guessing is one in the number of options.
+    """
+    a = question.get("discrimination", 1.0)
+    b = question.get("irt_difficulty", DEFAULT_DIFFICULTY.get(question["difficulty"], 0.0))
+    c = question.get("guessing", 1 / max(2, len(question["options"])))
+    return a, b, c
+
+
+def bank_items(questions: Sequence[dict]) -> "BankItems":
+    """The IRT arrays of some questions. The numerical side (`irt`) is only
+    imported here and when a table is built, so workers start without numpy."""
+    from irt import BankItems
+    return BankItems([item_parameters(q) for q in questions], [q["correct_answer"] for q in questions])
+
+
+@dataclass
+class AdaptiveStep:
+    ability: float
+    standard_error: float
+    next_index: Optional[int]
+
+
+class AdaptiveTester:
+    """Computerized adaptive testing over the question bank.
+
+    After each answer the ability is re-estimated (EAP on the grid, with a
+    standard normal prior) and the test stops once the standard error is at
+    most `target_se` (after at least `min_items`), after `max_items`, or
+    when the pool runs out. Tables are cached per bank version and
+    category filter.
+
+    Requests never build a table: `first_item` and `step` use the cached
+    one, or else schedule its build in a worker thread (`prepare`) and
+    meanwhile pick a random unused item of the difficulty nearest the
+    current estimate.
+    """
+
+    def __init__(self, target_se: float = 0.35, min_items: int = 5, max_items: int = 30,
+                 randomesque: int = 3, max_tables: int = 32):
+        self.target_se = target_se
+        self.min_items = min_items
+        self.max_items = max_items
+        self.randomesque = randomesque
+        self.max_tables = max_tables
+        self._items: "OrderedDict[str, BankItems]" = OrderedDict()
+        self._tables: "OrderedDict[tuple, ItemInformationTable]" = OrderedDict()
+        self._building: Dict[tuple, asyncio.Task] = {}
+
+    @staticmethod
+    def _key(bank, categories: Sequence[str]) -> tuple:
+        return bank.version, tuple(sorted(set(categories)))
+
+    def _build(self, bank, categories: Sequence[str]) -> Tuple["BankItems", "ItemInformationTable"]:
+        # Only reads the caches, so it can run in a worker thread
+        from irt import ItemInformationTable
+        items = self._items.get(bank.version) or bank_items(bank.questions)
+        return items, ItemInformationTable(items, bank.selector.pool(categories), self.max_items + self.randomesque)
+
+    def _store(self, bank, key: tuple, items: "BankItems", table: "ItemInformationTable"):
+        self._items[bank.version] = items
+        self._items.move_to_end(bank.version)
+        while len(self._items) > 8:
+            self._items.popitem(last=False)
+        self._tables[key] = table
+        while len(self._tables) > self.max_tables:
+            self._tables.popitem(last=False)
+
+    def table(self, bank, categories: Sequence[str]) -> "ItemInformationTable":
+        """The table for a bank version and category filter, built here and
+        now if need be (hundreds of milliseconds on a large bank)."""
+        key = self._key(bank, categories)
+        table = self._tables.get(key)
+        if table is None:
+            items, table = self._build(bank, categories)
+            self._store(bank, key, items, table)
+        else:
+            self._tables.move_to_end(key)
+        return table
+
+    def prepare(self, bank, categories: Sequence[str] = ("all",)):
+        """Build the table for a bank version and category filter in the
+        background, unless it is cached or already being built."""
+        key = self._key(bank, categories)
+        if key not in self._tables and key not in self._building:
+            self._building[key] = asyncio.create_task(self._prepare(bank, categories, key))
+
+    async def _prepare(self, bank, categories: Sequence[str], key: tuple):
+        try:
+            items, table = await asyncio.to_thread(self._build, bank, categories)
+            self._store(bank, key, items, table)
+        except Exception:
+            logger.exception(f"Building the item table of bank v{bank.version} failed")
+        finally:
+            self._building.pop(key, None)
+
+    async def close(self):
+        for task in list(self._building.values()):
+            task.cancel()
+        await asyncio.gather(*self._building.values(), return_exceptions=True)
+
+    def _cached_table(self, bank, categories: Sequence[str]) -> Optional["ItemInformationTable"]:
+        key = self._key(bank, categories)
+        table = self._tables.get(key)
+        if table is None:
+            self.prepare(bank, categories)
+        else:
+            self._tables.move_to_end(key)
+        return table
+
+    def _fallback(self, bank, categories: Sequence[str], theta: float, administered: Sequence[int]) -> Optional[int]:
+        """A random unused item of the difficulty nearest `theta`, or of any."""
+        used = set(administered)
+        nearest = min(DEFAULT_DIFFICULTY, key=lambda label: abs(DEFAULT_DIFFICULTY[label] - theta))
+        for difficulty in (nearest, ANY):
+            # One more draw than there are used items always finds an unused one, if any is left
+            for index in bank.selector.sample_indices(difficulty, categories, len(used) + 1):
+                if index not in used:
+                    return index
+        return None
+
+    def select(self, bank, categories: Sequence[str], theta: float, administered: Sequence[int]) -> Optional[int]:
+        table = self._cached_table(bank, categories)
+        if table is None:
+            return self._fallback(bank, categories, theta, administered)
+        return table.select(theta, administered, self.randomesque)
+
+    def estimate(self, bank, indices: Sequence[int], answers: Sequence[int]) -> Tuple[float, float]:
+        """EAP ability estimate and its standard error after the given answers."""
+        items = self._items.get(bank.version)
+        if items is None:
+            # Score just the items given rather than build the whole bank's arrays
+            return bank_items([bank.questions[i] for i in indices]).estimate(range(len(indices)), answers)
+        return items.estimate(indices, answers)
+
+    def first_item(self, bank, categories: Sequence[str]) -> Optional[int]:
+        return self.select(bank, categories, 0.0, ())
+
+    def step(self, bank, categories: Sequence[str], indices: List[int], answers: List[int]) -> AdaptiveStep:
+        """Score the answers so far and choose the next item, or None to stop."""
+        theta, se = self.estimate(bank, indices, answers)
+        done = len(answers) >= self.max_items or (len(answers) >= self.min_items and se <= self.target_se)
+        next_index = None if done else self.select(bank, categories, theta, indices)
+        return AdaptiveStep(theta, se, next_index)
@@ -0,0 +1,181 @@
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+from starlette.routing import compile_path
+
+from metrics import REGISTRY
+
+ADMISSION_DECISIONS = REGISTRY.counter(
+    "admission_decisions", "Requests to limited routes by outcome (admitted, rate_limited, overloaded)",
+    ("route", "outcome")
+)
+
+# Decisions, as counted
+ADMITTED = "admitted"
+RATE_LIMITED = "rate_limited"
+OVERLOADED = "overloaded"
+
+
+@dataclass(frozen=True)
+class RouteLimit:
+    """Admission limits of one route, per worker process.
+
+    `concurrency` caps the requests the route serves at once (0 = no cap);
+    beyond it requests get 503 with a Retry-After of `retry_after` seconds.
+    `rate` is the sustained requests per second one client address may
+    make (0 = unlimited), with bursts of up to `burst` (default: one
+    second's worth); beyond it requests get 429 with a Retry-After of when
+    the next one would be let in.
+    """
+    concurrency: int = 0
+    rate: float = 0
+    burst: float = 0
+    retry_after: float = 1.0
+
+    @property
+    def capacity(self) -> float:
+        return self.burst or max(1.0, self.rate)
+
+
+class AdmissionController:
+    """Per-route concurrency caps and per-client token buckets.
+
+    Limits are keyed by method and route template, e.g.
+    `"GET /api/test/result/{test_id}"`; requests to any other route pass
+    untouched. Each client address gets a token bucket per limited route,
+    refilled at the route's `rate`; buckets live in an LRU of at most
+    `max_clients`, so a flood of addresses cannot grow memory without
+    bound, only reset the buckets of clients not seen for a while.
+    Everything runs on the event loop thread, so no locking is needed.
+    """
+
+    def __init__(self, limits: Dict[str, RouteLimit], max_clients: int = 50000):
+        self.limits = {route: limit for route, limit in limits.items() if limit is not None}
+        self.max_clients = max_clients
+        self.in_flight: Dict[str, int] = {route: 0 for route in self.limits}
+        self._exact: Dict[Tuple[str, str], str] = {}
+        self._templated: List[tuple] = []
+        for route in self.limits:
+            method, _, path = route.partition(" ")
+            if "{" in path:
+                self._templated.append((method, compile_path(path)[0], route))
+            else:
+                self._exact[(method, path)] = route
+        # (route, client) -> [tokens, refilled_at]
+        self._buckets: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+
+    def route(self, method: str, path: str) -> Optional[str]:
+        """The limited route a request falls under, if any."""
+        route = self._exact.get((method, path))
+        if route is None and self._templated:
+            for route_method, pattern, name in self._templated:
+                if route_method == method and pattern.match(path):
+                    return name
+        return route
+
+    def admit(self, route: str, client: str) -> Optional[Tuple[int, float]]:
+        """Take a slot for a request: None if admitted (call `release` once
+        it is done), else the (status, retry_after) to reject it with."""
+        limit = self.limits[route]
+        bucket = None
+        if limit.rate > 0:
+            now = time.monotonic()
+            key = (route, client)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [limit.capacity, now]
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(limit.capacity, bucket[0] + (now - bucket[1]) * limit.rate)
+                bucket[1] = now
+            if bucket[0] < 1:
+                ADMISSION_DECISIONS.inc(route, RATE_LIMITED)
+                return 429, (1 - bucket[0]) / limit.rate
+        # The token is only taken once admitted: a request shed for want of
+        # capacity does not count against the client's rate
+        if limit.concurrency and self.in_flight[route] >= limit.concurrency:
+            ADMISSION_DECISIONS.inc(route, OVERLOADED)
+            return 503, limit.retry_after
+        if bucket is not None:
+            bucket[0] -= 1
+        self.in_flight[route] += 1
+        ADMISSION_DECISIONS.inc(route, ADMITTED)
+        return None
+
+    def release(self, route: str):
+        self.in_flight[route] -= 1
+
+    @property
+    def client_count(self) -> int:
+        return len(self._buckets)
+
+    def stats(self) -> dict:
+        return {
+            "routes": {
+                route: {
+                    **asdict(limit),
+                    "in_flight": self.in_flight[route],
+                    **{outcome: int(ADMISSION_DECISIONS.value(route, outcome))
+                       for outcome in (ADMITTED, RATE_LIMITED, OVERLOADED)},
+                }
+                for route, limit in self.limits.items()
+            },
+            "clients": len(self._buckets),
+            "max_clients": self.max_clients,
+        }
+
+
+_REJECTIONS = {
+    429: orjson.dumps({"detail": "Too many requests, retry later"}),
+    503: orjson.dumps({"detail": "Server busy, retry later"}),
+}
+
+
+class AdmissionMiddleware:
+    """Applies an `AdmissionController` to HTTP requests.
+
+    Rejections are answered here, before routing, request parsing or any
+    database work, so shedding load costs next to nothing. A request's
+    concurrency slot is held until its response is fully sent, streamed
+    bodies included. The client address is the connection's peer; run
+    uvicorn with `--proxy-headers` behind a proxy so it is the real one.
+    """
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = self.controller.route(scope["method"], scope["path"])
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+        client = scope.get("client")
+        rejection = self.controller.admit(route, client[0] if client else "unknown")
+        if rejection is not None:
+            status, retry_after = rejection
+            body = _REJECTIONS[status]
+            await send({
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", b"%d" % len(body)),
+                    (b"retry-after", b"%d" % max(1, math.ceil(retry_after))),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(route)
@@ -0,0 +1,6 @@
+import os
+
+# Benchmarks drive the app from one address, as many simulated users at
+# once; concurrency caps (and any opted-in rate limits) would shed their
+# load. bench_admission turns admission control back on to measure it
+os.environ.setdefault("ADMISSION_ENABLED", "false")
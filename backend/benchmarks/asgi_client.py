@@ -0,0 +1,82 @@
+"""Minimal in-process ASGI client, so benchmarks need no HTTP stack."""
+import asyncio
+import json as jsonlib
+from contextlib import asynccontextmanager
+
+
+class ASGIResponse:
+    def __init__(self, status, headers, body):
+        self.status_code = status
+        self.headers = headers
+        self.content = body
+
+    def json(self):
+        return jsonlib.loads(self.content)
+
+
+async def request(app, method, path, json=None, headers=None, client="127.0.0.1"):
+    path, _, query = path.partition("?")
+    body = jsonlib.dumps(json).encode() if json is not None else b""
+    raw_headers = [(b"host", b"bench")]
+    if json is not None:
+        raw_headers.append((b"content-type", b"application/json"))
+    for name, value in (headers or {}).items():
+        raw_headers.append((name.lower().encode(), value.encode()))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query.encode(), "root_path": "", "headers": raw_headers,
+        "client": (client, 50000), "server": ("bench", 80),
+    }
+    sent = False
+    finished = asyncio.Event()
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            # Streaming responses watch for a disconnect; only report one
+            # once the response is complete, as a patient client would
+            await finished.wait()
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    status, response_headers, chunks = None, {}, []
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers.update((k.decode(), v.decode()) for k, v in message.get("headers", []))
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                finished.set()
+
+    await app(scope, receive, send)
+    return ASGIResponse(status, response_headers, b"".join(chunks))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Run the app's startup and shutdown hooks around a block."""
+    queue = asyncio.Queue()
+    replies = asyncio.Queue()
+    await queue.put({"type": "lifespan.startup"})
+
+    async def receive():
+        return await queue.get()
+
+    async def send(message):
+        await replies.put(message)
+
+    task = asyncio.create_task(app({"type": "lifespan", "asgi": {"version": "3.0"}}, receive, send))
+    message = await replies.get()
+    if message["type"] != "lifespan.startup.complete":
+        raise RuntimeError(message.get("message", "startup failed"))
+    try:
+        yield app
+    finally:
+        await queue.put({"type": "lifespan.shutdown"})
+        await replies.get()
+        await task
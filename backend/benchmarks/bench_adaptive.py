@@ -0,0 +1,96 @@
+"""Adaptive test item selection latency with a large calibrated bank.
+
+Simulates examinees with known abilities answering according to the 3PL
+model and times each `AdaptiveTester.step` (ability update plus choosing
+the next item), which runs once per answer. Also reports the one-off cost
+of building the item information table (which the server does in a worker
+thread whenever a bank version is published), test lengths and how well
+the final estimates recover the true abilities. Run from the backend
+directory:
+
+    python -m benchmarks.bench_adaptive [--items 50000] [--examinees 1000]
+"""
+import argparse
+import math
+import random
+import statistics
+import time
+
+from adaptive import AdaptiveTester
+from irt import D
+from question_bank import BankSnapshot
+
+CATEGORIES = ["math", "verbal", "pattern"]
+
+
+def make_bank(size, rng):
+    return BankSnapshot.build([
+        {
+            "id": str(i),
+            "question_text": f"Question {i}",
+            "options": ["A", "B", "C", "D"],
+            "correct_answer": i % 4,
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "difficulty": "medium",
+            "discrimination": rng.uniform(0.6, 2.0),
+            "irt_difficulty": rng.gauss(0, 1.2),
+            "guessing": rng.uniform(0.15, 0.25),
+        }
+        for i in range(size)
+    ])
+
+
+def respond(question, ability, rng):
+    a, b, c = question["discrimination"], question["irt_difficulty"], question["guessing"]
+    p = c + (1 - c) / (1 + math.exp(-D * a * (ability - b)))
+    if rng.random() < p:
+        return question["correct_answer"]
+    return (question["correct_answer"] + 1) % 4
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=50_000)
+    parser.add_argument("--examinees", type=int, default=1_000)
+    parser.add_argument("--target-se", type=float, default=0.35)
+    parser.add_argument("--max-items", type=int, default=30)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    bank = make_bank(args.items, rng)
+    tester = AdaptiveTester(target_se=args.target_se, max_items=args.max_items)
+
+    began = time.perf_counter()
+    tester.table(bank, ["all"])
+    print(f"{args.items} items: information table built in {(time.perf_counter() - began) * 1000:.0f} ms")
+
+    latencies, lengths, errors = [], [], []
+    for _ in range(args.examinees):
+        ability = rng.gauss(0, 1)
+        indices, answers = [tester.first_item(bank, ["all"])], []
+        while True:
+            answers.append(respond(bank.questions[indices[-1]], ability, rng))
+            t0 = time.perf_counter()
+            step = tester.step(bank, ["all"], indices, answers)
+            latencies.append((time.perf_counter() - t0) * 1e6)
+            if step.next_index is None:
+                break
+            indices.append(step.next_index)
+        lengths.append(len(answers))
+        errors.append(step.ability - ability)
+
+    print(f"per-answer step: p50 {statistics.median(latencies):6.0f} us  p99 {percentile(latencies, 99):6.0f} us  "
+          f"max {max(latencies):6.0f} us  ({len(latencies)} steps)")
+    print(f"test length: mean {statistics.mean(lengths):.1f}, max {max(lengths)} "
+          f"(target SE {args.target_se}, at most {args.max_items})")
+    print(f"ability recovery: RMSE {math.sqrt(statistics.mean(e * e for e in errors)):.3f}, "
+          f"bias {statistics.mean(errors):+.3f}")
+
+
+if __name__ == "__main__":
+    main()
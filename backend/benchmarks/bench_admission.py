@@ -0,0 +1,122 @@
+"""Admission control under a bot flood and a certificate burst.
+
+While `--users` test takers (one address each) start and submit tests, a
+bot on a single address fires `--bot` simultaneous /api/test/start calls,
+and `--downloaders` addresses download a certificate at the same moment.
+Runs once without admission control and once with the server's default
+caps plus a per-address rate on test starts (`START_LIMIT`, as a
+deployment whose clients have addresses of their own would opt into),
+and reports the users' latency, what the bot and the downloaders
+got, and the sessions written. Checks that with admission control every
+user request succeeded, that the bot was held to its burst, and that every
+rejection carried a Retry-After; exits with status 1 otherwise. Run from
+the backend directory:
+
+    python -m benchmarks.bench_admission [--users 50] [--bot 500] [--downloaders 40]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+os.environ["ADMISSION_ENABLED"] = "true"
+os.environ.setdefault("CERTIFICATE_WORKERS", "0")
+
+import server
+from benchmarks.asgi_client import request, lifespan
+from benchmarks.fake_mongo import FakeDatabase
+
+TEST_CONFIG = {"duration": "medium", "question_types": ["all"], "difficulty": "medium"}
+
+# Rates are opt-in: this is the kind of limit ADMISSION_LIMITS would add
+START_LIMIT = server.RouteLimit(concurrency=64, rate=1, burst=10)
+
+
+async def take_test(app, address, latencies):
+    began = time.perf_counter()
+    start = await request(app, "POST", "/api/test/start", json=TEST_CONFIG, client=address)
+    submit = await request(app, "POST", "/api/test/submit", client=address,
+                           json={"test_id": start.json()["test_id"], "answers": [1] * 10})
+    latencies.append((time.perf_counter() - began) * 1000)
+    return [start, submit]
+
+
+async def timed(coroutine, latencies):
+    began = time.perf_counter()
+    response = await coroutine
+    latencies.append((time.perf_counter() - began) * 1000)
+    return response
+
+
+async def run(args, admission):
+    server.ADMISSION_ENABLED = admission
+    server.admission = server.AdmissionController({**server.ADMISSION_LIMITS, "POST /api/test/start": START_LIMIT})
+    database = FakeDatabase(latency=args.latency)
+    async with lifespan(server.create_app(database=database)) as app:
+        start = await request(app, "POST", "/api/test/start", json=TEST_CONFIG, client="10.9.9.9")
+        cert_test_id = start.json()["test_id"]
+        await request(app, "POST", "/api/test/submit", client="10.9.9.9",
+                      json={"test_id": cert_test_id, "answers": [1] * 10})
+        sessions_before = database.ops[("test_sessions", "insert")]
+
+        user_latencies, bot_latencies = [], []
+        users = [take_test(app, f"10.0.{n // 250}.{n % 250}", user_latencies) for n in range(args.users)]
+        bot = [timed(request(app, "POST", "/api/test/start", json=TEST_CONFIG, client="10.66.6.6"),
+                     bot_latencies) for _ in range(args.bot)]
+        downloads = [request(app, "POST", "/api/certificate/download", client=f"10.1.{n // 250}.{n % 250}",
+                             json={"test_id": cert_test_id, "name": f"Bench User {n}"})
+                     for n in range(args.downloaders)]
+        results = await asyncio.gather(*users, *bot, *downloads)
+        user_responses = [r for pair in results[:args.users] for r in pair]
+        bot_responses = results[args.users:args.users + args.bot]
+        download_responses = results[args.users + args.bot:]
+        sessions = database.ops[("test_sessions", "insert")] - sessions_before
+        shed = server.admission.stats()["routes"]["POST /api/certificate/download"]["overloaded"] if admission else 0
+
+    label = "with admission control" if admission else "without admission control"
+    rejected_latencies = [ms for ms, r in zip(bot_latencies, bot_responses) if r.status_code == 429]
+    print(f"{label}:")
+    print(f"  users:        {len(user_responses)} requests {dict(Counter(r.status_code for r in user_responses))}, "
+          f"start+submit p50 {statistics.median(user_latencies):6.2f} ms  "
+          f"p95 {statistics.quantiles(user_latencies, n=20)[-1]:6.2f} ms")
+    print(f"  bot:          {dict(Counter(r.status_code for r in bot_responses))}"
+          + (f", rejected in p50 {statistics.median(rejected_latencies):.2f} ms" if rejected_latencies else ""))
+    print(f"  certificates: {dict(Counter(r.status_code for r in download_responses))}, "
+          f"{shed} shed by admission control, the rest of the 503s by the render queue")
+    print(f"  sessions written: {sessions}")
+
+    failures = []
+    if admission:
+        if any(r.status_code != 200 for r in user_responses):
+            failures.append(f"user requests failed: {Counter(r.status_code for r in user_responses)}")
+        admitted = sum(r.status_code == 200 for r in bot_responses)
+        if admitted > START_LIMIT.capacity + 1:
+            failures.append(f"the bot got {admitted} sessions past its burst")
+        for r in bot_responses + download_responses:
+            if r.status_code in (429, 503) and not r.headers.get("retry-after"):
+                failures.append(f"a {r.status_code} without Retry-After")
+                break
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--bot", type=int, default=500, help="simultaneous starts from one address")
+    parser.add_argument("--downloaders", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.002, help="seconds per call of the in-memory store")
+    args = parser.parse_args()
+    asyncio.run(run(args, admission=False))
+    failures = asyncio.run(run(args, admission=True))
+    for line in failures[:20]:
+        print(f"FAIL {line}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+    print("OK: users unaffected, the flood shed with Retry-After")
+
+
+if __name__ == "__main__":
+    main()
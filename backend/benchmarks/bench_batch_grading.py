@@ -0,0 +1,113 @@
+"""Grading 10k answer sheets: one /api/test/submit call each vs one batch call.
+
+Both paths run against the in-memory Mongo stand-in (each database call
+yields to the event loop and sleeps `--latency` seconds). Every batch
+result is checked against the scalar grading used by /api/test/submit.
+Run from the backend directory:
+
+    python -m benchmarks.bench_batch_grading [--submissions 10000] [--latency 0.0005]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import server
+from grading import get_performance_level, iq_score, grade_batch, score_rows
+from benchmarks.asgi_client import request, lifespan
+from benchmarks.fake_mongo import FakeDatabase
+
+TEST_CONFIG = {"duration": "long", "question_types": ["all"], "difficulty": "all"}
+
+
+async def start_tests(app, count):
+    test_ids = []
+    for _ in range(count):
+        test_ids.append((await request(app, "POST", "/api/test/start", json=TEST_CONFIG)).json()["test_id"])
+    return test_ids
+
+
+def answer_sheet(rng):
+    return [rng.randrange(4) for _ in range(20)]
+
+
+async def expected_result(db, test_id, answers):
+    questions = await server.session_questions(await db.test_sessions.find_one({"test_id": test_id}))
+    correct = sum(1 for q, a in zip(questions, answers) if q["correct_answer"] == a)
+    accuracy = (correct / len(questions)) * 100
+    return correct, iq_score(accuracy), get_performance_level(accuracy), accuracy
+
+
+def grade_one_by_one(answer_keys, responses):
+    rows = []
+    for key, answers in zip(answer_keys, responses):
+        correct = sum(1 for i, answer in enumerate(answers) if i < len(key) and answer == key[i])
+        accuracy = (correct / len(key)) * 100
+        rows.append((correct, len(key), accuracy, iq_score(accuracy), get_performance_level(accuracy)))
+    return rows
+
+
+def compare_scoring(submissions):
+    rng = random.Random(11)
+    answer_keys = [answer_sheet(rng) for _ in range(submissions)]
+    responses = [answer_sheet(rng) for _ in range(submissions)]
+    began = time.perf_counter()
+    expected = grade_one_by_one(answer_keys, responses)
+    scalar = time.perf_counter() - began
+    began = time.perf_counter()
+    rows = score_rows(grade_batch(answer_keys, responses))
+    vectorized = time.perf_counter() - began
+    assert rows == expected
+    print(f"  scoring only : {scalar * 1000:7.1f} ms one by one, {vectorized * 1000:7.1f} ms vectorized")
+
+
+async def run(submissions, latency):
+    rng = random.Random(7)
+    db = FakeDatabase(latency=latency)
+    async with lifespan(server.create_app(database=db)) as app:
+        await app.state.index_build
+
+        sequential_ids = await start_tests(app, submissions)
+        batch_ids = await start_tests(app, submissions)
+        sheets = {test_id: answer_sheet(rng) for test_id in sequential_ids + batch_ids}
+
+        began = time.perf_counter()
+        for test_id in sequential_ids:
+            response = await request(app, "POST", "/api/test/submit",
+                                     json={"test_id": test_id, "answers": sheets[test_id]})
+            assert response.status_code == 200, response.content
+        sequential = time.perf_counter() - began
+
+        ops_before = sum(db.ops.values())
+        began = time.perf_counter()
+        response = await request(app, "POST", "/api/test/submit/batch", json={"submissions": [
+            {"test_id": test_id, "answers": sheets[test_id]} for test_id in batch_ids
+        ]})
+        batch = time.perf_counter() - began
+        batch_ops = sum(db.ops.values()) - ops_before
+        body = response.json()
+        assert response.status_code == 200 and body["graded"] == submissions, body.get("failed")
+
+        for result in body["results"]:
+            correct, iq, level, accuracy = await expected_result(db, result["test_id"], sheets[result["test_id"]])
+            assert (result["correct_answers"], result["iq_score"], result["performance_level"]) == (correct, iq, level)
+            assert result["accuracy_percentage"] == accuracy
+
+    print(f"{submissions} submissions, {latency * 1000:.2f} ms per database call")
+    print(f"  one call each: {sequential:7.2f} s  {submissions / sequential:9.0f} sheets/s")
+    print(f"  one batch    : {batch:7.2f} s  {submissions / batch:9.0f} sheets/s  "
+          f"({batch_ops} database calls, {sequential / batch:.0f}x faster)")
+    print("  batch results identical to per-request grading")
+    compare_scoring(submissions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--submissions", type=int, default=10_000)
+    parser.add_argument("--latency", type=float, default=0.0005)
+    args = parser.parse_args()
+    asyncio.run(run(args.submissions, args.latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""/api/test/submit latency while certificates are being downloaded.
+
+Compares rendering certificates inline on the event loop (the old
+behaviour) with the worker-process renderer. Run from the backend
+directory, against the in-memory Mongo stand-in:
+
+    python -m benchmarks.bench_certificate_load [--downloaders 4] [--submits 200]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import server
+from certificates import CertificateRenderer, render_full_certificate
+from benchmarks.asgi_client import request, lifespan
+from benchmarks.fake_mongo import FakeDatabase
+
+TEST_CONFIG = {"duration": "medium", "question_types": ["all"], "difficulty": "medium"}
+
+
+class InlineRenderer(CertificateRenderer):
+    """Renders on the event loop, as download_certificate used to."""
+
+    async def render(self, fields):
+        return render_full_certificate(fields)
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+async def run(mode, downloaders, submits):
+    if mode == "inline":
+        server.certificate_renderer = InlineRenderer(workers=0)
+    else:
+        server.certificate_renderer = CertificateRenderer(workers=os.cpu_count() or 1, max_queue=32)
+
+    async with lifespan(server.create_app(database=FakeDatabase(latency=0.0005))) as app:
+        start = await request(app, "POST", "/api/test/start", json=TEST_CONFIG)
+        cert_test_id = start.json()["test_id"]
+        await request(app, "POST", "/api/test/submit", json={"test_id": cert_test_id, "answers": [0] * 10})
+
+        test_ids = []
+        for _ in range(submits):
+            test_ids.append((await request(app, "POST", "/api/test/start", json=TEST_CONFIG)).json()["test_id"])
+
+        stop = asyncio.Event()
+        rendered = rejected = 0
+
+        async def download_loop(worker):
+            nonlocal rendered, rejected
+            while not stop.is_set():
+                # A fresh name per download, so every request really renders
+                response = await request(app, "POST", "/api/certificate/download",
+                                         json={"test_id": cert_test_id, "name": f"Bench User {worker}-{rendered}"})
+                if response.status_code == 200:
+                    rendered += 1
+                else:
+                    rejected += 1
+                    await asyncio.sleep(0.01)
+
+        tasks = [asyncio.create_task(download_loop(i)) for i in range(downloaders)]
+        await asyncio.sleep(0.2)
+
+        latencies = []
+        began = time.perf_counter()
+        for test_id in test_ids:
+            t0 = time.perf_counter()
+            await request(app, "POST", "/api/test/submit", json={"test_id": test_id, "answers": [0] * 10})
+            latencies.append((time.perf_counter() - t0) * 1000)
+            await asyncio.sleep(0.005)
+        elapsed = time.perf_counter() - began
+
+        stop.set()
+        await asyncio.gather(*tasks)
+
+    print(f"{mode:>7}: submit p50 {statistics.median(latencies):7.2f} ms  "
+          f"p95 {percentile(latencies, 95):7.2f} ms  p99 {percentile(latencies, 99):7.2f} ms  "
+          f"max {max(latencies):7.2f} ms | {rendered / elapsed:6.1f} certs/s, {rejected} rejected")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--downloaders", type=int, default=4)
+    parser.add_argument("--submits", type=int, default=200)
+    parser.add_argument("--mode", choices=["inline", "pool", "both"], default="both")
+    args = parser.parse_args()
+    modes = ["inline", "pool"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        asyncio.run(run(mode, args.downloaders, args.submits))
+
+
+if __name__ == "__main__":
+    main()
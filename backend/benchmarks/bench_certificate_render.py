@@ -0,0 +1,53 @@
+"""Certificate render throughput (PDFs/sec on one core) and output size.
+
+Compares laying out the whole certificate with ReportLab, as every
+download used to, with the pre-built template that only lays out the
+dynamic fields. Run from the backend directory:
+
+    python -m benchmarks.bench_certificate_render
+"""
+import time
+
+from reportlab import rl_config
+
+from certificates import certificate_template, render_certificate, render_full_certificate
+
+FIELDS = {
+    "name": "Alexandra Montgomery",
+    "test_id": "3f2b8c1e-9d4a-4f6b-8e2c-1a7d5b9c0e3f",
+    "iq_score": 127,
+    "performance_level": "Above Average",
+    "accuracy_percentage": 85.0,
+    "correct_answers": 17,
+    "total_questions": 20,
+    "issued_on": "October 17, 2026",
+}
+
+
+def throughput(render, seconds=2.0):
+    render(FIELDS)
+    count, began = 0, time.perf_counter()
+    while time.perf_counter() - began < seconds:
+        render(FIELDS)
+        count += 1
+    return count / (time.perf_counter() - began)
+
+
+def main():
+    # ReportLab's default ASCII85 wrapping, as the original endpoint produced
+    rl_config.useA85 = 1
+    full_rate, full_size = throughput(render_full_certificate), len(render_full_certificate(FIELDS))
+
+    began = time.perf_counter()
+    certificate_template()
+    build_ms = (time.perf_counter() - began) * 1000
+    template_rate, template_size = throughput(render_certificate), len(render_certificate(FIELDS))
+
+    print(f"{'full ReportLab render':>22}: {full_rate:8.0f} PDFs/s/core  {full_size:6d} bytes")
+    print(f"{'template + overlay':>22}: {template_rate:8.0f} PDFs/s/core  {template_size:6d} bytes"
+          f"  (template built once in {build_ms:.1f} ms)")
+    print(f"{'speedup':>22}: {template_rate / full_rate:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
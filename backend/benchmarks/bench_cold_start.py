@@ -0,0 +1,102 @@
+"""Cold start of an API worker: time from process start to ready, against a budget.
+
+Starts `--runs` fresh interpreters, each importing `server` and running its
+startup against the in-memory store, and reports the median time to ready
+with the import time of the slowest packages and each startup phase, as
+logged at boot. Exits with status 1 when the median is over `--budget-ms`,
+or when a package that is meant to load only after the worker is ready
+(ReportLab for certificates, numpy for adaptive tables and batch
+grading) was imported before. Run from the backend
+directory:
+
+    python -m benchmarks.bench_cold_start [--runs 5] [--budget-ms 1500]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+# Loaded in the background once the worker serves traffic, never before
+DEFERRED = ("reportlab", "numpy")
+
+CHILD = f"""
+import asyncio, json, logging, sys
+import server
+from benchmarks.asgi_client import lifespan
+from benchmarks.fake_mongo import FakeDatabase
+logging.disable(logging.CRITICAL)
+
+# What was loaded when the worker declared itself ready; background
+# warm-ups started right after may import the rest at any moment
+deferred_loaded = []
+ready = server.boot.ready
+def checked_ready(*args):
+    deferred_loaded.extend(name for name in {DEFERRED!r} if name in sys.modules)
+    return ready(*args)
+server.boot.ready = checked_ready
+
+async def main():
+    async with lifespan(server.create_app(database=FakeDatabase())):
+        report = server.boot.report()
+        report["deferred_loaded"] = deferred_loaded
+        print(json.dumps(report), flush=True)
+
+asyncio.run(main())
+"""
+
+
+def cold_start() -> dict:
+    env = {**os.environ, "CERTIFICATE_WORKERS": "0", "METRICS_DIR": ""}
+    began = time.perf_counter()
+    child = subprocess.run([sys.executable, "-c", CHILD], cwd=BACKEND, env=env,
+                           capture_output=True, text=True, check=True)
+    report = json.loads(child.stdout.strip().splitlines()[-1])
+    report["wall_ms"] = (time.perf_counter() - began) * 1000
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500,
+                        help="ceiling for the median time from process start to ready")
+    args = parser.parse_args()
+
+    cold_start()  # the first run also pays for writing bytecode caches
+    reports = [cold_start() for _ in range(args.runs)]
+
+    def median(key, field=None):
+        return statistics.median(r[key] if field is None else r[key].get(field, 0.0) for r in reports)
+
+    ready = median("ready_ms")
+    print(f"{args.runs} cold starts, median ready {ready:.0f} ms after process start "
+          f"(process lifetime including shutdown {median('wall_ms'):.0f} ms)")
+    if reports[0]["before_import_ms"] is not None:
+        print(f"  before server import {median('before_import_ms'):6.0f} ms")
+    print(f"  imports              {median('imports_ms'):6.0f} ms")
+    modules = sorted(reports[0]["modules_ms"], key=lambda name: -median("modules_ms", name))
+    for name in modules[:10]:
+        print(f"    {name:18} {median('modules_ms', name):6.1f} ms")
+    for name in reports[0]["phases_ms"]:
+        print(f"  startup: {name:15} {median('phases_ms', name):6.1f} ms")
+
+    failures = []
+    if ready > args.budget_ms:
+        failures.append(f"median ready {ready:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    for name in sorted({name for r in reports for name in r["deferred_loaded"]}):
+        failures.append(f"{name} was imported before the worker was ready")
+    for line in failures:
+        print(f"FAIL {line}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+    print(f"OK: within the {args.budget_ms:.0f} ms budget")
+
+
+if __name__ == "__main__":
+    main()
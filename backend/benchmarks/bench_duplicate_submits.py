@@ -0,0 +1,100 @@
+"""Simultaneous duplicate /api/test/submit calls store and count one result.
+
+For each test, `--duplicates` identical submits are fired at once (for
+every other test all carrying the same Idempotency-Key), then the test is
+submitted again under a different key, and once more after dropping the
+worker's local result cache, as a retry landing on another worker would.
+Checks that every duplicate got the same result back, that exactly one of
+them was graded, that the different key got 409 where the stored result
+has a key (and 200 where it has none), and that `test_results` holds one
+document per test; exits with status 1 otherwise. Also reports submit
+latency with and without duplicates; tests/test_submit.py asserts the
+same guarantees on every test run. Run from the backend directory:
+
+    python -m benchmarks.bench_duplicate_submits [--tests 200] [--duplicates 8]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import server
+from benchmarks.asgi_client import request, lifespan
+from benchmarks.fake_mongo import FakeDatabase
+
+TEST_CONFIG = {"duration": "medium", "question_types": ["all"], "difficulty": "medium"}
+
+
+def submit(app, test_id, key=None):
+    return request(app, "POST", "/api/test/submit", json={"test_id": test_id, "answers": [1] * 10},
+                   headers={"Idempotency-Key": key} if key else None)
+
+
+async def run(args):
+    os.environ.setdefault("CERTIFICATE_WORKERS", "0")
+    database = FakeDatabase(latency=args.latency)
+    failures = []
+    async with lifespan(server.create_app(database=database)) as app:
+        # The unique index on test_results.test_id is what settles cross-worker races
+        await app.state.index_build
+        test_ids = [(await request(app, "POST", "/api/test/start", json=TEST_CONFIG)).json()["test_id"]
+                    for _ in range(args.tests)]
+
+        single, burst = [], []
+        for n, test_id in enumerate(test_ids):
+            key = "first" if n % 2 else None
+            began = time.perf_counter()
+            if n % 4 < 2:
+                responses = [await submit(app, test_id, key)]
+                single.append((time.perf_counter() - began) * 1000)
+                responses += await asyncio.gather(*(submit(app, test_id, key) for _ in range(args.duplicates - 1)))
+            else:
+                responses = await asyncio.gather(*(submit(app, test_id, key) for _ in range(args.duplicates)))
+                burst.append((time.perf_counter() - began) * 1000)
+
+            ids = {r.json().get("id") for r in responses}
+            graded = [r for r in responses if r.headers.get("idempotent-replayed") != "true"]
+            if any(r.status_code != 200 for r in responses) or len(ids) != 1 or len(graded) != 1:
+                failures.append(f"{test_id}: statuses {[r.status_code for r in responses]}, "
+                                f"{len(ids)} distinct results, {len(graded)} graded")
+
+            conflict = await submit(app, test_id, "second")
+            if conflict.status_code != (409 if key else 200):
+                failures.append(f"{test_id}: a different Idempotency-Key got {conflict.status_code}")
+
+            # As if the retry reached a worker that never saw the first submit
+            server.result_cache._entries.pop(test_id, None)
+            retry = await submit(app, test_id)
+            if retry.status_code != 200 or retry.json().get("id") not in ids:
+                failures.append(f"{test_id}: retry on a cold worker got {retry.status_code}")
+
+        for test_id in test_ids:
+            stored = await database.test_results.count_documents({"test_id": test_id})
+            if stored != 1:
+                failures.append(f"{test_id}: {stored} test_results documents")
+
+    print(f"{args.tests} tests x {args.duplicates} simultaneous submits, "
+          f"{database.ops[('test_results', 'insert')]} result inserts")
+    print(f"submit alone:             p50 {statistics.median(single):6.2f} ms")
+    print(f"{args.duplicates} duplicates at once:    p50 {statistics.median(burst):6.2f} ms (whole burst)")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tests", type=int, default=200)
+    parser.add_argument("--duplicates", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.0005, help="seconds per call of the in-memory store")
+    args = parser.parse_args()
+    failures = asyncio.run(run(args))
+    for line in failures[:20]:
+        print(f"FAIL {line}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+    print("OK: one stored and counted result per test")
+
+
+if __name__ == "__main__":
+    main()
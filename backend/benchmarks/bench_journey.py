@@ -0,0 +1,190 @@
+"""Throughput and latency of the full user journey, with regression checks.
+
+Drives the real ASGI app in-process through what every test taker does,
+with `--users` of them at a time: GET /api/stats, POST /api/test/start,
+POST /api/test/submit, GET /api/test/result/{id} and POST
+/api/certificate/download. By default Mongo is the in-memory stand-in (with
+`--latency` seconds per call), so the run needs no network; `--mongo-url`
+points it at a local mongod instead, using a scratch database that is
+dropped afterwards. Run from the backend directory:
+
+    python -m benchmarks.bench_journey [--users 32] [--journeys 2000] [--save baseline.json]
+    python -m benchmarks.bench_journey --baseline baseline.json [--threshold 0.2]
+
+Reports requests per second and p50/p95/p99 per endpoint. `--save` writes
+them as a JSON baseline; `--baseline` compares against one and exits with
+status 1 if any endpoint's throughput fell or its p95 rose by more than
+`--threshold`, or its error rate grew by more than a percentage point.
+Baselines are only comparable on the same machine and settings.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+from pathlib import Path
+
+import server
+from benchmarks.asgi_client import request, lifespan
+from benchmarks.fake_mongo import FakeDatabase
+
+ENDPOINTS = ["stats", "start", "submit", "result", "certificate"]
+DURATIONS = ["short", "medium", "long"]
+DIFFICULTIES = ["easy", "medium", "hard"]
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))] if samples else 0.0
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {name: [] for name in ENDPOINTS}
+        self.errors = {name: 0 for name in ENDPOINTS}
+        self.enabled = True
+
+    async def call(self, name, app, method, path, json=None, ok=(200,)):
+        t0 = time.perf_counter()
+        response = await request(app, method, path, json=json)
+        if self.enabled:
+            self.latencies[name].append((time.perf_counter() - t0) * 1000)
+            if response.status_code not in ok:
+                self.errors[name] += 1
+        return response
+
+
+async def journey(app, recorder, rng, certificate_share):
+    await recorder.call("stats", app, "GET", "/api/stats")
+    config = {
+        "duration": rng.choice(DURATIONS), "difficulty": rng.choice(DIFFICULTIES), "question_types": ["all"],
+    }
+    start = await recorder.call("start", app, "POST", "/api/test/start", json=config)
+    if start.status_code != 200:
+        return
+    test = start.json()
+    answers = [rng.randrange(len(q["options"])) for q in test["questions"]]
+    submit = await recorder.call("submit", app, "POST", "/api/test/submit",
+                                 json={"test_id": test["test_id"], "answers": answers})
+    if submit.status_code != 200:
+        return
+    await recorder.call("result", app, "GET", f"/api/test/result/{test['test_id']}")
+    if rng.random() < certificate_share:
+        await recorder.call("certificate", app, "POST", "/api/certificate/download",
+                            json={"test_id": test["test_id"], "name": f"Bench User {rng.randrange(10 ** 6)}"})
+
+
+async def run(args):
+    client = None
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(args.mongo_url)
+        database = client[args.db_name]
+    else:
+        database = FakeDatabase(latency=args.latency)
+
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    try:
+        async with lifespan(server.create_app(database=database)) as app:
+            recorder.enabled = False
+            for _ in range(args.warmup):
+                await journey(app, recorder, rng, args.certificates)
+            recorder.enabled = True
+
+            remaining = args.journeys
+
+            async def user(seed):
+                nonlocal remaining
+                user_rng = random.Random(seed)
+                while remaining > 0:
+                    remaining -= 1
+                    await journey(app, recorder, user_rng, args.certificates)
+
+            began = time.perf_counter()
+            await asyncio.gather(*(user(args.seed * 1000 + i) for i in range(args.users)))
+            elapsed = time.perf_counter() - began
+    finally:
+        if client is not None:
+            await client.drop_database(args.db_name)
+            client.close()
+
+    return {
+        "settings": {
+            "users": args.users, "journeys": args.journeys, "certificates": args.certificates,
+            "store": "mongod" if args.mongo_url else f"fake ({args.latency * 1000:g} ms per call)",
+            "certificate_workers": server.certificate_renderer.workers,
+            "python": platform.python_version(), "cpus": os.cpu_count(),
+        },
+        "elapsed_seconds": round(elapsed, 3),
+        "journeys_per_second": round(args.journeys / elapsed, 1),
+        "endpoints": {
+            name: {
+                "requests": len(samples),
+                "errors": recorder.errors[name],
+                "rps": round(len(samples) / elapsed, 1),
+                "p50_ms": round(percentile(samples, 50), 2),
+                "p95_ms": round(percentile(samples, 95), 2),
+                "p99_ms": round(percentile(samples, 99), 2),
+            }
+            for name, samples in recorder.latencies.items() if samples
+        },
+    }
+
+
+def regressions(report, baseline, threshold):
+    found = []
+    for name, base in baseline["endpoints"].items():
+        current = report["endpoints"].get(name)
+        if current is None:
+            found.append(f"{name}: no requests in this run")
+            continue
+        if current["rps"] < base["rps"] * (1 - threshold):
+            found.append(f"{name}: {current['rps']} req/s, baseline {base['rps']}")
+        if current["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            found.append(f"{name}: p95 {current['p95_ms']} ms, baseline {base['p95_ms']}")
+        error_rate = current["errors"] / current["requests"]
+        base_rate = base["errors"] / base["requests"] if base["requests"] else 0.0
+        if error_rate > base_rate + 0.01:
+            found.append(f"{name}: {error_rate:.1%} errors, baseline {base_rate:.1%}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=32, help="journeys in flight at once")
+    parser.add_argument("--journeys", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=20, help="journeys run first and not measured")
+    parser.add_argument("--certificates", type=float, default=0.2,
+                        help="share of journeys that download a certificate")
+    parser.add_argument("--latency", type=float, default=0.0005, help="seconds per call of the in-memory store")
+    parser.add_argument("--mongo-url", help="use this mongod instead of the in-memory store")
+    parser.add_argument("--db-name", default="mindmeter_bench", help="scratch database, dropped afterwards")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write the report to this JSON file")
+    parser.add_argument("--baseline", help="compare with this saved report")
+    parser.add_argument("--threshold", type=float, default=0.2, help="tolerated relative regression")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(f"{report['journeys_per_second']} journeys/s over {report['elapsed_seconds']} s "
+          f"({args.users} users, {report['settings']['store']})")
+    for name, row in report["endpoints"].items():
+        print(f"{name:>12}: {row['rps']:8.1f} req/s  p50 {row['p50_ms']:7.2f} ms  p95 {row['p95_ms']:7.2f} ms  "
+              f"p99 {row['p99_ms']:7.2f} ms  {row['errors']} errors")
+    if args.save:
+        Path(args.save).write_text(json.dumps(report, indent=2) + "\n")
+    if args.baseline:
+        found = regressions(report, json.loads(Path(args.baseline).read_text()), args.threshold)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+        print(f"No regression beyond {args.threshold:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Session writes caused by per-answer autosave, and grading from saved progress.
+
+`--tests` test takers answer a long (20-question) test at the same time,
+autosaving every answer through /api/test/progress with `--think` seconds
+between answers, then submit with no answers at all, so the grade comes
+from the saved progress alone. Reports answers saved against the session
+writes they cost and checks every grade against the answers given. Run
+from the backend directory:
+
+    python -m benchmarks.bench_progress [--tests 200] [--think 0.05] [--flush-ms 1000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+import server
+from benchmarks.asgi_client import request, lifespan
+from benchmarks.fake_mongo import FakeDatabase
+from progress import PROGRESS_WRITES, ProgressWriter
+
+TEST_CONFIG = {"duration": "long", "question_types": ["all"], "difficulty": "medium"}
+
+
+async def take_test(app, rng, think):
+    test = (await request(app, "POST", "/api/test/start", json=TEST_CONFIG)).json()
+    answers = []
+    for position, question in enumerate(test["questions"]):
+        await asyncio.sleep(rng.uniform(0, 2 * think))
+        answer = rng.randrange(len(question["options"]))
+        answers.append(answer)
+        await request(app, "POST", "/api/test/progress",
+                      json={"test_id": test["test_id"], "position": position, "answer": answer})
+    result = await request(app, "POST", "/api/test/submit", json={"test_id": test["test_id"]})
+    return test["test_id"], answers, result
+
+
+async def run(args):
+    os.environ.setdefault("CERTIFICATE_WORKERS", "0")
+    server.progress_writer = ProgressWriter(flush_interval=args.flush_ms / 1000)
+    database = FakeDatabase(latency=args.latency)
+    failures = []
+    async with lifespan(server.create_app(database=database)) as app:
+        rng = random.Random(11)
+        began = time.perf_counter()
+        taken = await asyncio.gather(*(take_test(app, random.Random(rng.random()), args.think)
+                                       for _ in range(args.tests)))
+        elapsed = time.perf_counter() - began
+        for test_id, answers, result in taken:
+            session = await database.test_sessions.find_one({"test_id": test_id})
+            questions = await server.session_questions(session)
+            expected = sum(a == q["correct_answer"] for a, q in zip(answers, questions))
+            if result.status_code != 200 or result.json()["correct_answers"] != expected:
+                failures.append(f"{test_id}: got {result.status_code} {result.content[:80]!r}, "
+                                f"expected {expected} correct")
+
+    answers = sum(len(a) for _, a, _ in taken)
+    writes = database.ops[("test_sessions", "bulk_write")]
+    print(f"{args.tests} tests, {answers} answers autosaved in {elapsed:.1f} s "
+          f"(flush every {args.flush_ms} ms)")
+    print(f"session writes: {writes} bulk writes carrying "
+          f"{int(PROGRESS_WRITES.value())} updates, vs {answers} with one write per answer")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tests", type=int, default=200)
+    parser.add_argument("--think", type=float, default=0.05, help="mean seconds between answers")
+    parser.add_argument("--flush-ms", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0005, help="seconds per call of the in-memory store")
+    args = parser.parse_args()
+    failures = asyncio.run(run(args))
+    for line in failures[:20]:
+        print(f"FAIL {line}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+    print("OK: every test graded from its saved progress alone")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Per-request cost of picking test questions as the bank grows.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_question_selector
+"""
+import random
+import timeit
+
+from question_bank import QuestionSelector
+
+DIFFICULTIES = ["easy", "medium", "hard"]
+CATEGORIES = ["math", "verbal", "pattern"]
+BANK_SIZES = [20, 1_000, 10_000, 100_000]
+NUM_QUESTIONS = 20
+
+
+def make_bank(size):
+    return [
+        {
+            "question_text": f"Question {i}",
+            "options": ["A", "B", "C", "D"],
+            "correct_answer": i % 4,
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "difficulty": DIFFICULTIES[(i // len(CATEGORIES)) % len(DIFFICULTIES)],
+        }
+        for i in range(size)
+    ]
+
+
+def filter_then_shuffle(bank, difficulty, question_types, num_questions):
+    # The selection loop `start_test` used before the indexed selector
+    filtered = [
+        q for q in bank
+        if q["difficulty"] == difficulty
+        and ("all" in question_types or q["category"] in question_types)
+    ]
+    if len(filtered) < num_questions:
+        filtered = [q for q in bank if "all" in question_types or q["category"] in question_types]
+    random.shuffle(filtered)
+    return filtered[:num_questions]
+
+
+def bench(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    print(f"{'bank size':>10} {'types':>14} {'legacy us/req':>14} {'indexed us/req':>15}")
+    for size in BANK_SIZES:
+        bank = make_bank(size)
+        selector = QuestionSelector(bank)
+        number = max(5, 200_000 // size)
+        for types in (["all"], ["math", "pattern"]):
+            legacy = bench(lambda: filter_then_shuffle(bank, "medium", types, NUM_QUESTIONS), number)
+            indexed = bench(lambda: selector.select("medium", types, NUM_QUESTIONS), 2_000)
+            print(f"{size:>10} {','.join(types):>14} {legacy:>14.1f} {indexed:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
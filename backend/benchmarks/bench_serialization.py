@@ -0,0 +1,115 @@
+"""Response encoding cost of /api/test/start and /api/test/submit.
+
+Compares the previous path (a dict per question, or a TestResult model,
+sent through FastAPI's response_model validation, jsonable_encoder and
+JSONResponse) with the current one (question fragments pre-encoded with
+the bank and joined as bytes; orjson for results). Only the encoding is
+timed, no I/O. Run from the backend directory:
+
+    python -m benchmarks.bench_serialization [--questions 20] [--rounds 20000]
+"""
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+import server
+from server import TestResult, frontend_question
+
+
+def old_start(bank, indices, test_id):
+    content = {
+        "test_id": test_id,
+        "questions": [frontend_question(bank.questions[i], n) for n, i in enumerate(indices)],
+        "duration_minutes": len(indices),
+    }
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def new_start(bank, indices, test_id):
+    return (
+        b'{"test_id":' + orjson.dumps(test_id)
+        + b',"questions":' + bank.questions_json(indices)
+        + b',"duration_minutes":%d}' % len(indices)
+    )
+
+
+RESULT_FIELD = create_response_field("Response_submit", TestResult, mode="serialization")
+
+
+async def old_submit(test_id):
+    test_result = TestResult(
+        test_id=test_id, correct_answers=7, total_questions=10, iq_score=112,
+        accuracy_percentage=70.0, performance_level="Above Average"
+    )
+    result_doc = test_result.model_dump()
+    result_doc["timestamp"] = result_doc["timestamp"].isoformat()
+    content = await serialize_response(field=RESULT_FIELD, response_content=test_result)
+    return JSONResponse(content).body
+
+
+async def new_submit(test_id):
+    result_doc = {
+        "id": str(uuid.uuid4()), "test_id": test_id, "correct_answers": 7, "total_questions": 10,
+        "iq_score": 112, "accuracy_percentage": 70.0, "performance_level": "Above Average",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+    return ORJSONResponse({field: result_doc[field] for field in TestResult.model_fields}).body
+
+
+def run_sync(label, encode, rounds):
+    body = encode()
+    began = time.perf_counter()
+    for _ in range(rounds):
+        encode()
+    per_call = (time.perf_counter() - began) / rounds * 1e6
+    print(f"{label:>12}: {per_call:7.1f} us/response  {len(body):6d} bytes")
+    return per_call
+
+
+def run_async(label, encode, rounds):
+    import asyncio
+
+    async def loop():
+        body = await encode()
+        began = time.perf_counter()
+        for _ in range(rounds):
+            await encode()
+        return (time.perf_counter() - began) / rounds * 1e6, body
+    per_call, body = asyncio.run(loop())
+    print(f"{label:>12}: {per_call:7.1f} us/response  {len(body):6d} bytes")
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=20, help="questions per test")
+    parser.add_argument("--rounds", type=int, default=20000)
+    args = parser.parse_args()
+
+    bank = server.question_bank.current
+    rng = random.Random(5)
+    indices = [rng.randrange(len(bank.questions)) for _ in range(args.questions)]
+    test_id = str(uuid.uuid4())
+    assert orjson.loads(old_start(bank, indices, test_id)) == orjson.loads(new_start(bank, indices, test_id))
+
+    print(f"/api/test/start ({args.questions} questions)")
+    before = run_sync("previous", lambda: old_start(bank, indices, test_id), args.rounds)
+    after = run_sync("fragments", lambda: new_start(bank, indices, test_id), args.rounds)
+    print(f"{'speedup':>12}: {before / after:.1f}x")
+
+    print("/api/test/submit")
+    before = run_async("previous", lambda: old_submit(test_id), args.rounds)
+    after = run_async("orjson", lambda: new_submit(test_id), args.rounds)
+    print(f"{'speedup':>12}: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
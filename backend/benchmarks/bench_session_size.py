@@ -0,0 +1,65 @@
+"""test_sessions document size: full question copies vs compact references.
+
+Builds session documents exactly as /api/test/start writes them, with the
+built-in question bank, and reports their BSON size, the projected size of
+a million live sessions (the collection's working set) and the cost of
+decoding and resolving one at submit time. Run from the backend directory:
+
+    python -m benchmarks.bench_session_size [--sessions 1000000]
+"""
+import argparse
+import timeit
+import uuid
+from datetime import datetime, timezone
+
+import bson
+
+from question_bank import QuestionBank, pack_indices, unpack_indices
+from server import QUESTIONS_BANK
+
+DURATIONS = {"short": 5, "medium": 10, "long": 20}
+
+
+def session_doc(bank, duration, compact):
+    indices = bank.selector.select("all", ["all"], DURATIONS[duration])
+    if compact:
+        questions = {"question_indices": pack_indices(indices)}
+    else:
+        questions = {"questions": [bank.questions[i] for i in indices]}
+    return {
+        "test_id": str(uuid.uuid4()),
+        **questions,
+        "bank_version": bank.version,
+        "config": {"duration": duration, "question_types": ["all"], "difficulty": "all"},
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "created_at": datetime.now(timezone.utc),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=1_000_000, help="live sessions to project for")
+    args = parser.parse_args()
+
+    bank = QuestionBank(QUESTIONS_BANK).current
+    print(f"{'duration':>8} {'full':>8} {'compact':>8} {'saved':>6} "
+          f"{'full/{:,}'.format(args.sessions):>16} {'compact':>10} "
+          f"{'decode full':>12} {'decode+resolve':>15}")
+    for duration in DURATIONS:
+        full = bson.encode(session_doc(bank, duration, compact=False))
+        compact = bson.encode(session_doc(bank, duration, compact=True))
+
+        def resolve():
+            doc = bson.decode(compact)
+            return bank.resolve(unpack_indices(doc["question_indices"]))
+
+        n = 20_000
+        full_us = timeit.timeit(lambda: bson.decode(full), number=n) / n * 1e6
+        compact_us = timeit.timeit(resolve, number=n) / n * 1e6
+        print(f"{duration:>8} {len(full):>7}B {len(compact):>7}B {1 - len(compact) / len(full):>6.0%} "
+              f"{len(full) * args.sessions / 2**20:>14.0f}MB {len(compact) * args.sessions / 2**20:>8.0f}MB "
+              f"{full_us:>10.1f}us {compact_us:>13.1f}us")
+
+
+if __name__ == "__main__":
+    main()
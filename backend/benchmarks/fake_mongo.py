@@ -0,0 +1,525 @@
+"""In-memory stand-in for the parts of Motor the API uses.
+
+Good enough to drive the real app offline in benchmarks. Every operation
+yields to the event loop (optionally sleeping `latency` seconds to mimic a
+network round trip) and is counted in `FakeDatabase.ops`.
+"""
+import asyncio
+import copy
+from collections import Counter
+
+from bson import ObjectId
+from pymongo import UpdateOne, InsertOne, ReplaceOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+_MISSING = object()
+
+
+def _get(doc, path):
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return _MISSING
+        doc = doc[part]
+    return doc
+
+
+def _set(doc, path, value):
+    *parents, leaf = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[leaf] = value
+
+
+def _unset(doc, path):
+    *parents, leaf = path.split(".")
+    for part in parents:
+        doc = doc.get(part, {})
+    doc.pop(leaf, None)
+
+
+def _matches_condition(value, condition):
+    if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+        for op, arg in condition.items():
+            if op == "$in":
+                if value is _MISSING or value not in arg:
+                    return False
+            elif op == "$nin":
+                if value is not _MISSING and value in arg:
+                    return False
+            elif op == "$exists":
+                if (value is not _MISSING) != bool(arg):
+                    return False
+            elif op == "$ne":
+                if value == arg:
+                    return False
+            elif op in ("$gt", "$gte", "$lt", "$lte"):
+                if value is _MISSING or value is None:
+                    return False
+                if op == "$gt" and not value > arg:
+                    return False
+                if op == "$gte" and not value >= arg:
+                    return False
+                if op == "$lt" and not value < arg:
+                    return False
+                if op == "$lte" and not value <= arg:
+                    return False
+            else:
+                raise NotImplementedError(f"Query operator {op}")
+        return True
+    if condition is None:
+        return value is _MISSING or value is None
+    return value == condition
+
+
+def matches(doc, query):
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            if not any(matches(doc, q) for q in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, q) for q in condition):
+                return False
+        elif not _matches_condition(_get(doc, key), condition):
+            return False
+    return True
+
+
+def project(doc, projection):
+    if not projection:
+        return copy.deepcopy(doc)
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    if include:
+        out = {}
+        for key in include:
+            value = _get(doc, key)
+            if value is not _MISSING:
+                _set(out, key, copy.deepcopy(value))
+        if projection.get("_id", 1) and "_id" in doc:
+            out["_id"] = doc["_id"]
+        return out
+    out = copy.deepcopy(doc)
+    for key, value in projection.items():
+        if not value:
+            _unset(out, key)
+    return out
+
+
+def apply_update(doc, update, inserting=False):
+    for op, fields in update.items():
+        if op == "$set":
+            for path, value in fields.items():
+                _set(doc, path, copy.deepcopy(value))
+        elif op == "$setOnInsert":
+            if inserting:
+                for path, value in fields.items():
+                    _set(doc, path, copy.deepcopy(value))
+        elif op == "$inc":
+            for path, value in fields.items():
+                current = _get(doc, path)
+                _set(doc, path, (0 if current is _MISSING else current) + value)
+        elif op == "$unset":
+            for path in fields:
+                _unset(doc, path)
+        elif op == "$push":
+            for path, value in fields.items():
+                current = _get(doc, path)
+                items = [] if current is _MISSING else current
+                if isinstance(value, dict) and "$each" in value:
+                    items.extend(copy.deepcopy(value["$each"]))
+                else:
+                    items.append(copy.deepcopy(value))
+                _set(doc, path, items)
+        elif op == "$max":
+            for path, value in fields.items():
+                current = _get(doc, path)
+                if current is _MISSING or value > current:
+                    _set(doc, path, value)
+        else:
+            raise NotImplementedError(f"Update operator {op}")
+
+
+def _sorted(docs, sort):
+    # Stable sorts applied from the last key to the first give a multi-key
+    # order; missing values sort first, as in MongoDB
+    for field, direction in reversed(sort):
+        def key(doc):
+            value = _get(doc, field)
+            return (value is not _MISSING and value is not None, value if value is not _MISSING else None)
+        docs.sort(key=key, reverse=direction < 0)
+    return docs
+
+
+class FakeCursor:
+    def __init__(self, collection, query, projection):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort = None
+        self._skip = 0
+        self._limit = 0
+        self._results = None
+
+    def sort(self, key, direction=1):
+        self._sort = key if isinstance(key, list) else [(key, direction)]
+        return self
+
+    def skip(self, n):
+        self._skip = n
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def _materialize(self):
+        docs = [d for d in self._collection._candidates(self._query) if matches(d, self._query)]
+        if self._sort:
+            _sorted(docs, self._sort)
+        docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        return [project(d, self._projection) for d in docs]
+
+    async def explain(self):
+        await self._collection._db._op(self._collection.name, "explain")
+        fields = [f for f in (self._query or {}) if f in self._collection._lookup]
+        if fields:
+            plan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": f"{fields[0]}"}}
+        else:
+            plan = {"stage": "COLLSCAN"}
+        return {"queryPlanner": {"winningPlan": plan}}
+
+    async def to_list(self, length=None):
+        await self._collection._db._op(self._collection.name, "find")
+        docs = self._materialize()
+        return docs if length is None else docs[:length]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._results is None:
+            await self._collection._db._op(self._collection.name, "find")
+            self._results = iter(self._materialize())
+        try:
+            return next(self._results)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+def _evaluate(expr, doc):
+    if isinstance(expr, str) and expr.startswith("$"):
+        value = _get(doc, expr[1:])
+        return None if value is _MISSING else value
+    if isinstance(expr, dict) and not any(key.startswith("$") for key in expr):
+        return {key: _evaluate(value, doc) for key, value in expr.items()}
+    if isinstance(expr, dict) and len(expr) == 1:
+        (op, args), = expr.items()
+        if op in ("$substrBytes", "$substr", "$substrCP"):
+            value, start, length = (_evaluate(a, doc) for a in args)
+            return (value or "")[start:start + length]
+        if op in ("$sum", "$max", "$min", "$first", "$push"):
+            return _evaluate(args, doc)
+        raise NotImplementedError(f"Expression operator {op}")
+    return expr
+
+
+def run_pipeline(docs, pipeline):
+    for stage in pipeline:
+        (op, spec), = stage.items()
+        if op == "$match":
+            docs = [d for d in docs if matches(d, spec)]
+        elif op == "$project":
+            docs = [project(d, spec) for d in docs]
+        elif op == "$sort":
+            docs = _sorted(list(docs), list(spec.items()))
+        elif op == "$limit":
+            docs = docs[:spec]
+        elif op == "$count":
+            docs = [{spec: len(docs)}] if docs else []
+        elif op == "$facet":
+            docs = [{name: run_pipeline(list(docs), sub) for name, sub in spec.items()}]
+        elif op == "$group":
+            groups = {}
+            for doc in docs:
+                key = _evaluate(spec["_id"], doc)
+                hashable = repr(key)
+                group = groups.setdefault(hashable, {"_id": key})
+                for field, accumulator in spec.items():
+                    if field == "_id":
+                        continue
+                    (acc, expr), = accumulator.items()
+                    value = _evaluate(expr, doc)
+                    if acc == "$sum":
+                        group[field] = group.get(field, 0) + (value or 0)
+                    elif acc == "$max":
+                        group[field] = value if field not in group else max(group[field], value)
+                    elif acc == "$min":
+                        group[field] = value if field not in group else min(group[field], value)
+                    elif acc == "$first":
+                        group.setdefault(field, value)
+                    elif acc == "$push":
+                        group.setdefault(field, []).append(value)
+                    else:
+                        raise NotImplementedError(f"Accumulator {acc}")
+            docs = list(groups.values())
+        else:
+            raise OperationFailure(f"Unrecognized pipeline stage name: '{op}'", 40324)
+    return docs
+
+
+class _AggregateCursor:
+    def __init__(self, collection, pipeline):
+        self._collection = collection
+        self._pipeline = pipeline
+
+    async def to_list(self, length=None):
+        await self._collection._db._op(self._collection.name, "aggregate")
+        docs = run_pipeline([copy.deepcopy(d) for d in self._collection._docs.values()], self._pipeline)
+        return docs if length is None else docs[:length]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in await self.to_list():
+            yield doc
+
+
+class _Result:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeCollection:
+    def __init__(self, db, name):
+        self._db = db
+        self.database = db
+        self.name = name
+        self._docs = {}
+        self._unique = []
+        # Single-field equality lookups for indexed fields, so lookups by
+        # test_id stay O(1) as in a real indexed collection
+        self._lookup = {}
+        self.indexes = {"_id_": {"key": [("_id", 1)]}}
+
+    def _candidates(self, query):
+        query = query or {}
+        if "_id" in query and not isinstance(query["_id"], dict):
+            doc = self._docs.get(query["_id"])
+            return [doc] if doc is not None else []
+        for field, values in self._lookup.items():
+            if field in query and not isinstance(query[field], dict):
+                return [self._docs[i] for i in values.get(query[field], ())]
+            if field in query and list(query[field]) == ["$in"]:
+                ids = dict.fromkeys(i for value in query[field]["$in"] for i in values.get(value, ()))
+                return [self._docs[i] for i in ids]
+        return list(self._docs.values())
+
+    def _check_unique(self, doc, ignore_id=None):
+        for fields in self._unique:
+            values = tuple(_get(doc, f) for f in fields)
+            if all(v is _MISSING for v in values):
+                continue
+            for other in self._candidates({fields[0]: values[0]}) if len(fields) == 1 else self._docs.values():
+                if other["_id"] != ignore_id and tuple(_get(other, f) for f in fields) == values:
+                    raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name}", 11000)
+
+    def _store(self, doc):
+        old = self._docs.get(doc["_id"])
+        if old is not None:
+            self._discard(old)
+        self._docs[doc["_id"]] = doc
+        for field, values in self._lookup.items():
+            value = _get(doc, field)
+            if value is not _MISSING:
+                values.setdefault(value, set()).add(doc["_id"])
+
+    def _discard(self, doc):
+        del self._docs[doc["_id"]]
+        for field, values in self._lookup.items():
+            value = _get(doc, field)
+            if value is not _MISSING:
+                values.get(value, set()).discard(doc["_id"])
+
+    def _insert(self, doc):
+        doc.setdefault("_id", ObjectId())
+        if doc["_id"] in self._docs:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name}", 11000)
+        self._check_unique(doc)
+        self._store(copy.deepcopy(doc))
+        return doc["_id"]
+
+    async def insert_one(self, doc, **kwargs):
+        await self._db._op(self.name, "insert")
+        return _Result(inserted_id=self._insert(doc))
+
+    async def insert_many(self, docs, ordered=True, **kwargs):
+        await self._db._op(self.name, "insert")
+        inserted, errors = [], []
+        for index, doc in enumerate(docs):
+            try:
+                inserted.append(self._insert(doc))
+            except DuplicateKeyError as e:
+                errors.append({"index": index, "code": 11000, "errmsg": str(e)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted)})
+        return _Result(inserted_ids=inserted)
+
+    def _find_first(self, query, sort=None):
+        docs = [d for d in self._candidates(query) if matches(d, query)]
+        if sort:
+            _sorted(docs, sort)
+        return docs[0] if docs else None
+
+    async def find_one(self, query=None, projection=None, sort=None, **kwargs):
+        await self._db._op(self.name, "find")
+        doc = self._find_first(query, sort)
+        return project(doc, projection) if doc is not None else None
+
+    def find(self, query=None, projection=None, **kwargs):
+        return FakeCursor(self, query, projection)
+
+    def _update(self, query, update, upsert, many=False):
+        targets = [d for d in self._candidates(query) if matches(d, query)]
+        if not many:
+            targets = targets[:1]
+        for doc in targets:
+            updated = copy.deepcopy(doc)
+            apply_update(updated, update)
+            self._check_unique(updated, ignore_id=doc["_id"])
+            self._store(updated)
+        if targets or not upsert:
+            return _Result(matched_count=len(targets), modified_count=len(targets), upserted_id=None)
+        doc = {k: v for k, v in (query or {}).items() if not k.startswith("$") and not isinstance(v, dict)}
+        apply_update(doc, update, inserting=True)
+        return _Result(matched_count=0, modified_count=0, upserted_id=self._insert(doc))
+
+    async def update_one(self, query, update, upsert=False, **kwargs):
+        await self._db._op(self.name, "update")
+        return self._update(query, update, upsert)
+
+    async def update_many(self, query, update, upsert=False, **kwargs):
+        await self._db._op(self.name, "update")
+        return self._update(query, update, upsert, many=True)
+
+    async def find_one_and_update(self, query, update, upsert=False, projection=None, **kwargs):
+        await self._db._op(self.name, "update")
+        before = self._find_first(query)
+        self._update(query, update, upsert)
+        return project(before, projection) if before is not None else None
+
+    async def replace_one(self, query, replacement, upsert=False, **kwargs):
+        await self._db._op(self.name, "update")
+        return self._replace(query, replacement, upsert)
+
+    def _replace(self, query, replacement, upsert):
+        doc = self._find_first(query)
+        if doc is None:
+            if upsert:
+                new = copy.deepcopy(replacement)
+                if "_id" in (query or {}):
+                    new["_id"] = query["_id"]
+                self._insert(new)
+            return _Result(matched_count=0)
+        new = copy.deepcopy(replacement)
+        new["_id"] = doc["_id"]
+        self._store(new)
+        return _Result(matched_count=1)
+
+    async def delete_many(self, query, **kwargs):
+        await self._db._op(self.name, "delete")
+        docs = [d for d in self._candidates(query) if matches(d, query)]
+        for doc in docs:
+            self._discard(doc)
+        return _Result(deleted_count=len(docs))
+
+    async def delete_one(self, query, **kwargs):
+        await self._db._op(self.name, "delete")
+        doc = self._find_first(query)
+        if doc is not None:
+            self._discard(doc)
+        return _Result(deleted_count=int(doc is not None))
+
+    async def count_documents(self, query, **kwargs):
+        await self._db._op(self.name, "count")
+        return sum(1 for d in self._candidates(query) if matches(d, query))
+
+    async def estimated_document_count(self, **kwargs):
+        await self._db._op(self.name, "count")
+        return len(self._docs)
+
+    async def bulk_write(self, requests, ordered=True, **kwargs):
+        await self._db._op(self.name, "bulk_write")
+        for request in requests:
+            if isinstance(request, UpdateOne):
+                self._update(request._filter, request._doc, request._upsert)
+            elif isinstance(request, InsertOne):
+                self._insert(request._doc)
+            elif isinstance(request, ReplaceOne):
+                self._replace(request._filter, request._doc, request._upsert)
+            else:
+                raise NotImplementedError(type(request).__name__)
+        return _Result(acknowledged=True)
+
+    async def create_index(self, keys, unique=False, name=None, **kwargs):
+        await self._db._op(self.name, "create_index")
+        keys = keys if isinstance(keys, list) else [(keys, 1)]
+        name = name or "_".join(f"{k}_{d}" for k, d in keys)
+        if unique:
+            self._unique.append([k for k, _ in keys])
+        if len(keys) == 1 and keys[0][0] not in self._lookup:
+            field = keys[0][0]
+            self._lookup[field] = {}
+            for doc in self._docs.values():
+                value = _get(doc, field)
+                if value is not _MISSING:
+                    self._lookup[field].setdefault(value, set()).add(doc["_id"])
+        self.indexes[name] = {"key": keys, "unique": unique, **kwargs}
+        return name
+
+    async def index_information(self):
+        await self._db._op(self.name, "list_indexes")
+        return copy.deepcopy(self.indexes)
+
+    async def drop_index(self, name):
+        await self._db._op(self.name, "drop_index")
+        index = self.indexes.pop(name)
+        if index.get("unique"):
+            self._unique.remove([k for k, _ in index["key"]])
+
+    def aggregate(self, pipeline, **kwargs):
+        return _AggregateCursor(self, pipeline)
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", 40573)
+
+
+class FakeDatabase:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.ops = Counter()
+        self._collections = {}
+
+    async def _op(self, collection, operation):
+        self.ops[(collection, operation)] += 1
+        await asyncio.sleep(self.latency)
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(self, name)
+        return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def command(self, name, *args, **kwargs):
+        await self._op("admin", name)
+        return {"ok": 1.0}
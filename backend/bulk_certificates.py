@@ -0,0 +1,107 @@
+import asyncio
+import io
+import json
+import re
+import zipfile
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Dict, List
+
+
+class _ChunkWriter(io.RawIOBase):
+    """Write-only file object that hands out what was written since the last drain."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def certificate_filename(name: str, test_id: str) -> str:
+    safe_name = re.sub(r"[^\w.-]+", "_", name).strip("_") or "certificate"
+    return f"MindMeter_Certificate_{safe_name}_{test_id[:8]}.pdf"
+
+
+async def stream_certificate_zip(
+    items: List[dict],
+    results: Dict[str, dict],
+    render: Callable[[dict, dict], Awaitable[bytes]],
+    window: int,
+) -> AsyncIterator[bytes]:
+    """Yield a ZIP of certificates piece by piece, in the order requested.
+
+    Up to `window` certificates render concurrently; each PDF is written to
+    the archive and flushed to the client as soon as it and everything before
+    it are done, so memory stays proportional to the window rather than the
+    cohort. Items without a result, or whose render fails, are listed in a
+    trailing `manifest.json` instead of failing the archive.
+    """
+    writer = _ChunkWriter()
+    archive = zipfile.ZipFile(writer, mode="w", compression=zipfile.ZIP_STORED)
+    manifest = []
+    pending = deque()
+    items_iter = iter(items)
+    used_names = set()
+
+    def unique_name(filename: str) -> str:
+        # Different names can sanitize to the same file name; number the
+        # later ones rather than writing two entries of one name
+        stem, n = filename.removesuffix(".pdf"), 1
+        while filename in used_names:
+            n += 1
+            filename = f"{stem}_{n}.pdf"
+        used_names.add(filename)
+        return filename
+
+    def schedule():
+        for item in items_iter:
+            result = results.get(item["test_id"])
+            if result is None:
+                pending.append((item, None))
+            else:
+                pending.append((item, asyncio.ensure_future(render(result, item))))
+            if len(pending) >= window:
+                return
+
+    schedule()
+    try:
+        while pending:
+            item, job = pending.popleft()
+            entry = {"test_id": item["test_id"], "name": item["name"]}
+            if job is None:
+                entry["status"] = "not_found"
+            else:
+                try:
+                    pdf = await job
+                except Exception as e:
+                    entry.update(status="failed", error=str(e) or type(e).__name__)
+                else:
+                    entry.update(status="ok", file=unique_name(certificate_filename(item["name"], item["test_id"])))
+                    archive.writestr(entry["file"], pdf)
+            manifest.append(entry)
+            schedule()
+            chunk = writer.drain()
+            if chunk:
+                yield chunk
+
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+        archive.close()
+        yield writer.drain()
+    finally:
+        for _, job in pending:
+            if job is not None:
+                job.cancel()
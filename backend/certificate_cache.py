@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CertificateCache:
+    """Content-addressed cache of rendered certificate PDFs.
+
+    PDFs are keyed by the digest of everything printed on them. A size-bounded
+    in-memory LRU sits in front of an optional directory on local disk,
+    written through on every insert so other workers on the host (and the
+    next process after a restart) can reuse the file. Separately, a bounded
+    map from request keys to digests lets a repeated download be answered
+    without looking the result up again.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[str] = None,
+                 disk_max_bytes: int = 0, max_aliases: int = 100000):
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self.max_aliases = max_aliases
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._aliases: "OrderedDict[Hashable, str]" = OrderedDict()
+        self.counters = {
+            "hits": 0, "disk_hits": 0, "misses": 0,
+            "evictions": 0, "disk_writes": 0, "disk_evictions": 0,
+        }
+        self._disk_bytes = 0
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(p.stat().st_size for p in self.disk_dir.glob("*/*.pdf"))
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "aliases": len(self._aliases),
+        }
+
+    def lookup(self, request_key: Hashable) -> Optional[str]:
+        digest = self._aliases.get(request_key)
+        if digest is not None:
+            self._aliases.move_to_end(request_key)
+        return digest
+
+    def remember(self, request_key: Hashable, digest: str):
+        self._aliases[request_key] = digest
+        self._aliases.move_to_end(request_key)
+        while len(self._aliases) > self.max_aliases:
+            self._aliases.popitem(last=False)
+
+    async def get(self, digest: str) -> Optional[bytes]:
+        pdf = self._memory.get(digest)
+        if pdf is not None:
+            self._memory.move_to_end(digest)
+            self.counters["hits"] += 1
+            return pdf
+        if self.disk_dir:
+            pdf = await asyncio.to_thread(self._read_disk, digest)
+            if pdf is not None:
+                self.counters["disk_hits"] += 1
+                self._store_memory(digest, pdf)
+                return pdf
+        self.counters["misses"] += 1
+        return None
+
+    async def put(self, digest: str, pdf: bytes):
+        self._store_memory(digest, pdf)
+        if self.disk_dir:
+            await asyncio.to_thread(self._write_disk, digest, pdf)
+
+    def _store_memory(self, digest: str, pdf: bytes):
+        if len(pdf) > self.max_bytes or digest in self._memory:
+            return
+        self._memory[digest] = pdf
+        self._memory_bytes += len(pdf)
+        while self._memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.counters["evictions"] += 1
+
+    def _path(self, digest: str) -> Path:
+        return self.disk_dir / digest[:2] / f"{digest}.pdf"
+
+    def _read_disk(self, digest: str) -> Optional[bytes]:
+        try:
+            return self._path(digest).read_bytes()
+        except OSError:
+            return None
+
+    def _write_disk(self, digest: str, pdf: bytes):
+        path = self._path(digest)
+        if path.exists():
+            return
+        try:
+            path.parent.mkdir(exist_ok=True)
+            # Write to a temp file and rename so readers never see a partial PDF
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(pdf)
+            os.replace(tmp, path)
+            self.counters["disk_writes"] += 1
+            self._disk_bytes += len(pdf)
+            if self.disk_max_bytes and self._disk_bytes > self.disk_max_bytes:
+                self._trim_disk()
+        except OSError as e:
+            logger.warning(f"Certificate cache write failed: {e}")
+
+    def _trim_disk(self):
+        # The directory may be shared by several workers, so re-measure it and
+        # then drop the oldest files until it is back under 90% of the budget
+        files = []
+        for p in self.disk_dir.glob("*/*.pdf"):
+            try:
+                files.append((p.stat(), p))
+            except OSError:
+                continue
+        total = sum(st.st_size for st, _ in files)
+        target = self.disk_max_bytes * 0.9
+        for st, p in sorted(files, key=lambda item: item[0].st_mtime):
+            if total <= target:
+                break
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            total -= st.st_size
+            self.counters["disk_evictions"] += 1
+        self._disk_bytes = total
@@ -0,0 +1,374 @@
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import time
+import zlib
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from metrics import REGISTRY, record_span
+
+# ReportLab (~50 ms to import) is imported inside the functions that draw,
+# so importing this module stays cheap: the API process only needs it for
+# in-process renders, and its worker processes load it while warming up
+
+logger = logging.getLogger(__name__)
+
+# Measured from the caller's side, so queueing for a worker is included
+CERTIFICATE_RENDER_SECONDS = REGISTRY.histogram(
+    "certificate_render_duration_seconds", "Certificate PDF renders by outcome", ("outcome",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+CERTIFICATE_RENDERS_REJECTED = REGISTRY.counter(
+    "certificate_renders_rejected", "Renders refused because the render queue was full"
+)
+
+
+class RendererSaturated(Exception):
+    """Raised when too many certificates are already queued for rendering."""
+
+
+def issue_date() -> str:
+    return datetime.now(timezone.utc).strftime("%B %d, %Y")
+
+
+def certificate_fields(test_result: dict, name: str, test_id: str, issued_on: Optional[str] = None) -> dict:
+    """Everything a certificate shows, as plain picklable values."""
+    return {
+        "name": name,
+        "test_id": test_id,
+        "iq_score": test_result["iq_score"],
+        "performance_level": test_result.get("performance_level", "N/A"),
+        "accuracy_percentage": test_result.get("accuracy_percentage", 0),
+        "correct_answers": test_result["correct_answers"],
+        "total_questions": test_result["total_questions"],
+        "percentile": test_result.get("percentile"),
+        "issued_on": issued_on or issue_date(),
+    }
+
+
+@dataclass(frozen=True)
+class Branding:
+    title: str = "Certificate of Achievement"
+    subtitle: str = "MindMeter IQ Intelligence Test"
+    footer: str = "MindMeter - Intelligence Testing Platform"
+    primary_color: str = "#7c3aed"
+    accent_color: str = "#ec4899"
+    name_color: str = "#1f2937"
+
+
+DEFAULT_BRANDING = Branding()
+
+# Bump whenever the certificate layout changes, so cached PDFs are not reused
+TEMPLATE_VERSION = 2
+
+
+def certificate_digest(fields: dict, branding: Optional[Branding] = None) -> str:
+    """Content address of a certificate: everything printed on it plus the
+    layout it is printed with."""
+    payload = json.dumps(
+        [TEMPLATE_VERSION, repr(branding or DEFAULT_BRANDING), fields],
+        sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+# Fonts the certificate uses, registered with every document in this order so
+# the static layer's cached operators refer to the same internal font names
+FONTS = ("Helvetica", "Helvetica-Bold", "Helvetica-Oblique")
+
+
+def _register_fonts(c):
+    for font in FONTS:
+        c._doc.getInternalFontName(font)
+
+
+def _draw_static(c, branding: Branding):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    width, height = A4
+
+    # Decorative borders
+    c.setStrokeColor(colors.HexColor(branding.primary_color))
+    c.setLineWidth(3)
+    c.rect(40, 40, width - 80, height - 80)
+
+    c.setStrokeColor(colors.HexColor(branding.accent_color))
+    c.setLineWidth(1)
+    c.rect(50, 50, width - 100, height - 100)
+
+    # Title
+    c.setFont("Helvetica-Bold", 36)
+    c.setFillColor(colors.HexColor(branding.primary_color))
+    c.drawCentredString(width / 2, height - 120, branding.title)
+
+    # Subtitle
+    c.setFillColor(colors.black)
+    c.setFont("Helvetica", 16)
+    c.drawCentredString(width / 2, height - 160, branding.subtitle)
+
+    # This certifies that text
+    c.setFont("Helvetica", 14)
+    c.drawCentredString(width / 2, height - 230, "This certifies that")
+
+    # Achievement text
+    c.drawCentredString(width / 2, height - 330, "has successfully completed the MindMeter IQ assessment")
+    c.drawCentredString(width / 2, height - 355, "with the following results:")
+
+    # Score section
+    c.setFont("Helvetica", 16)
+    c.drawCentredString(width / 2, height - 410, "IQ Score")
+
+    # Footer
+    c.setFont("Helvetica", 10)
+    c.drawCentredString(width / 2, 80, branding.footer)
+
+
+def _draw_dynamic(c, fields: dict, branding: Branding):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    width, height = A4
+
+    # Name
+    c.setFont("Helvetica-Bold", 32)
+    c.setFillColor(colors.HexColor(branding.name_color))
+    c.drawCentredString(width / 2, height - 280, fields["name"])
+
+    # IQ Score value
+    c.setFont("Helvetica-Bold", 48)
+    c.setFillColor(colors.HexColor(branding.primary_color))
+    c.drawCentredString(width / 2, height - 465, str(fields["iq_score"]))
+
+    # Performance level
+    c.setFillColor(colors.black)
+    c.setFont("Helvetica", 14)
+    c.drawCentredString(width / 2, height - 505, f"Performance Level: {fields['performance_level']}")
+
+    # Stats
+    c.setFont("Helvetica", 12)
+    accuracy = fields["accuracy_percentage"]
+    c.drawCentredString(width / 2, height - 540, f"Accuracy: {accuracy:.0f}% | Questions: {fields['correct_answers']}/{fields['total_questions']} correct")
+    if fields.get("percentile") is not None:
+        c.drawCentredString(width / 2, height - 560, f"Scored higher than {fields['percentile']}% of test takers")
+
+    # Date
+    c.setFont("Helvetica-Oblique", 11)
+    c.drawCentredString(width / 2, 120, f"Issued on {fields['issued_on']}")
+
+    # Certificate ID
+    c.setFont("Helvetica", 10)
+    c.drawCentredString(width / 2, 65, f"Certificate ID: {fields['test_id'][:16]}")
+
+
+def _layer_operators(draw, *args) -> Tuple[List[str], dict]:
+    """Run a drawing function on a scratch canvas and return the PDF
+    operators it produced, plus the fonts it ended up using."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    c = canvas.Canvas(io.BytesIO(), pagesize=A4)
+    _register_fonts(c)
+    start = len(c._code)
+    draw(c, *args)
+    return c._code[start:], dict(c._doc.fontMapping)
+
+
+def _pdf_object(number: int, body: bytes) -> bytes:
+    return b"%d 0 obj\n%s\nendobj\n" % (number, body)
+
+
+def _pdf_stream(dictionary: bytes, data: bytes) -> bytes:
+    data = zlib.compress(data)
+    return b"<< %s /Filter /FlateDecode /Length %d >>\nstream\n%s\nendstream" % (dictionary, len(data), data)
+
+
+class CertificateTemplate:
+    """A certificate PDF with everything but the per-person text pre-built.
+
+    The static layer (borders, headings, footer) is laid out once with
+    ReportLab and stored as a compressed form XObject alongside the rest of
+    the document skeleton. Rendering a certificate only lays out the dynamic
+    fields and appends them as the page content, which draws the form first.
+    """
+
+    CONTENT_OBJECT = 8
+
+    def __init__(self, branding: Branding = DEFAULT_BRANDING):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.rl_accel import fp_str
+        self.branding = branding
+        operators, fonts = _layer_operators(_draw_static, branding)
+        self.fonts = fonts
+        width, height = A4
+        font_resources = b"<< %s >>" % b" ".join(
+            b"%s %d 0 R" % (fonts[name].encode(), 4 + i) for i, name in enumerate(FONTS)
+        )
+        objects = [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            b"<< /Type /Pages /Kids [ 3 0 R ] /Count 1 >>",
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [ 0 0 %s %s ] "
+            b"/Resources << /Font %s /XObject << /Static 7 0 R >> /ProcSet [ /PDF /Text ] >> "
+            b"/Contents %d 0 R >>" % (
+                fp_str(width).encode(), fp_str(height).encode(), font_resources, self.CONTENT_OBJECT
+            ),
+            *(
+                b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>" % name.encode()
+                for name in FONTS
+            ),
+            _pdf_stream(
+                b"/Type /XObject /Subtype /Form /BBox [ 0 0 %s %s ] /Resources << /Font %s >>" % (
+                    fp_str(width).encode(), fp_str(height).encode(), font_resources
+                ),
+                "\n".join(operators).encode("latin-1")
+            ),
+        ]
+        head = b"%PDF-1.4\n%\x93\x8c\x8b\x9e\n"
+        self._offsets = []
+        for number, body in enumerate(objects, start=1):
+            self._offsets.append(len(head))
+            head += _pdf_object(number, body)
+        self._head = head
+
+    def render(self, fields: dict) -> bytes:
+        operators, fonts = _layer_operators(_draw_dynamic, fields, self.branding)
+        if fonts != self.fonts:
+            # Characters outside the template's fonts pulled in fallback
+            # fonts; let ReportLab build the whole document instead
+            return render_full_certificate(fields, self.branding)
+
+        content = _pdf_object(self.CONTENT_OBJECT, _pdf_stream(
+            b"", ("q\n/Static Do\nQ\n" + "\n".join(operators)).encode("latin-1")
+        ))
+        offsets = self._offsets + [len(self._head)]
+        xref_at = len(self._head) + len(content)
+        xref = b"xref\n0 %d\n0000000000 65535 f \n%s" % (
+            len(offsets) + 1, b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+        )
+        trailer = b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets) + 1, xref_at)
+        return self._head + content + xref + trailer
+
+
+def render_full_certificate(fields: dict, branding: Branding = DEFAULT_BRANDING) -> bytes:
+    """Lay out the whole certificate with ReportLab, static layer included."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    _draw_static(c, branding)
+    _draw_dynamic(c, fields, branding)
+    c.save()
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=None)
+def certificate_template(branding: Branding = DEFAULT_BRANDING) -> CertificateTemplate:
+    return CertificateTemplate(branding)
+
+
+def render_certificate(fields: dict, branding: Branding = DEFAULT_BRANDING) -> bytes:
+    return certificate_template(branding).render(fields)
+
+
+def _warm_up():
+    # Runs in each worker so the first real render does not pay for startup
+    render_certificate({
+        "name": "", "test_id": "", "iq_score": 0, "performance_level": "",
+        "accuracy_percentage": 0, "correct_answers": 0, "total_questions": 0, "percentile": 0,
+        "issued_on": "",
+    })
+
+
+class CertificateRenderer:
+    """Renders certificate PDFs in a bounded pool of worker processes.
+
+    Rendering is CPU-bound, so doing it on the event loop stalls every other
+    request. At most `max_queue` renders may be in flight (running or
+    waiting); beyond that `render` raises `RendererSaturated` right away so
+    the caller can shed load instead of queueing without limit. With
+    `workers=0` renders run on a thread instead, for development.
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 8, timeout: float = 10.0):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._warming: Optional[asyncio.Future] = None
+
+    def start(self):
+        """Start the workers and warm them up in the background.
+
+        Startup does not wait for the warm-up: a render arriving before it
+        is done just queues behind it, as it would behind any other render.
+        """
+        loop = asyncio.get_running_loop()
+        if self.workers <= 0:
+            # Load ReportLab and build the template off the event loop now,
+            # rather than inside the first certificate request
+            self._warming = asyncio.ensure_future(asyncio.to_thread(_warm_up))
+        else:
+            # spawn, not fork: the parent already runs an event loop and Motor's threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            self._warming = asyncio.gather(*(
+                loop.run_in_executor(self._executor, _warm_up) for _ in range(self.workers)
+            ))
+        started = time.perf_counter()
+        self._warming.add_done_callback(lambda job: self._warmed(job, time.perf_counter() - started))
+
+    def _warmed(self, job: asyncio.Future, elapsed: float):
+        if job.cancelled() or isinstance(job.exception(), (asyncio.CancelledError, CancelledError)):
+            # Shut down before it was done
+            return
+        if job.exception() is not None:
+            logger.error(f"Certificate renderer warm-up failed: {job.exception()}")
+            return
+        where = f"{self.workers} worker processes" if self.workers > 0 else "in-process renders"
+        logger.info(f"Certificate renderer ready with {where}, warmed up in {elapsed * 1000:.0f} ms")
+
+    async def close(self):
+        if self._warming is not None:
+            self._warming.cancel()
+            self._warming = None
+        if self._executor:
+            executor, self._executor = self._executor, None
+            # Joining the worker processes blocks until they exit; keep the
+            # event loop serving whatever else is shutting down meanwhile
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+    async def render(self, fields: dict) -> bytes:
+        if self.in_flight >= self.max_queue:
+            CERTIFICATE_RENDERS_REJECTED.inc()
+            raise RendererSaturated()
+        loop = asyncio.get_running_loop()
+        if self._executor is None:
+            job = asyncio.ensure_future(asyncio.to_thread(render_certificate, fields))
+        else:
+            job = loop.run_in_executor(self._executor, render_certificate, fields)
+        # A timed-out render keeps its worker busy, so its slot is only
+        # released once the job itself finishes
+        self.in_flight += 1
+        job.add_done_callback(self._release)
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            pdf = await asyncio.wait_for(asyncio.shield(job), self.timeout)
+            outcome = "ok"
+            return pdf
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            CERTIFICATE_RENDER_SECONDS.observe(elapsed, outcome)
+            record_span("render", "certificate", elapsed)
+
+    def _release(self, _job):
+        self.in_flight -= 1
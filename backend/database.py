@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
+
+from metrics import REGISTRY, record_span
+
+logger = logging.getLogger(__name__)
+
+MONGO_OPERATION_SECONDS = REGISTRY.histogram(
+    "mongo_operation_duration_seconds", "Time Motor calls take, by collection and operation",
+    ("collection", "operation"),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+# Collection methods that are timed; anything else (watch, database, ...)
+# is handed through untouched
+TIMED_OPERATIONS = frozenset((
+    "find_one", "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+    "delete_one", "delete_many", "find_one_and_update", "find_one_and_replace", "find_one_and_delete",
+    "bulk_write", "count_documents", "estimated_document_count", "distinct",
+    "create_index", "create_indexes", "index_information", "drop_index",
+))
+CURSOR_OPERATIONS = frozenset(("find", "aggregate"))
+
+
+def _observe(collection: str, operation: str, started: float):
+    elapsed = time.perf_counter() - started
+    MONGO_OPERATION_SECONDS.observe(elapsed, collection, operation)
+    record_span("mongo", f"{collection}.{operation}", elapsed)
+
+
+class TimedCursor:
+    """A Motor cursor whose fetches are timed as one operation.
+
+    The time spent waiting in `to_list` or across all `async for` steps is
+    recorded once, when the cursor is exhausted or closed; chained
+    modifiers return the wrapper so it survives `.sort(...).limit(...)`.
+    """
+
+    def __init__(self, cursor, collection: str, operation: str):
+        self._cursor = cursor
+        self._collection = collection
+        self._operation = operation
+        self._iterator = None
+        self._spent = 0.0
+        self._done = False
+
+    def __getattr__(self, name):
+        attribute = getattr(self._cursor, name)
+        if not callable(attribute):
+            return attribute
+
+        def chained(*args, **kwargs):
+            result = attribute(*args, **kwargs)
+            return self if result is self._cursor else result
+        return chained
+
+    def _finish(self):
+        if not self._done:
+            self._done = True
+            MONGO_OPERATION_SECONDS.observe(self._spent, self._collection, self._operation)
+            record_span("mongo", f"{self._collection}.{self._operation}", self._spent)
+
+    def __aiter__(self):
+        self._iterator = self._cursor.__aiter__()
+        return self
+
+    async def __anext__(self):
+        started = time.perf_counter()
+        try:
+            return await self._iterator.__anext__()
+        except StopAsyncIteration:
+            self._spent += time.perf_counter() - started
+            self._finish()
+            raise
+        finally:
+            if not self._done:
+                self._spent += time.perf_counter() - started
+
+    async def to_list(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await self._cursor.to_list(*args, **kwargs)
+        finally:
+            self._spent += time.perf_counter() - started
+            self._finish()
+
+    async def close(self):
+        self._finish()
+        await self._cursor.close()
+
+
+class TimedCollection:
+    """A Motor collection whose calls are timed into the Mongo latency metric."""
+
+    def __init__(self, collection, name: str):
+        self._collection = collection
+        self._name = name
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if name in TIMED_OPERATIONS:
+            async def timed(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await attribute(*args, **kwargs)
+                finally:
+                    _observe(self._name, name, started)
+        elif name in CURSOR_OPERATIONS:
+            def timed(*args, **kwargs):
+                return TimedCursor(attribute(*args, **kwargs), self._name, name)
+        else:
+            return attribute
+        # Cached on the instance, so later lookups skip __getattr__
+        setattr(self, name, timed)
+        return timed
+
+
+class TimedDatabase:
+    """A Motor database handing out `TimedCollection`s (one per name)."""
+
+    def __init__(self, database):
+        self._database = database
+        self._collections = {}
+
+    def __getitem__(self, name: str) -> TimedCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = TimedCollection(self._database[name], name)
+        return collection
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        attribute = getattr(self._database, name)
+        if name == "command":
+            async def command(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await attribute(*args, **kwargs)
+                finally:
+                    _observe("$cmd", "command", started)
+            return command
+        if not hasattr(attribute, "find_one"):
+            return attribute
+        collection = self[name]
+        setattr(self, name, collection)
+        return collection
+
+
+class MongoConnection:
+    """The Mongo client of one worker process.
+
+    Nothing connects at import: the client is created in `start()`, which
+    runs from the app's lifespan, so every worker (forked by gunicorn or
+    spawned by `uvicorn --workers`) builds its own pool after the process
+    exists. A client must never cross a fork, as its sockets and monitor
+    threads would be shared with the parent.
+
+    `start()` then pings the deployment and opens `min_pool_size`
+    connections up front, so the first requests do not pay for the TCP and
+    TLS handshakes. A `database` passed in is used as is instead of
+    connecting, for benchmarks against an in-memory stand-in. With
+    `instrument`, every collection call is timed into the
+    `mongo_operation_duration_seconds` metric.
+    """
+
+    def __init__(self, url: Optional[str], db_name: str, max_pool_size: int = 100,
+                 min_pool_size: int = 0, server_selection_timeout_ms: int = 5000, database=None,
+                 instrument: bool = False):
+        self.url = url
+        self.db_name = db_name
+        self.max_pool_size = max_pool_size
+        self.min_pool_size = min_pool_size
+        self.server_selection_timeout_ms = server_selection_timeout_ms
+        self.client: Optional[AsyncIOMotorClient] = None
+        self.db = database
+        self.instrument = instrument
+        self.ready = False
+
+    async def start(self):
+        if self.db is None:
+            if not self.url:
+                raise RuntimeError("MONGO_URL missing in .env")
+            self.client = AsyncIOMotorClient(
+                self.url,
+                uuidRepresentation='standard',
+                serverSelectionTimeoutMS=self.server_selection_timeout_ms,
+                maxPoolSize=self.max_pool_size,
+                minPoolSize=self.min_pool_size
+            )
+            self.db = self.client[self.db_name]
+        if self.instrument and not isinstance(self.db, TimedDatabase):
+            self.db = TimedDatabase(self.db)
+        try:
+            await self.warm_up()
+        except PyMongoError as e:
+            # Keep serving: the driver reconnects on its own and /api/ready
+            # reports the outage until it does
+            logger.error(f"MongoDB not reachable at startup: {e}")
+            return
+        logger.info(f"Connected to MongoDB (pool {self.min_pool_size}-{self.max_pool_size})")
+
+    async def warm_up(self):
+        await self.db.command("ping")
+        self.ready = True
+        # Concurrent pings each check out a connection, filling the pool to
+        # its minimum now rather than under the first burst of traffic
+        if self.min_pool_size > 1:
+            await asyncio.gather(*(self.db.command("ping") for _ in range(self.min_pool_size)))
+
+    async def ping(self, timeout: float = 2.0) -> bool:
+        try:
+            await asyncio.wait_for(self.db.command("ping"), timeout)
+        except (PyMongoError, asyncio.TimeoutError) as e:
+            logger.warning(f"MongoDB ping failed: {e}")
+            self.ready = False
+            return False
+        self.ready = True
+        return True
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+            self.db = None
+        self.ready = False
@@ -0,0 +1,196 @@
+import csv
+import io
+import json
+import logging
+import time
+import zlib
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("ndjson", "csv")
+
+# Encoded output is handed on in pieces of about this size
+CHUNK_BYTES = 64 * 1024
+
+
+@dataclass(frozen=True)
+class ExportSpec:
+    collection: str
+    fields: tuple
+    # ISO timestamp string the incremental watermark is taken on
+    watermark: str = "timestamp"
+
+
+EXPORTS = {
+    "test_results": ExportSpec("test_results", (
+        "id", "test_id", "correct_answers", "total_questions", "iq_score", "accuracy_percentage",
+        "performance_level", "difficulty", "duration", "mode", "timestamp",
+    )),
+    "certificates": ExportSpec("certificates", ("test_id", "name", "email", "contact", "timestamp")),
+}
+
+
+@dataclass
+class ExportProgress:
+    rows: int = 0
+    bytes: int = 0
+    started: float = 0.0
+    finished: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+
+def export_query(spec: ExportSpec, since: Optional[str], until: Optional[str]) -> dict:
+    """Documents stamped after `since` and up to `until`, so consecutive
+    exports that pass the previous `until` as `since` neither skip nor
+    repeat a row."""
+    bounds = {}
+    if since:
+        bounds["$gt"] = since
+    if until:
+        bounds["$lte"] = until
+    return {spec.watermark: bounds} if bounds else {}
+
+
+def _ndjson_rows(docs: Sequence[dict], fields: Sequence[str]) -> str:
+    return "".join(
+        json.dumps({f: doc.get(f) for f in fields}, default=str, separators=(",", ":")) + "\n"
+        for doc in docs
+    )
+
+
+def _csv_rows(docs: Sequence[dict], fields: Sequence[str]) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for doc in docs:
+        writer.writerow([
+            json.dumps(value, default=str) if isinstance(value, (dict, list)) else value
+            for value in (doc.get(f) for f in fields)
+        ])
+    return buffer.getvalue()
+
+
+async def stream_export(
+    collection,
+    spec: ExportSpec,
+    fmt: str = "ndjson",
+    fields: Optional[List[str]] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    batch_size: int = 1000,
+    compress: bool = False,
+    progress: Optional[ExportProgress] = None,
+) -> AsyncIterator[bytes]:
+    """Encode a collection as NDJSON or CSV while reading it from a cursor.
+
+    Only the requested fields are fetched, documents arrive `batch_size` at
+    a time in watermark order and are encoded (and optionally gzipped) as
+    they come, so memory stays flat however large the export is.
+    """
+    fields = list(fields or spec.fields)
+    progress = progress or ExportProgress()
+    progress.started = time.perf_counter()
+    projection = {"_id": 0, **{f: 1 for f in fields}}
+    cursor = collection.find(export_query(spec, since, until), projection) \
+        .sort(spec.watermark, 1).batch_size(batch_size)
+    encode = _ndjson_rows if fmt == "ndjson" else _csv_rows
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def output(text: str) -> bytes:
+        data = text.encode()
+        return compressor.compress(data) if compressor else data
+
+    pending = [output(",".join(fields) + "\r\n")] if fmt == "csv" else []
+    pending_bytes = sum(map(len, pending))
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) < batch_size:
+            continue
+        data = output(encode(batch, fields))
+        progress.rows += len(batch)
+        batch = []
+        pending.append(data)
+        pending_bytes += len(data)
+        if pending_bytes >= CHUNK_BYTES:
+            chunk = b"".join(pending)
+            progress.bytes += len(chunk)
+            yield chunk
+            pending, pending_bytes = [], 0
+    if batch:
+        pending.append(output(encode(batch, fields)))
+        progress.rows += len(batch)
+    if compressor:
+        pending.append(compressor.flush())
+    chunk = b"".join(pending)
+    progress.bytes += len(chunk)
+    progress.finished = time.perf_counter()
+    yield chunk
+    logger.info(
+        f"Exported {progress.rows} {spec.collection} rows ({progress.bytes} bytes) "
+        f"at {progress.rows_per_second:.0f} rows/s"
+    )
+
+
+if __name__ == "__main__":
+    # python export.py test_results [--format csv] [--gzip] [--state export_state.json] > dump
+    import argparse
+    import asyncio
+    import os
+    import sys
+    from datetime import datetime, timedelta, timezone
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    parser = argparse.ArgumentParser(description="Stream a MindMeter collection as NDJSON or CSV")
+    parser.add_argument("collection", choices=sorted(EXPORTS))
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--fields", help="comma-separated fields (default: all exported fields)")
+    parser.add_argument("--since", help="only rows stamped after this ISO timestamp")
+    parser.add_argument("--until", help="only rows stamped up to this ISO timestamp")
+    parser.add_argument("--state", help="JSON file holding the watermark of the last export; "
+                                        "read for --since and updated afterwards")
+    parser.add_argument("--lag", type=float, default=60,
+                        help="seconds behind now the default --until stays, for writes still in flight")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--output", help="file to write (default: stdout)")
+    args = parser.parse_args()
+
+    async def main():
+        spec = EXPORTS[args.collection]
+        state = {}
+        if args.state and Path(args.state).exists():
+            state = json.loads(Path(args.state).read_text())
+        since = args.since or state.get(args.collection)
+        until = args.until or (datetime.now(timezone.utc) - timedelta(seconds=args.lag)).isoformat()
+
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        collection = client[os.environ.get('DB_NAME', 'mindmeter_db')][spec.collection]
+        progress = ExportProgress()
+        out = open(args.output, "wb") if args.output else sys.stdout.buffer
+        try:
+            async for chunk in stream_export(
+                collection, spec, args.format, args.fields.split(",") if args.fields else None,
+                since, until, args.batch_size, args.gzip, progress
+            ):
+                out.write(chunk)
+        finally:
+            if args.output:
+                out.close()
+            client.close()
+        if args.state:
+            Path(args.state).write_text(json.dumps({**state, args.collection: until}))
+        print(f"{progress.rows} rows in {progress.finished - progress.started:.2f} s "
+              f"({progress.rows_per_second:.0f} rows/s), watermark {until}", file=sys.stderr)
+
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Sequence
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# (minimum accuracy %, level), best first
+PERFORMANCE_LEVELS = (
+    (90, "Superior"),
+    (75, "Above Average"),
+    (60, "High Average"),
+    (40, "Average"),
+)
+LOWEST_LEVEL = "Below Average"
+
+IQ_BASE = 100
+IQ_PER_ACCURACY_POINT = 0.6
+IQ_MIN, IQ_MAX = 80, 145
+# Adaptive tests estimate ability in standard deviations; IQ has an SD of 15
+IQ_PER_ABILITY_SD = 15
+
+# Fills the unused cells of the padded matrices; the two never compare equal
+_NO_KEY, _NO_ANSWER = -1, -2
+
+
+def get_performance_level(accuracy):
+    for threshold, level in PERFORMANCE_LEVELS:
+        if accuracy >= threshold:
+            return level
+    return LOWEST_LEVEL
+
+
+def iq_score(accuracy: float) -> int:
+    iq = int(IQ_BASE + (accuracy - 50) * IQ_PER_ACCURACY_POINT)
+    return max(IQ_MIN, min(IQ_MAX, iq))
+
+
+def ability_iq(ability: float) -> int:
+    return max(IQ_MIN, min(IQ_MAX, int(round(IQ_BASE + IQ_PER_ABILITY_SD * ability))))
+
+
+def iq_accuracy(iq: int) -> float:
+    """The accuracy that `iq_score` maps to this IQ, so adaptive results get
+    the same performance levels as fixed-length ones."""
+    return 50 + (iq - IQ_BASE) / IQ_PER_ACCURACY_POINT
+
+
+@dataclass
+class BatchScores:
+    correct: "np.ndarray"
+    total: "np.ndarray"
+    accuracy: "np.ndarray"
+    iq: "np.ndarray"
+    level: "np.ndarray"
+
+
+def grade_batch(answer_keys: Sequence[Sequence[int]], responses: Sequence[Sequence[int]]) -> BatchScores:
+    """Score many tests at once, exactly as `submit_test` scores one.
+
+    Keys and responses are laid out as two padded matrices, one row per
+    test, so counting correct answers and mapping accuracy to an IQ score
+    and performance level are each a single array operation. Answers past
+    the end of a test are ignored and missing ones count as wrong.
+    numpy is imported on first use, not with this module, so it stays out
+    of a worker's startup.
+    """
+    import numpy as np
+    keys, given = _matrices(answer_keys, responses)
+    correct = (keys == given).sum(axis=1)
+    total = np.fromiter(map(len, answer_keys), dtype=np.int64, count=len(answer_keys))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        accuracy = np.where(total > 0, correct / total * 100, 0.0)
+    iq = np.clip(np.trunc(IQ_BASE + (accuracy - 50) * IQ_PER_ACCURACY_POINT), IQ_MIN, IQ_MAX).astype(np.int64)
+    level = np.select(
+        [accuracy >= threshold for threshold, _ in PERFORMANCE_LEVELS],
+        [name for _, name in PERFORMANCE_LEVELS],
+        default=LOWEST_LEVEL
+    )
+    return BatchScores(correct, total, accuracy, iq, level)
+
+
+def _matrices(answer_keys, responses):
+    import numpy as np
+    rows = len(answer_keys)
+    width = max(map(len, answer_keys), default=0)
+    if all(len(key) == width for key in answer_keys) and all(len(answers) == width for answers in responses):
+        # Complete sheets for same-length tests: numpy converts them in one go
+        try:
+            return (np.array(answer_keys, dtype=np.int64).reshape(rows, width),
+                    np.array(responses, dtype=np.int64).reshape(rows, width))
+        except OverflowError:
+            pass
+    keys = np.full((rows, width), _NO_KEY, dtype=np.int64)
+    given = np.full((rows, width), _NO_ANSWER, dtype=np.int64)
+    for row, (key, answers) in enumerate(zip(answer_keys, responses)):
+        keys[row, :len(key)] = key
+        answers = answers[:len(key)]
+        try:
+            given[row, :len(answers)] = answers
+        except OverflowError:
+            given[row, :len(answers)] = [a if -2**63 <= a < 2**63 else _NO_ANSWER for a in answers]
+    return keys, given
+
+
+def score_rows(scores: BatchScores) -> List[tuple]:
+    """(correct, total, accuracy, iq, level) per test, as plain Python values."""
+    return list(zip(
+        scores.correct.tolist(), scores.total.tolist(), scores.accuracy.tolist(),
+        scores.iq.tolist(), scores.level.tolist()
+    ))
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    collection: str
+    keys: tuple
+    name: str
+    unique: bool = False
+    expire_after_seconds: Optional[int] = None
+    # Lookups this index exists to serve, checked by the report
+    serves: tuple = field(default=(), compare=False)
+
+    def options(self) -> dict:
+        options = {"name": self.name}
+        if self.unique:
+            options["unique"] = True
+        if self.expire_after_seconds is not None:
+            options["expireAfterSeconds"] = self.expire_after_seconds
+        return options
+
+
+def declared_indexes(session_ttl_seconds: int) -> List[IndexSpec]:
+    return [
+        IndexSpec("test_sessions", (("test_id", 1),), "test_id_unique", unique=True,
+                  serves=({"test_id": ""},)),
+        # Sessions that are never submitted expire instead of piling up
+        IndexSpec("test_sessions", (("created_at", 1),), "created_at_ttl",
+                  expire_after_seconds=session_ttl_seconds),
+        IndexSpec("test_results", (("test_id", 1),), "test_id_unique", unique=True,
+                  serves=({"test_id": ""},)),
+        IndexSpec("certificates", (("test_id", 1),), "test_id",
+                  serves=({"test_id": ""},)),
+        # Incremental exports scan by watermark
+        IndexSpec("test_results", (("timestamp", 1),), "timestamp",
+                  serves=({"timestamp": {"$gt": ""}},)),
+        IndexSpec("certificates", (("timestamp", 1),), "timestamp",
+                  serves=({"timestamp": {"$gt": ""}},)),
+        IndexSpec("questions", (("updated_at", -1),), "updated_at"),
+    ]
+
+
+def _fallback_name(spec: IndexSpec) -> str:
+    return f"{spec.name}_nonunique"
+
+
+async def find_duplicates(collection, key: str, limit: int = 5) -> List[dict]:
+    pipeline = [
+        {"$group": {"_id": f"${key}", "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit},
+    ]
+    return await collection.aggregate(pipeline, allowDiskUse=True).to_list(length=limit)
+
+
+async def _create(collection, spec: IndexSpec, existing: dict):
+    current = existing.get(spec.name)
+    if current is not None:
+        wanted_ttl = spec.expire_after_seconds
+        if wanted_ttl is not None and current.get("expireAfterSeconds") != wanted_ttl:
+            # TTL changes are applied in place rather than by rebuilding
+            await collection.database.command(
+                "collMod", spec.collection,
+                index={"name": spec.name, "expireAfterSeconds": wanted_ttl}
+            )
+        return
+    await collection.create_index(list(spec.keys), **spec.options())
+
+
+async def ensure_indexes(db, specs: List[IndexSpec]) -> dict:
+    """Create every declared index that is missing.
+
+    A unique index is never forced over duplicate data: if the collection
+    already holds duplicates, a non-unique index on the same key is created
+    instead so lookups are still indexed, and the duplicates are logged for
+    `python indexes.py --dedupe` to resolve.
+    """
+    outcome = {}
+    for spec in specs:
+        collection = db[spec.collection]
+        label = f"{spec.collection}.{spec.name}"
+        try:
+            existing = await collection.index_information()
+            if spec.unique and spec.name not in existing:
+                key = spec.keys[0][0]
+                duplicates = await find_duplicates(collection, key)
+                if duplicates:
+                    logger.warning(
+                        f"{label}: duplicate {key} values (e.g. {duplicates[0]['_id']!r}); "
+                        f"using a non-unique index until `python indexes.py --dedupe` is run"
+                    )
+                    if _fallback_name(spec) not in existing:
+                        await collection.create_index(list(spec.keys), name=_fallback_name(spec))
+                    outcome[label] = "fallback"
+                    continue
+            if spec.unique and _fallback_name(spec) in existing:
+                # MongoDB allows one index per key pattern, so the stand-in goes first
+                await collection.drop_index(_fallback_name(spec))
+            await _create(collection, spec, existing)
+            outcome[label] = "ok"
+        except OperationFailure as e:
+            if e.code not in (85, 86):
+                raise
+            # IndexOptionsConflict / IndexKeySpecsConflict: an index on the
+            # same key exists under another name or with other options
+            logger.warning(f"{label}: conflicting index already present, left as is: {e}")
+            outcome[label] = "conflict"
+        except PyMongoError as e:
+            logger.error(f"{label}: index creation failed: {e}")
+            outcome[label] = "error"
+    return outcome
+
+
+async def dedupe(db, specs: List[IndexSpec]) -> dict:
+    """Move all but the earliest document per unique key into a
+    `<collection>_duplicates` collection so the unique index can be built."""
+    moved = {}
+    for spec in specs:
+        if not spec.unique:
+            continue
+        collection = db[spec.collection]
+        quarantine = db[f"{spec.collection}_duplicates"]
+        key = spec.keys[0][0]
+        pipeline = [
+            {"$sort": {"_id": 1}},
+            {"$group": {"_id": f"${key}", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+        ]
+        count = 0
+        async for group in collection.aggregate(pipeline, allowDiskUse=True):
+            extra = group["ids"][1:]
+            docs = await collection.find({"_id": {"$in": extra}}).to_list(length=None)
+            if docs:
+                await quarantine.insert_many(docs, ordered=False)
+                await collection.delete_many({"_id": {"$in": extra}})
+            count += len(docs)
+        moved[spec.collection] = count
+        if count:
+            logger.info(f"Moved {count} duplicate {spec.collection} documents to {quarantine.name}")
+    return moved
+
+
+async def index_report(db, specs: List[IndexSpec]) -> List[dict]:
+    """Declared vs present indexes, their usage counters and the plan the
+    hot lookups actually get."""
+    report = []
+    for name in sorted({spec.collection for spec in specs}):
+        collection = db[name]
+        present = await collection.index_information()
+        try:
+            usage = {
+                row["name"]: row["accesses"]["ops"]
+                async for row in collection.aggregate([{"$indexStats": {}}])
+            }
+        except PyMongoError:
+            usage = {}
+        declared = [spec for spec in specs if spec.collection == name]
+        plans = []
+        for spec in declared:
+            for query in spec.serves:
+                try:
+                    explain = await collection.find(query).explain()
+                    plans.append({"query": query, "plan": _winning_stage(explain["queryPlanner"]["winningPlan"])})
+                except (PyMongoError, KeyError):
+                    pass
+        report.append({
+            "collection": name,
+            "indexes": [
+                {
+                    "name": index_name,
+                    "keys": info["key"],
+                    "declared": any(spec.name == index_name for spec in declared),
+                    "ops": usage.get(index_name),
+                }
+                for index_name, info in present.items()
+            ],
+            "missing": [spec.name for spec in declared if spec.name not in present],
+            "plans": plans,
+        })
+    return report
+
+
+def _winning_stage(plan: dict) -> str:
+    stages = []
+    while plan:
+        stage = plan.get("stage")
+        if stage == "IXSCAN":
+            stage = f"IXSCAN {plan.get('indexName')}"
+        stages.append(stage)
+        plan = plan.get("inputStage")
+    return " <- ".join(stages)
+
+
+if __name__ == "__main__":
+    # python indexes.py [--report | --dedupe]
+    import argparse
+    import json
+    import os
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Create, verify or repair MindMeter indexes")
+    parser.add_argument("--report", action="store_true", help="show declared vs present indexes and their usage")
+    parser.add_argument("--dedupe", action="store_true", help="quarantine duplicate documents, then create indexes")
+    args = parser.parse_args()
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        db = client[os.environ.get('DB_NAME', 'mindmeter_db')]
+        specs = declared_indexes(int(float(os.environ.get('SESSION_TTL_HOURS', '24')) * 3600))
+        if args.report:
+            print(json.dumps(await index_report(db, specs), indent=2, default=str))
+        else:
+            if args.dedupe:
+                await dedupe(db, specs)
+            print(json.dumps(await ensure_indexes(db, specs), indent=2))
+        client.close()
+
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+import random
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+# Ability scale: abilities are estimated, and items ranked, on this grid
+GRID = np.linspace(-4.0, 4.0, 81)
+_GRID_STEP = GRID[1] - GRID[0]
+_LOG_PRIOR = -0.5 * GRID ** 2  # standard normal, up to a constant
+
+# Logistic scaling constant, so discriminations read like normal-ogive ones
+D = 1.702
+
+# Items are scored in column blocks of this many to bound temporary memory
+_CHUNK = 8192
+
+
+def _probability(a, b, c):
+    """P(correct) at every grid point (rows) for every item (columns)."""
+    return c + (1 - c) / (1 + np.exp(-D * a * (GRID[:, None] - b)))
+
+
+def _information(a, b, c):
+    p = _probability(a, b, c)
+    return (D * a) ** 2 * ((1 - p) / p) * ((p - c) / (1 - c)) ** 2
+
+
+class BankItems:
+    """IRT parameters of every item in a bank snapshot, as arrays."""
+
+    def __init__(self, parameters: Sequence[Tuple[float, float, float]], key: Sequence[int]):
+        params = np.array(parameters, dtype=np.float64).reshape(-1, 3)
+        self.a, self.b, self.c = params.T.copy()
+        self.key = np.array(key, dtype=np.int64)
+
+    def estimate(self, indices: Sequence[int], answers: Sequence[int]) -> Tuple[float, float]:
+        """EAP ability estimate and its standard error after the given answers."""
+        log_posterior = _LOG_PRIOR
+        if len(indices):
+            items = np.asarray(indices, dtype=np.int64)
+            p = _probability(self.a[items], self.b[items], self.c[items])
+            correct = self.key[items] == np.asarray(answers, dtype=np.int64)
+            log_posterior = log_posterior + np.where(correct, np.log(p), np.log1p(-p)).sum(axis=1)
+        posterior = np.exp(log_posterior - log_posterior.max())
+        posterior /= posterior.sum()
+        theta = float(GRID @ posterior)
+        return theta, float(np.sqrt(((GRID - theta) ** 2) @ posterior))
+
+
+class ItemInformationTable:
+    """The most informative items of a pool at every point of the ability grid.
+
+    Built once per bank version and category filter, so choosing the next
+    item is a lookup in the row nearest the current estimate, skipping the
+    few items already given, rather than scoring the whole pool per answer.
+    """
+
+    def __init__(self, items: BankItems, pool: Sequence[int], depth: int):
+        self.items = items
+        self.pool = np.asarray(pool, dtype=np.int64)
+        depth = min(depth, len(self.pool))
+        best_info = np.full((len(GRID), 0), -np.inf)
+        best_items = np.empty((len(GRID), 0), dtype=np.int64)
+        for start in range(0, len(self.pool), _CHUNK):
+            block = self.pool[start:start + _CHUNK]
+            info = np.concatenate([best_info, _information(items.a[block], items.b[block], items.c[block])], axis=1)
+            candidates = np.concatenate([best_items, np.broadcast_to(block, (len(GRID), len(block)))], axis=1)
+            if info.shape[1] > depth:
+                keep = np.argpartition(-info, depth - 1, axis=1)[:, :depth]
+                info = np.take_along_axis(info, keep, axis=1)
+                candidates = np.take_along_axis(candidates, keep, axis=1)
+            best_info, best_items = info, candidates
+        order = np.argsort(-best_info, axis=1, kind="stable")
+        self.ranked = np.take_along_axis(best_items, order, axis=1)
+        self._rows = [row.tolist() for row in self.ranked]
+
+    def __len__(self):
+        return len(self.pool)
+
+    def select(self, theta: float, administered: Sequence[int], randomesque: int = 1,
+               rng: random.Random = random) -> Optional[int]:
+        """Pick one of the `randomesque` most informative unused items at
+        `theta`; choosing among a few rather than always the best spreads
+        exposure across the bank."""
+        row = int(round((min(max(theta, GRID[0]), GRID[-1]) - GRID[0]) / _GRID_STEP))
+        used = set(administered)
+        candidates = []
+        for index in self._rows[row]:
+            if index not in used:
+                candidates.append(index)
+                if len(candidates) == randomesque:
+                    break
+        if not candidates:
+            # Every tabled item was used: rank the rest of the pool directly
+            rest = self.pool[~np.isin(self.pool, list(used))]
+            if not len(rest):
+                return None
+            info = _information(self.items.a[rest], self.items.b[rest], self.items.c[rest])[row]
+            return int(rest[int(np.argmax(info))])
+        return rng.choice(candidates)
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from progress import UNANSWERED
+
+logger = logging.getLogger(__name__)
+
+# Choice recorded for a question left unanswered (no answer, or the
+# client's and autosave's UNANSWERED), or answered with an index that is
+# not one of its options
+SKIPPED = "skipped"
+INVALID = "invalid"
+
+
+def _choice(answer: Optional[int], options: int) -> str:
+    if answer is None or answer == UNANSWERED:
+        return SKIPPED
+    return str(answer) if 0 <= answer < options else INVALID
+
+
+class ItemStats:
+    """Per-question attempt, correctness and option-choice counters.
+
+    Submissions are tallied in memory and added to the `item_stats`
+    collection with one unordered bulk `$inc` per flush interval, so
+    grading never waits on a write per question. Next to each option's
+    choice count the sum of the test scores of the people who chose it is
+    kept, which is what distractor analysis needs: a working distractor
+    draws weaker test takers than the key does.
+    """
+
+    def __init__(self, flush_interval: float = 10.0, ttl: float = 60.0):
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self._collection = None
+        self._pending: Dict[str, Counter] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._cached: Optional[Dict[str, dict]] = None
+        self._cached_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def start(self, collection):
+        self._collection = collection
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except PyMongoError as e:
+            logger.warning(f"Final item stats flush failed: {e}")
+
+    def record(self, questions: Sequence[dict], answers: Sequence[int], accuracy: float):
+        """Tally one graded test: its questions, the answers given and the overall score.
+
+        Questions without an `id` (those of sessions written before the bank
+        moved to Mongo) have nothing stable to be counted under and are left out.
+        """
+        for i, question in enumerate(questions):
+            question_id = question.get("id")
+            if question_id is None:
+                continue
+            answer = answers[i] if i < len(answers) else None
+            choice = _choice(answer, len(question["options"]))
+            counts = self._pending.setdefault(question_id, Counter())
+            counts["attempts"] += 1
+            counts["correct"] += answer == question["correct_answer"]
+            counts[f"choices.{choice}"] += 1
+            counts[f"score_sum.{choice}"] += accuracy
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except PyMongoError as e:
+                logger.warning(f"Item stats flush failed, retrying next interval: {e}")
+
+    async def flush(self):
+        if not self._pending or self._collection is None:
+            return
+        pending, self._pending = self._pending, {}
+        requests = [
+            UpdateOne({"_id": question_id}, {"$inc": dict(counts)}, upsert=True)
+            for question_id, counts in pending.items()
+        ]
+        try:
+            await self._collection.bulk_write(requests, ordered=False)
+        except PyMongoError:
+            # Put the counts back so the next flush carries them
+            for question_id, counts in pending.items():
+                self._pending.setdefault(question_id, Counter()).update(counts)
+            raise
+
+    async def get(self) -> Dict[str, dict]:
+        """The stored counters by question id, through a TTL cache."""
+        if self._cached is not None and time.monotonic() - self._cached_at < self.ttl:
+            return self._cached
+        async with self._lock:
+            if self._cached is None or time.monotonic() - self._cached_at >= self.ttl:
+                self._cached = {doc["_id"]: doc async for doc in self._collection.find({})}
+                self._cached_at = time.monotonic()
+        return self._cached
+
+
+def item_report(question: dict, counts: Optional[dict]) -> dict:
+    """p-value and per-option (distractor) statistics of one question.
+
+    Options are reported by position only, with neither their text nor
+    which one is the key, so a leaked report does not hand out the answers.
+    """
+    counts = counts or {}
+    attempts = counts.get("attempts", 0)
+    choices = counts.get("choices") or {}
+    score_sums = counts.get("score_sum") or {}
+    keys: List[str] = [str(i) for i in range(len(question["options"]))] + [SKIPPED, INVALID]
+    options = []
+    for key in keys:
+        chosen = choices.get(key, 0)
+        if key in (SKIPPED, INVALID) and not chosen:
+            continue
+        options.append({
+            "option": key,
+            "count": chosen,
+            "share": round(chosen / attempts, 4) if attempts else None,
+            # Mean overall score (accuracy %) of those who chose this option
+            "mean_score": round(score_sums.get(key, 0) / chosen, 2) if chosen else None,
+        })
+    return {
+        "id": question["id"],
+        "question_text": question["question_text"],
+        "category": question["category"],
+        "difficulty": question["difficulty"],
+        "attempts": attempts,
+        "p_value": round(counts.get("correct", 0) / attempts, 4) if attempts else None,
+        "options": options,
+    }
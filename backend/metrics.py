@@ -0,0 +1,336 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; request latencies from a few ms up to slow PDF-heavy requests
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Label values past a metric's series limit are folded into this one, so a
+# bug that labels by something unbounded cannot grow memory without limit
+OTHER = "other"
+
+_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), max_series: int = 500):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.max_series = max_series
+        self._series: Dict[tuple, object] = {}
+
+    def _key(self, values: tuple) -> tuple:
+        if values in self._series or len(self._series) < self.max_series:
+            return values
+        return (OTHER,) * len(self.labels)
+
+    def state(self) -> List[list]:
+        return [[list(key), value] for key, value in self._series.items()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1):
+        key = self._key(labels)
+        self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._series.get(labels, 0)
+
+    @staticmethod
+    def merge(a, b):
+        return a + b
+
+    def lines(self, series: Dict[tuple, float]) -> Iterable[str]:
+        for key, value in series.items():
+            yield f"{self.name}_total{_labels(self.labels, key)} {_number(value)}"
+
+
+class Histogram(_Metric):
+    """Observation counts per fixed bucket, plus their sum and count.
+
+    Each series is a flat list: one count per bucket (the last one being
+    +Inf), then the sum of the observed values. Buckets are cumulated only
+    when rendered, so an observation is one bisect and two additions.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, max_series: int = 500):
+        super().__init__(name, help, labels, max_series)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @staticmethod
+    def merge(a, b):
+        return [x + y for x, y in zip(a, b)]
+
+    def lines(self, series: Dict[tuple, list]) -> Iterable[str]:
+        for key, counts in series.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="' + _number(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, key)} {_number(counts[-1])}"
+            yield f"{self.name}_count{_labels(self.labels, key)} {cumulative}"
+
+
+class Gauge(_Metric):
+    """A value read from a callback at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        super().__init__(name, help)
+        self.read = read
+
+    def state(self) -> List[list]:
+        return [[[], float(self.read())]]
+
+    @staticmethod
+    def merge(a, b):
+        return a + b
+
+    def lines(self, series: Dict[tuple, float]) -> Iterable[str]:
+        for key, value in series.items():
+            yield f"{self.name}{_labels(self.labels, key)} {_number(value)}"
+
+
+class Registry:
+    """The metrics of one process, rendered in the Prometheus text format.
+
+    Updates are plain dict and list operations on the event loop thread, so
+    recording costs well under a microsecond and takes no lock. With
+    `share(directory)` every worker process of a deployment periodically
+    writes its state to `<directory>/<pid>.json`, and a scrape served by
+    any of them adds up the files of all live workers (those written within
+    the last few intervals), so `uvicorn --workers N` still exposes one
+    consistent set of totals. A worker that exits drops out of the sum,
+    which Prometheus treats as a counter reset.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._directory: Optional[Path] = None
+        self._interval = 5.0
+        self._task: Optional[asyncio.Task] = None
+
+    def _add(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = (), **kwargs) -> Counter:
+        return self._add(Counter(name, help, labels, **kwargs))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), **kwargs) -> Histogram:
+        return self._add(Histogram(name, help, labels, **kwargs))
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> Gauge:
+        return self._add(Gauge(name, help, read))
+
+    def state(self) -> Dict[str, list]:
+        return {name: metric.state() for name, metric in self._metrics.items()}
+
+    def share(self, directory: str, interval: float = 5.0):
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._interval = interval
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            (self._directory / f"{os.getpid()}.json").unlink(missing_ok=True)
+
+    async def _run(self):
+        while True:
+            try:
+                self._write()
+            except OSError as e:
+                logger.warning(f"Writing metrics to {self._directory} failed: {e}")
+            await asyncio.sleep(self._interval)
+
+    def _write(self):
+        path = self._directory / f"{os.getpid()}.json"
+        temporary = path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(self.state()))
+        temporary.replace(path)
+
+    def _peer_states(self) -> List[Dict[str, list]]:
+        if self._directory is None:
+            return []
+        states = []
+        oldest = time.time() - 3 * self._interval
+        own = f"{os.getpid()}.json"
+        for path in self._directory.glob("*.json"):
+            try:
+                if path.name == own or path.stat().st_mtime < oldest:
+                    continue
+                states.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue  # a worker exiting or mid-write; it is counted next scrape
+        return states
+
+    def render(self) -> str:
+        peers = self._peer_states()
+        out = []
+        for name, metric in self._metrics.items():
+            series: Dict[tuple, object] = {}
+            for state in [{name: metric.state()}] + peers:
+                for key, value in state.get(name, ()):
+                    key = tuple(key)
+                    series[key] = metric.merge(series[key], value) if key in series else value
+            out.append(f"# HELP {metric.name} {metric.help}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(metric.lines(series))
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class RequestTiming:
+    """Where one request's time went, for the slow-request log: seconds and
+    call counts per (kind, detail), e.g. ("mongo", "test_results.insert_one")."""
+
+    def __init__(self):
+        self.spans: Dict[Tuple[str, str], list] = {}
+
+    def add(self, kind: str, detail: str, seconds: float):
+        span = self.spans.get((kind, detail))
+        if span is None:
+            self.spans[(kind, detail)] = [seconds, 1]
+        else:
+            span[0] += seconds
+            span[1] += 1
+
+    def summary(self, elapsed: float) -> str:
+        kinds: Dict[str, float] = {}
+        for (kind, _), (seconds, _) in self.spans.items():
+            kinds[kind] = kinds.get(kind, 0.0) + seconds
+        parts = []
+        for kind, seconds in sorted(kinds.items(), key=lambda item: -item[1]):
+            details = ", ".join(
+                f"{detail} {spent * 1000:.0f} ms" + (f" x{calls}" if calls > 1 else "")
+                for (k, detail), (spent, calls) in sorted(self.spans.items(), key=lambda item: -item[1][0])
+                if k == kind
+            )
+            parts.append(f"{kind} {seconds * 1000:.0f} ms ({details})")
+        # Concurrent calls can add up to more than the wall time
+        parts.append(f"other {max(0.0, elapsed - sum(kinds.values())) * 1000:.0f} ms")
+        return ", ".join(parts)
+
+
+# Set by the middleware only while the slow-request log is enabled
+current_timing: contextvars.ContextVar[Optional[RequestTiming]] = contextvars.ContextVar(
+    "current_timing", default=None
+)
+
+
+def record_span(kind: str, detail: str, seconds: float):
+    timing = current_timing.get()
+    if timing is not None:
+        timing.add(kind, detail, seconds)
+
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time from request to the last response byte",
+    ("method", "route")
+)
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests", "Responses by route and status code", ("method", "route", "status")
+)
+
+
+class MetricsMiddleware:
+    """Times every HTTP request into the per-route histogram and counts its status.
+
+    Requests are labelled with the template of the route that served them
+    (`/api/test/result/{test_id}`, not the id itself), and `unmatched` for
+    any path no route matches, so the number of series stays bounded. When
+    `slow_request_ms` is set, requests that take longer are logged with the
+    time spent in Mongo, rendering and everything else.
+    """
+
+    def __init__(self, app, slow_request_ms: float = 0):
+        self.app = app
+        self.slow_request_seconds = slow_request_ms / 1000
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        timing = token = None
+        if self.slow_request_seconds:
+            timing = RequestTiming()
+            token = current_timing.set(timing)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            if token is not None:
+                current_timing.reset(token)
+            method = scope["method"] if scope["method"] in _METHODS else OTHER
+            route = scope.get("route")
+            route = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.observe(elapsed, method, route)
+            HTTP_REQUESTS.inc(method, route, str(status))
+            if timing is not None and elapsed >= self.slow_request_seconds:
+                logger.warning(
+                    f"Slow request {method} {scope['path']} -> {status} in {elapsed * 1000:.0f} ms: "
+                    f"{timing.summary(elapsed)}"
+                )
@@ -1,22 +1,32 @@
-const mongoose = require("mongoose");
-
-const questionSchema = new mongoose.Schema({
-  question: {
-    type: String,
-    required: true,
-  },
-  options: {
-    type: [String],
-    required: true,
-  },
-  answer: {
-    type: Number,
-    required: true,
-  },
-  category: {
-    type: String,
-    default: "general",
-  },
-});
-
-module.exports = mongoose.model("Question", questionSchema);
+const mongoose = require("mongoose");
+
+// Shape of the `questions` collection the API loads its question bank from.
+// `updated_at` is what the API polls to notice edits without a redeploy.
+const questionSchema = new mongoose.Schema(
+  {
+    question_text: {
+      type: String,
+      required: true,
+    },
+    options: {
+      type: [String],
+      required: true,
+    },
+    correct_answer: {
+      type: Number,
+      required: true,
+    },
+    category: {
+      type: String,
+      default: "general",
+    },
+    difficulty: {
+      type: String,
+      enum: ["easy", "medium", "hard"],
+      default: "medium",
+    },
+  },
+  { timestamps: { createdAt: false, updatedAt: "updated_at" } }
+);
+
+module.exports = mongoose.model("Question", questionSchema);
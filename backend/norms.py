@@ -0,0 +1,180 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import PyMongoError
+
+from grading import IQ_MIN, IQ_MAX
+
+logger = logging.getLogger(__name__)
+
+# Norms across every configuration of a mode, used while a single
+# configuration has too few results of its own
+ALL = "all"
+
+_BINS = IQ_MAX - IQ_MIN + 1
+
+
+def norm_key(mode: Optional[str], difficulty: Optional[str], duration: Optional[str]) -> str:
+    return "|".join(str(part or "unknown").replace(".", "_") for part in (mode or "fixed", difficulty, duration))
+
+
+def result_keys(result_doc: dict) -> Tuple[str, str]:
+    mode = result_doc.get("mode") or "fixed"
+    return norm_key(mode, result_doc.get("difficulty"), result_doc.get("duration")), norm_key(mode, ALL, ALL)
+
+
+class _Histogram:
+    """IQ score counts with the cumulative sums a percentile lookup needs."""
+
+    def __init__(self, counts: List[int]):
+        self.counts = counts
+        self.total = sum(counts)
+        self.below = [0] * _BINS
+        for i in range(1, _BINS):
+            self.below[i] = self.below[i - 1] + counts[i - 1]
+
+    def percentile(self, iq: int) -> float:
+        i = min(max(iq, IQ_MIN), IQ_MAX) - IQ_MIN
+        # Mid-rank, so a score everyone shares sits at the 50th percentile
+        return (self.below[i] + self.counts[i] / 2) / self.total * 100
+
+
+class NormsEngine:
+    """Percentile ranks of IQ scores against everyone who took the same test.
+
+    Every worker counts the results it stores into an in-memory score
+    histogram per test configuration (mode, difficulty, duration) and, on
+    an interval, adds its counts to the `norms` collection with `$inc` and
+    reads back the merged histograms. Counts add up, so workers never need
+    to coordinate. Lookups are a couple of list indexes into the last
+    merged view; configurations with fewer than `min_samples` results are
+    ranked against their whole mode instead.
+    """
+
+    def __init__(self, flush_interval: float = 10.0, min_samples: int = 100):
+        self.flush_interval = flush_interval
+        self.min_samples = min_samples
+        self._collection = None
+        self._pending: Dict[str, Counter] = {}
+        self._histograms: Dict[str, _Histogram] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, collection):
+        self._collection = collection
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except PyMongoError as e:
+            logger.warning(f"Final norms flush failed: {e}")
+
+    async def ensure_initialized(self, results_collection):
+        """Build the histograms from `test_results` the first time the app runs."""
+        if await self._collection.find_one({}, {"_id": 1}) is None:
+            await self.rebuild(results_collection)
+        await self.refresh()
+
+    def record(self, result_doc: dict):
+        for key in result_keys(result_doc):
+            self._pending.setdefault(key, Counter())[result_doc["iq_score"]] += 1
+
+    def percentile(self, result_doc: dict) -> Optional[int]:
+        for key in result_keys(result_doc):
+            histogram = self._histograms.get(key)
+            if histogram is not None and histogram.total >= self.min_samples:
+                return int(histogram.percentile(result_doc["iq_score"]))
+        return None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                await self.refresh()
+            except PyMongoError as e:
+                logger.warning(f"Norms sync failed, retrying next interval: {e}")
+
+    async def flush(self):
+        if not self._pending or self._collection is None:
+            return
+        pending, self._pending = self._pending, {}
+        requests = [
+            UpdateOne({"_id": key}, {"$inc": {
+                "total": sum(counts.values()),
+                **{f"counts.{iq}": n for iq, n in counts.items()},
+            }}, upsert=True)
+            for key, counts in pending.items()
+        ]
+        try:
+            await self._collection.bulk_write(requests, ordered=False)
+        except PyMongoError:
+            # Put the counts back so the next flush carries them
+            for key, counts in pending.items():
+                self._pending.setdefault(key, Counter()).update(counts)
+            raise
+
+    async def refresh(self):
+        histograms = {}
+        async for doc in self._collection.find({}):
+            counts = [0] * _BINS
+            for iq, n in (doc.get("counts") or {}).items():
+                if IQ_MIN <= int(iq) <= IQ_MAX:
+                    counts[int(iq) - IQ_MIN] += n
+            histograms[doc["_id"]] = _Histogram(counts)
+        self._histograms = histograms
+
+    async def rebuild(self, results_collection):
+        await rebuild_norms(results_collection, self._collection)
+
+
+async def rebuild_norms(results_collection, norms_collection):
+    """Recompute every histogram from `test_results` with one aggregation."""
+    pipeline = [{"$group": {
+        "_id": {"mode": "$mode", "difficulty": "$difficulty", "duration": "$duration", "iq": "$iq_score"},
+        "n": {"$sum": 1},
+    }}]
+    docs: Dict[str, dict] = {}
+    async for row in results_collection.aggregate(pipeline, allowDiskUse=True):
+        group = row["_id"]
+        for key in result_keys({**group, "iq_score": group["iq"]}):
+            doc = docs.setdefault(key, {"_id": key, "total": 0, "counts": Counter()})
+            doc["total"] += row["n"]
+            doc["counts"][str(group["iq"])] += row["n"]
+    # Replacing rather than clearing first keeps concurrent rebuilds (e.g.
+    # several workers starting at once) from tripping over each other
+    if docs:
+        await norms_collection.bulk_write([
+            ReplaceOne({"_id": key}, {**doc, "counts": dict(doc["counts"])}, upsert=True)
+            for key, doc in docs.items()
+        ], ordered=False)
+    logger.info(f"Rebuilt score norms ({len(docs)} configurations)")
+
+
+if __name__ == "__main__":
+    # Rebuild the norms from scratch: python norms.py
+    import os
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO)
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        db = client[os.environ.get('DB_NAME', 'mindmeter_db')]
+        await rebuild_norms(db.test_results, db.norms)
+        client.close()
+
+    asyncio.run(main())
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Saved answer of a question that was skipped or not reached
+UNANSWERED = -1
+
+PROGRESS_ANSWERS = REGISTRY.counter("progress_answers", "Answers autosaved through /api/test/progress")
+PROGRESS_WRITES = REGISTRY.counter("progress_writes", "Session updates the autosaved answers were written with")
+
+
+def saved_answers(progress: Optional[dict], count: int) -> List[int]:
+    """A session's saved `progress` ({"<position>": answer}) as an answer list."""
+    progress = progress or {}
+    return [progress.get(str(i), UNANSWERED) for i in range(count)]
+
+
+class ProgressWriter:
+    """Coalesces autosaved answers into one session update per test per interval.
+
+    Answers are kept in memory per test_id, later answers to a position
+    replacing earlier ones, and flushed as a single `$set` of
+    `progress.<position>` fields per test with one unordered bulk write,
+    so a burst of answers costs a write or two rather than one each.
+    Sessions of stateless (token) tests are upserted, with a `created_at`
+    the TTL index expires them by.
+    """
+
+    def __init__(self, flush_interval: float = 1.0, max_pending: int = 50000):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._collection = None
+        self._pending: Dict[str, Dict[str, int]] = {}
+        # The batch being written, still visible to `pending` meanwhile
+        self._flushing: Dict[str, Dict[str, int]] = {}
+        self._upsert: Dict[str, bool] = {}
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, collection):
+        self._collection = collection
+        # Bound to the loop it is first awaited on, so made afresh per start
+        self._full = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except PyMongoError as e:
+            logger.warning(f"Final progress flush failed: {e}")
+
+    def record(self, test_id: str, position: int, answer: int, upsert: bool = False):
+        self._pending.setdefault(test_id, {})[str(position)] = answer
+        if upsert:
+            self._upsert[test_id] = True
+        PROGRESS_ANSWERS.inc()
+        if len(self._pending) >= self.max_pending:
+            self._full.set()
+
+    def pending(self, test_id: str) -> Dict[str, int]:
+        """Answers of a test saved here but not written yet."""
+        return {**self._flushing.get(test_id, {}), **self._pending.get(test_id, {})}
+
+    def discard(self, test_id: str):
+        """Drop a submitted test's unwritten answers; its result is stored."""
+        self._pending.pop(test_id, None)
+        self._upsert.pop(test_id, None)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                await self.flush()
+            except PyMongoError as e:
+                logger.warning(f"Progress flush failed, retrying next interval: {e}")
+
+    async def flush(self):
+        if not self._pending or self._collection is None:
+            return
+        pending, self._pending = self._pending, {}
+        upserts, self._upsert = self._upsert, {}
+        saved_at = datetime.now(timezone.utc)
+        requests = []
+        for test_id, answers in pending.items():
+            update = {"$set": {
+                **{f"progress.{position}": answer for position, answer in answers.items()},
+                "progress_at": saved_at.isoformat(),
+            }}
+            if test_id in upserts:
+                update["$setOnInsert"] = {"test_id": test_id, "created_at": saved_at}
+            requests.append(UpdateOne({"test_id": test_id}, update, upsert=test_id in upserts))
+        self._flushing = pending
+        try:
+            await self._collection.bulk_write(requests, ordered=False)
+        except PyMongoError:
+            # Put the answers back under any given since, which are newer
+            for test_id, answers in pending.items():
+                self._pending[test_id] = {**answers, **self._pending.get(test_id, {})}
+            for test_id in upserts:
+                self._upsert[test_id] = True
+            raise
+        finally:
+            self._flushing = {}
+        PROGRESS_WRITES.inc(amount=len(requests))
@@ -0,0 +1,363 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import struct
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from itertools import accumulate
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import orjson
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Wildcard used for the "any difficulty" / "any category" buckets
+ANY = "*"
+
+# A bulk edit arrives on the change stream as one event per document; wait
+# this long for the rest of a burst, then reload once for all of it
+CHANGE_SETTLE_SECONDS = 0.5
+
+
+class QuestionSelector:
+    """Draws random questions from a bank without scanning it per request.
+
+    The bank is bucketed once by (difficulty, category), plus the wildcard
+    rollups needed by `start_test`, so a draw of k questions costs O(k)
+    regardless of how large the bank grows.
+    """
+
+    def __init__(self, questions: Sequence[dict]):
+        self.questions = list(questions)
+        buckets: Dict[Tuple[str, str], List[int]] = {}
+        for idx, q in enumerate(self.questions):
+            difficulty, category = q["difficulty"], q["category"]
+            for key in (
+                (difficulty, category),
+                (difficulty, ANY),
+                (ANY, category),
+                (ANY, ANY),
+            ):
+                buckets.setdefault(key, []).append(idx)
+        self._buckets = {key: tuple(indices) for key, indices in buckets.items()}
+
+    def __len__(self):
+        return len(self.questions)
+
+    def _keys(self, difficulty: str, categories: Sequence[str]):
+        if "all" in categories:
+            return [(difficulty, ANY)]
+        return [(difficulty, c) for c in dict.fromkeys(categories)]
+
+    def count(self, difficulty: str, categories: Sequence[str]) -> int:
+        return sum(len(self._buckets.get(k, ())) for k in self._keys(difficulty, categories))
+
+    def sample_indices(self, difficulty: str, categories: Sequence[str], k: int) -> List[int]:
+        """Return up to k distinct bank indices matching the filters, in random order."""
+        pools = [self._buckets[key] for key in self._keys(difficulty, categories) if key in self._buckets]
+        total = sum(len(p) for p in pools)
+        k = min(k, total)
+        if k <= 0:
+            return []
+        if len(pools) == 1:
+            return random.sample(pools[0], k)
+
+        # Sample positions in the virtual concatenation of the pools and map
+        # each back to its pool through the prefix sums.
+        offsets = list(accumulate(len(p) for p in pools))
+        picked = []
+        for pos in random.sample(range(total), k):
+            p = bisect_right(offsets, pos)
+            start = offsets[p - 1] if p else 0
+            picked.append(pools[p][pos - start])
+        return picked
+
+    def pool(self, categories: Sequence[str]) -> List[int]:
+        """Every bank index in the given categories, whatever its difficulty."""
+        indices = []
+        for key in self._keys(ANY, categories):
+            indices.extend(self._buckets.get(key, ()))
+        return indices
+
+    def select(self, difficulty: str, categories: Sequence[str], k: int) -> List[int]:
+        """Pick k question indices, widening to every difficulty when the
+        requested one cannot fill the test."""
+        if self.count(difficulty, categories) < k:
+            difficulty = ANY
+        return self.sample_indices(difficulty, categories, k)
+
+
+IRT_FIELDS = ("discrimination", "irt_difficulty", "guessing")
+
+
+def normalize_question(doc: dict) -> dict:
+    """Map a `questions` document onto the shape the API works with.
+
+    Accepts the field names of the legacy mongoose schema (`question`,
+    `answer`) as well as the API's own (`question_text`, `correct_answer`).
+    """
+    question = {
+        "id": str(doc.get("_id", doc.get("id", ""))),
+        "question_text": doc.get("question_text", doc.get("question")),
+        "options": list(doc["options"]),
+        "correct_answer": int(doc.get("correct_answer", doc.get("answer"))),
+        "category": doc.get("category", "general"),
+        "difficulty": doc.get("difficulty", "medium"),
+    }
+    # Calibrated item parameters for adaptive tests, where available
+    for name in IRT_FIELDS:
+        if doc.get(name) is not None:
+            question[name] = float(doc[name])
+    return question
+
+
+def bank_version(questions: Sequence[dict]) -> str:
+    """Content hash of a bank, identical in every worker that loads it."""
+    # The JSON of the whole list, hashed a question at a time: one dumps of
+    # a large bank would hold the GIL for its whole duration
+    digest = hashlib.sha1(b"[")
+    for n, question in enumerate(questions):
+        if n:
+            digest.update(b",")
+        digest.update(json.dumps(question, sort_keys=True, separators=(",", ":")).encode())
+    digest.update(b"]")
+    return digest.hexdigest()[:12]
+
+
+def pack_indices(indices: Sequence[int]) -> bytes:
+    """Bank indices as big-endian uint32s, stored as a BSON binary value."""
+    return struct.pack(f">{len(indices)}I", *indices)
+
+
+def unpack_indices(data: bytes) -> List[int]:
+    return list(struct.unpack(f">{len(data) // 4}I", data))
+
+
+def question_fragment(question: dict) -> bytes:
+    """What test takers see of a question (no answer key) as JSON, less
+    the opening brace: the `id` sent is the question's position in the
+    test, which is only known per request."""
+    return orjson.dumps({
+        "question_text": question["question_text"],
+        "options": question["options"],
+        "category": question["category"],
+    })[1:]
+
+
+@dataclass(frozen=True)
+class BankSnapshot:
+    """An immutable, versioned view of the question bank.
+
+    Every question's public JSON is encoded once here, so `/test/start`
+    responses are put together by joining bytes instead of building and
+    serializing a dict per question per request.
+    """
+    version: str
+    questions: Tuple[dict, ...]
+    selector: QuestionSelector = field(repr=False, compare=False)
+    by_id: Dict[str, int] = field(repr=False, compare=False)
+    fragments: Tuple[bytes, ...] = field(repr=False, compare=False)
+
+    @classmethod
+    def build(cls, questions: Sequence[dict]) -> "BankSnapshot":
+        questions = tuple(questions)
+        return cls(
+            bank_version(questions), questions, QuestionSelector(questions),
+            {q["id"]: i for i, q in enumerate(questions)},
+            tuple(question_fragment(q) for q in questions)
+        )
+
+    def questions_json(self, indices: Sequence[int]) -> bytes:
+        """JSON array of the given questions as sent to test takers, numbered by position."""
+        return b"[" + b",".join(
+            b'{"id":"%d",' % position + self.fragments[i] for position, i in enumerate(indices)
+        ) + b"]"
+
+    def resolve(self, indices: Sequence[int]) -> Optional[List[dict]]:
+        if any(i >= len(self.questions) for i in indices):
+            return None
+        return [self.questions[i] for i in indices]
+
+
+class QuestionBank:
+    """Holds the current question snapshot and keeps it fresh.
+
+    Requests only ever read `current`, which is swapped atomically when a
+    reload finishes, so they never wait on (or talk to) the database. The
+    refresh loop follows a change stream when the deployment supports one
+    and otherwise polls a cheap fingerprint of the collection.
+
+    The last few snapshots stay in memory by version so tests started just
+    before a reload can still be graded against their own questions. Every
+    version loaded from Mongo is also recorded in `versions` as its ordered
+    question ids, so a worker that never held a version (one started after
+    a bank edit, or one whose history moved on) rebuilds it with `load`.
+    """
+
+    def __init__(self, seed: Sequence[dict], poll_interval: float = 30.0, history: int = 8):
+        self.seed = [dict(q) for q in seed]
+        self.poll_interval = poll_interval
+        self.history = history
+        self._snapshots: "OrderedDict[str, BankSnapshot]" = OrderedDict()
+        self._listeners: List[Callable[[BankSnapshot], None]] = []
+        self._publish(BankSnapshot.build(
+            [normalize_question({**q, "id": str(i)}) for i, q in enumerate(self.seed)]
+        ))
+        self._collection = None
+        self._versions = None
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._fingerprint = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _remember(self, snapshot: BankSnapshot):
+        self._snapshots[snapshot.version] = snapshot
+        self._snapshots.move_to_end(snapshot.version)
+        while len(self._snapshots) > self.history:
+            self._snapshots.popitem(last=False)
+
+    def _publish(self, snapshot: BankSnapshot):
+        self._remember(snapshot)
+        self.current = snapshot
+        for listener in self._listeners:
+            listener(snapshot)
+
+    def subscribe(self, listener: Callable[[BankSnapshot], None]):
+        """Call `listener` with every snapshot published from now on; it
+        runs on the event loop, so it must not block."""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def get(self, version: str) -> Optional[BankSnapshot]:
+        """A snapshot held in memory; see `load` for any recorded version."""
+        return self._snapshots.get(version)
+
+    async def load(self, version: str) -> Optional[BankSnapshot]:
+        """The snapshot of a bank version, rebuilt from its recorded question
+        ids when this worker does not hold it. None if the version was never
+        recorded or some of its questions have since been deleted."""
+        snapshot = self._snapshots.get(version)
+        if snapshot is not None or self._versions is None:
+            return snapshot
+        # Concurrent requests for the same old version share one rebuild
+        loading = self._loading.get(version)
+        if loading is None:
+            loading = self._loading[version] = asyncio.ensure_future(self._restore(version))
+            loading.add_done_callback(lambda _: self._loading.pop(version, None))
+        return await asyncio.shield(loading)
+
+    async def _restore(self, version: str) -> Optional[BankSnapshot]:
+        record = await self._versions.find_one({"_id": version})
+        if record is None:
+            return None
+        ids = record["question_ids"]
+        docs = {d["_id"]: d async for d in self._collection.find({"_id": {"$in": ids}})}
+        if len(docs) < len(set(ids)):
+            logger.warning(f"Question bank v{version} cannot be restored: "
+                           f"{len(set(ids)) - len(docs)} of its questions were deleted")
+            return None
+        snapshot = await asyncio.to_thread(
+            lambda: BankSnapshot.build([normalize_question(docs[i]) for i in ids])
+        )
+        if snapshot.version != version:
+            # Same questions in the same order, some edited since: grade with
+            # their current answer keys, under the version the tests name
+            logger.info(f"Question bank v{version} restored with questions edited since (now v{snapshot.version})")
+            snapshot = replace(snapshot, version=version)
+        else:
+            logger.info(f"Question bank v{version} restored ({len(ids)} questions)")
+        self._remember(snapshot)
+        return snapshot
+
+    async def start(self, collection, versions=None):
+        self._collection = collection
+        self._versions = versions
+        try:
+            await self.seed_if_empty()
+            await self.reload()
+        except PyMongoError as e:
+            logger.error(f"Question bank load failed, serving built-in questions: {e}")
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def seed_if_empty(self):
+        if await self._collection.estimated_document_count() > 0:
+            return
+        # Upsert on the question text so concurrently starting workers
+        # cannot seed the same question twice
+        await self._collection.bulk_write([
+            UpdateOne({"question_text": q["question_text"]}, {"$setOnInsert": q}, upsert=True)
+            for q in self.seed
+        ], ordered=False)
+        logger.info(f"Seeded questions collection with {len(self.seed)} questions")
+
+    async def reload(self):
+        docs = await self._collection.find({}).sort("_id", 1).to_list(length=None)
+        if not docs:
+            return
+        # Hundreds of milliseconds for a large bank: keep it off the event loop
+        snapshot = await asyncio.to_thread(
+            lambda: BankSnapshot.build([normalize_question(d) for d in docs])
+        )
+        if snapshot.version != self.current.version and self._versions is not None:
+            # Recorded before any test can be started on it (and before the
+            # fingerprint, so a failed write is retried); identical in every
+            # worker that loads this version
+            await self._versions.update_one(
+                {"_id": snapshot.version},
+                {"$setOnInsert": {"question_ids": [d["_id"] for d in docs],
+                                  "created_at": datetime.now(timezone.utc)}},
+                upsert=True
+            )
+        self._fingerprint = await self._read_fingerprint()
+        if snapshot.version != self.current.version:
+            self._publish(snapshot)
+            logger.info(f"Question bank v{snapshot.version} loaded ({len(snapshot.questions)} questions)")
+
+    async def _read_fingerprint(self):
+        count = await self._collection.estimated_document_count()
+        newest = await self._collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        edited = await self._collection.find_one(
+            {"updated_at": {"$exists": True}}, {"updated_at": 1}, sort=[("updated_at", -1)]
+        )
+        return (
+            count,
+            newest and newest["_id"],
+            edited and edited["updated_at"],
+        )
+
+    async def _refresh_loop(self):
+        try:
+            async with self._collection.watch() as stream:
+                logger.info("Question bank following change stream")
+                async for _ in stream:
+                    await asyncio.sleep(CHANGE_SETTLE_SECONDS)
+                    # Everything that arrived meanwhile is covered by one reload
+                    while await stream.try_next() is not None:
+                        pass
+                    await self.reload()
+        except asyncio.CancelledError:
+            raise
+        except PyMongoError as e:
+            logger.info(f"Change streams unavailable ({e}); polling every {self.poll_interval}s")
+
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                if await self._read_fingerprint() != self._fingerprint:
+                    await self.reload()
+            except PyMongoError as e:
+                logger.warning(f"Question bank refresh failed: {e}")
@@ -0,0 +1,81 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from metrics import REGISTRY
+
+RESULT_CACHE_LOOKUPS = REGISTRY.counter(
+    "result_cache_lookups", "Result cache lookups by outcome (hit, miss, expired)", ("outcome",)
+)
+
+
+@dataclass
+class CachedResult:
+    doc: dict
+    stored_at: float
+    # The last response built from `doc`: (percentile, etag, body)
+    response: Optional[Tuple[Optional[int], str, bytes]] = None
+
+
+class ResultCache:
+    """Per-process LRU of stored test results, each kept for at most `ttl` seconds.
+
+    A result never changes once written, so entries are added when
+    `submit_test` stores them and the first read is already a hit. Next to
+    each document the encoded response is kept, so repeated reads (and
+    conditional ones answered with 304) skip serialization as well; it is
+    rebuilt only when the percentile rank the response carries has moved.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, test_id: str) -> Optional[CachedResult]:
+        entry = self._entries.get(test_id)
+        if entry is None:
+            self.counters["misses"] += 1
+            RESULT_CACHE_LOOKUPS.inc("miss")
+            return None
+        if time.monotonic() - entry.stored_at > self.ttl:
+            del self._entries[test_id]
+            self.counters["expired"] += 1
+            RESULT_CACHE_LOOKUPS.inc("expired")
+            return None
+        self._entries.move_to_end(test_id)
+        self.counters["hits"] += 1
+        RESULT_CACHE_LOOKUPS.inc("hit")
+        return entry
+
+    def peek(self, test_id: str) -> Optional[dict]:
+        """The cached document, if any, without counting a lookup or refreshing its LRU position."""
+        entry = self._entries.get(test_id)
+        if entry is None or time.monotonic() - entry.stored_at > self.ttl:
+            return None
+        return entry.doc
+
+    def put(self, doc: dict) -> CachedResult:
+        entry = CachedResult({k: v for k, v in doc.items() if k != "_id"}, time.monotonic())
+        if self.max_entries <= 0:
+            return entry
+        self._entries[doc["test_id"]] = entry
+        self._entries.move_to_end(doc["test_id"])
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+        return entry
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"] + self.counters["expired"]
+        return {
+            **self.counters,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else None,
+        }
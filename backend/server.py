@@ -1,57 +1,216 @@
-from fastapi import FastAPI, APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
+# First, so the time every other import takes is measured
+from startup import StartupTimer
+boot = StartupTimer()
+
+from fastapi import FastAPI, APIRouter, HTTPException, Header, Query
+from fastapi.responses import ORJSONResponse, PlainTextResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 import uuid
-from datetime import datetime, timezone
-import random
-import io
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
+from datetime import datetime, timedelta, timezone
+import asyncio
+import hashlib
+import hmac
+import orjson
+from contextlib import asynccontextmanager
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from database import MongoConnection
+import metrics
+from question_bank import QuestionBank, pack_indices, unpack_indices
+from write_behind import WriteBehindQueue
+from grading import (
+    get_performance_level, iq_score, grade_batch, score_rows, ability_iq, iq_accuracy
+)
+from adaptive import AdaptiveTester
+from stats import StatsCounters
+from norms import NormsEngine
+from item_stats import ItemStats, item_report
+from certificates import (
+    CertificateRenderer, RendererSaturated, certificate_fields, certificate_digest, issue_date
+)
+from certificate_cache import CertificateCache
+from result_cache import CachedResult, ResultCache
+from progress import ProgressWriter, saved_answers
+from admission import AdmissionController, AdmissionMiddleware, RouteLimit
+from bulk_certificates import stream_certificate_zip
+from indexes import declared_indexes, ensure_indexes
+from export import EXPORTS, FORMATS, stream_export
+from session_tokens import (
+    SessionTokenSigner, InvalidSessionToken, ExpiredSessionToken, is_session_token
+)
+
+boot.imports_done()
 
 # Load environment variables
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB Connection
-MONGO_URL = os.environ.get('MONGO_URL')
-DB_NAME = os.environ.get('DB_NAME', 'mindmeter_db')
+# Prometheus-format metrics at /metrics: per-route latency and status
+# counts, Mongo call and certificate render timings
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+# Workers of one deployment share their metrics through this directory
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+# Log requests slower than this with a breakdown of their time (0 = off)
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '0'))
+# Warn at boot when a worker takes longer than this to become ready (0 = off)
+STARTUP_BUDGET_MS = float(os.environ.get('STARTUP_BUDGET_MS', '0'))
 
-if not MONGO_URL:
-    raise Exception("MONGO_URL missing in .env")
+# MongoDB Connection, opened per worker process by the app's lifespan
+mongo = MongoConnection(
+    os.environ.get('MONGO_URL'),
+    os.environ.get('DB_NAME', 'mindmeter_db'),
+    max_pool_size=int(os.environ.get('MONGO_MAX_POOL_SIZE', '100')),
+    min_pool_size=int(os.environ.get('MONGO_MIN_POOL_SIZE', '0')),
+    server_selection_timeout_ms=int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+    instrument=METRICS_ENABLED
+)
 
-try:
-    client = AsyncIOMotorClient(
-        MONGO_URL,
-        uuidRepresentation='standard',
-        serverSelectionTimeoutMS=5000
-    )
-    db = client[DB_NAME]
-    logging.info("Connected to MongoDB")
-except Exception as e:
-    logging.error(f"MongoDB Error: {e}")
-    raise HTTPException(status_code=500, detail="Database connection failed")
-
-# FastAPI App Setup
-app = FastAPI(title="MindMeter IQ API", version="1.0.0", description="Intelligence Testing Platform API")
-api_router = APIRouter(prefix="/api")
+# Unsubmitted test_sessions documents expire after this long
+SESSION_TTL_HOURS = float(os.environ.get('SESSION_TTL_HOURS', '24'))
+
+# Test sessions: "stateful" stores a test_sessions document per test,
+# "stateless" encodes the test in an HMAC-signed test_id instead
+TEST_SESSION_MODE = os.environ.get('TEST_SESSION_MODE', 'stateful')
+TEST_TOKEN_SECRET = os.environ.get('TEST_TOKEN_SECRET')
+TEST_TOKEN_TTL_SECONDS = int(os.environ.get('TEST_TOKEN_TTL_SECONDS', '7200'))
+
+if TEST_SESSION_MODE not in ('stateful', 'stateless'):
+    raise Exception(f"Unknown TEST_SESSION_MODE: {TEST_SESSION_MODE}")
+if TEST_SESSION_MODE == 'stateless' and not TEST_TOKEN_SECRET:
+    raise Exception("TEST_TOKEN_SECRET missing in .env (required for stateless sessions)")
 
-# CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+# Tokens stay verifiable whenever a secret is set, so switching modes does
+# not invalidate tests already in progress
+session_signer = SessionTokenSigner(TEST_TOKEN_SECRET, TEST_TOKEN_TTL_SECONDS) if TEST_TOKEN_SECRET else None
+
+# Sessions store the bank version and packed question indices rather than
+# copies of the questions; set to false while older workers that can only
+# read full sessions are still serving (both formats are always graded)
+COMPACT_SESSIONS = os.environ.get('COMPACT_SESSIONS', 'true').lower() == 'true'
+
+# Opt-in write-behind batching of test_results inserts
+RESULT_WRITE_BEHIND = os.environ.get('RESULT_WRITE_BEHIND', 'false').lower() == 'true'
+result_writer = WriteBehindQueue(
+    "test_id",
+    batch_size=int(os.environ.get('RESULT_BATCH_SIZE', '500')),
+    flush_interval=int(os.environ.get('RESULT_FLUSH_MS', '50')) / 1000,
+    max_pending=int(os.environ.get('RESULT_MAX_PENDING', '10000'))
+) if RESULT_WRITE_BEHIND else None
+
+# Autosaved answers, written to their sessions once per interval per test
+progress_writer = ProgressWriter(
+    flush_interval=int(os.environ.get('PROGRESS_FLUSH_MS', '1000')) / 1000
+)
+
+stats_counters = StatsCounters(ttl=float(os.environ.get('STATS_CACHE_SECONDS', '10')))
+
+# Per-question attempt/correct/choice counters, flushed on an interval
+item_stats = ItemStats(
+    flush_interval=float(os.environ.get('ITEM_STATS_FLUSH_SECONDS', '10')),
+    ttl=float(os.environ.get('ITEM_STATS_CACHE_SECONDS', '60'))
 )
 
+# Score histograms per test configuration, for percentile ranks
+norms = NormsEngine(
+    flush_interval=float(os.environ.get('NORMS_FLUSH_SECONDS', '10')),
+    min_samples=int(os.environ.get('NORMS_MIN_SAMPLES', '100'))
+)
+
+# Certificate PDFs render in a pool of worker processes, off the event loop
+certificate_renderer = CertificateRenderer(
+    workers=int(os.environ.get('CERTIFICATE_WORKERS', '2')),
+    max_queue=int(os.environ.get('CERTIFICATE_MAX_QUEUE', '8')),
+    timeout=float(os.environ.get('CERTIFICATE_TIMEOUT_SECONDS', '10'))
+)
+
+# Rendered certificates, keyed by a digest of their content
+certificate_cache = CertificateCache(
+    max_bytes=int(os.environ.get('CERTIFICATE_CACHE_MB', '64')) * 1024 * 1024,
+    disk_dir=os.environ.get('CERTIFICATE_CACHE_DIR') or None,
+    disk_max_bytes=int(os.environ.get('CERTIFICATE_CACHE_DISK_MB', '1024')) * 1024 * 1024
+)
+
+# Stored results, cached per worker from the moment they are submitted;
+# browsers may reuse a result response this long, then revalidate by ETag
+result_cache = ResultCache(
+    max_entries=int(os.environ.get('RESULT_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('RESULT_CACHE_TTL_SECONDS', '3600'))
+)
+RESULT_CACHE_CONTROL = f"private, max-age={int(os.environ.get('RESULT_MAX_AGE_SECONDS', '86400'))}"
+
+BULK_CERTIFICATE_MAX_ITEMS = int(os.environ.get('BULK_CERTIFICATE_MAX_ITEMS', '5000'))
+BATCH_GRADING_MAX_ITEMS = int(os.environ.get('BATCH_GRADING_MAX_ITEMS', '10000'))
+
+# Bulk exports are only served when a token is configured
+EXPORT_TOKEN = os.environ.get('EXPORT_TOKEN')
+# Per-question statistics tell which options are picked by the best scorers,
+# which comes close to the answer key: likewise only served with a token
+ITEM_STATS_TOKEN = os.environ.get('ITEM_STATS_TOKEN')
+# The default upper watermark trails now, so writes still in flight (e.g. in
+# the write-behind buffer) land in the next incremental export
+EXPORT_WATERMARK_LAG_SECONDS = float(os.environ.get('EXPORT_WATERMARK_LAG_SECONDS', '60'))
+
+# Adaptive tests ("mode": "adaptive") serve one question at a time and stop
+# once the ability estimate's standard error reaches the target
+adaptive_tester = AdaptiveTester(
+    target_se=float(os.environ.get('ADAPTIVE_TARGET_SE', '0.35')),
+    min_items=int(os.environ.get('ADAPTIVE_MIN_ITEMS', '5')),
+    max_items=int(os.environ.get('ADAPTIVE_MAX_ITEMS', '30')),
+    randomesque=int(os.environ.get('ADAPTIVE_RANDOMESQUE', '3'))
+)
+
+# Admission control, per worker: concurrency caps per route, and optionally
+# a token bucket per client address and route. ADMISSION_LIMITS (JSON, same
+# shape as below) overrides these per route; null lifts a route's limits.
+# No route is rate limited by default: a classroom or a school behind NAT
+# sends every test taker from one address, and a per-address rate would
+# turn its students away. Only opt into rates where clients have addresses
+# of their own
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() == 'true'
+ADMISSION_LIMITS = {
+    # Every start writes a session
+    "POST /api/test/start": RouteLimit(concurrency=64),
+    # Repeats are answered with the stored result, so only capped
+    "POST /api/test/submit": RouteLimit(concurrency=64),
+    "POST /api/test/submit/batch": RouteLimit(concurrency=4),
+    "POST /api/certificate/download": RouteLimit(concurrency=16, retry_after=2),
+    "GET /api/certificate/download": RouteLimit(concurrency=16, retry_after=2),
+    "POST /api/certificate/bulk": RouteLimit(concurrency=2, retry_after=10),
+    "GET /api/export/{collection}": RouteLimit(concurrency=2, retry_after=30),
+}
+for route, spec in orjson.loads(os.environ.get('ADMISSION_LIMITS') or '{}').items():
+    ADMISSION_LIMITS[route] = RouteLimit(**spec) if spec is not None else None
+admission = AdmissionController(
+    ADMISSION_LIMITS, max_clients=int(os.environ.get('ADMISSION_MAX_CLIENTS', '50000'))
+)
+
+metrics.REGISTRY.gauge(
+    "certificate_renders_in_flight", "Certificate renders running or queued",
+    lambda: certificate_renderer.in_flight
+)
+metrics.REGISTRY.gauge(
+    "certificate_cache_memory_bytes", "Bytes of PDFs held in the in-memory certificate cache",
+    lambda: certificate_cache.stats()["memory_bytes"]
+)
+metrics.REGISTRY.gauge(
+    "result_cache_entries", "Test results held in the result cache", lambda: len(result_cache)
+)
+metrics.REGISTRY.gauge(
+    "admission_clients", "Client addresses holding a rate-limit bucket", lambda: admission.client_count
+)
+metrics.REGISTRY.gauge(
+    "result_writes_pending", "test_results documents waiting in the write-behind buffer",
+    lambda: result_writer.pending_count if result_writer else 0
+)
+
+api_router = APIRouter(prefix="/api")
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -73,6 +232,7 @@ class TestConfig(BaseModel):
     duration: str
     question_types: List[str]
     difficulty: str
+    mode: str = "fixed"
 
 class TestResult(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -87,7 +247,20 @@ class TestResult(BaseModel):
 
 class TestResultCreate(BaseModel):
     test_id: str
-    answers: List[int]
+    # Positions not sent are graded from the answers autosaved through /test/progress
+    answers: List[int] = []
+
+class ProgressUpdate(BaseModel):
+    test_id: str
+    position: int = Field(ge=0, lt=200)
+    answer: int = Field(ge=-1)
+
+class AdaptiveAnswer(BaseModel):
+    test_id: str
+    answer: int
+
+class BatchSubmitRequest(BaseModel):
+    submissions: List[TestResultCreate]
 
 class CertificateRequest(BaseModel):
     test_id: str
@@ -95,7 +268,15 @@ class CertificateRequest(BaseModel):
     email: Optional[str] = None
     contact: Optional[str] = None
 
+class BulkCertificateItem(BaseModel):
+    test_id: str
+    name: str
+
+class BulkCertificateRequest(BaseModel):
+    items: List[BulkCertificateItem]
+
 # QUESTIONS BANK
+# Seed for the `questions` collection; served as-is until the collection loads
 QUESTIONS_BANK = [
     {
         "question_text": "What number comes next in the sequence: 2, 4, 8, 16, ?",
@@ -239,17 +420,10 @@ QUESTIONS_BANK = [
     }
 ]
 
-def get_performance_level(accuracy):
-    if accuracy >= 90:
-        return "Superior"
-    elif accuracy >= 75:
-        return "Above Average"
-    elif accuracy >= 60:
-        return "High Average"
-    elif accuracy >= 40:
-        return "Average"
-    else:
-        return "Below Average"
+question_bank = QuestionBank(
+    QUESTIONS_BANK,
+    poll_interval=float(os.environ.get('QUESTION_BANK_POLL_SECONDS', '30'))
+)
 
 # ROUTES
 @api_router.get("/")
@@ -257,217 +431,833 @@ async def root():
     return {"message": "MindMeter IQ API - Intelligence Testing Platform"}
 
 @api_router.get("/stats")
-async def get_stats():
+async def get_stats(breakdown: bool = False):
     try:
-        total_tests = await db.test_results.count_documents({})
-        return {"total_tests": total_tests, "status": "operational"}
+        stats = await stats_counters.get()
     except:
         return {"total_tests": 0, "status": "operational"}
+    if breakdown:
+        return {**stats, "status": "operational"}
+    return {"total_tests": stats["total_tests"], "status": "operational"}
+
+def frontend_question(question: dict, position: int) -> dict:
+    return {
+        "id": str(position),
+        "question_text": question["question_text"],
+        "options": question["options"],
+        "category": question["category"]
+    }
 
 @api_router.post("/test/start")
 async def start_test(config: TestConfig):
+    if config.mode == "adaptive":
+        return await start_adaptive_test(config)
+    if config.mode != "fixed":
+        raise HTTPException(status_code=400, detail=f"Unknown test mode: {config.mode}")
+
     num_questions = {
         "short": 5,
         "medium": 10,
         "long": 20
     }.get(config.duration, 10)
 
-    filtered_questions = []
-    for q in QUESTIONS_BANK:
-        if q["difficulty"] != config.difficulty:
-            continue
-        if "all" not in config.question_types:
-            if q["category"] not in config.question_types:
-                continue
-        filtered_questions.append(q)
+    bank = question_bank.current
+    selected_indices = bank.selector.select(config.difficulty, config.question_types, num_questions)
 
-    if len(filtered_questions) < num_questions:
-        filtered_questions = [
-            q for q in QUESTIONS_BANK
-            if "all" in config.question_types or q["category"] in config.question_types
-        ]
+    if TEST_SESSION_MODE == 'stateless':
+        test_id = session_signer.issue(bank.version, selected_indices, config.difficulty, config.duration)
+    else:
+        test_id = str(uuid.uuid4())
+        if COMPACT_SESSIONS:
+            session_questions = {"question_indices": pack_indices(selected_indices)}
+        else:
+            session_questions = {"questions": [bank.questions[i] for i in selected_indices]}
+        await mongo.db.test_sessions.insert_one({
+            "test_id": test_id,
+            **session_questions,
+            "bank_version": bank.version,
+            "config": config.model_dump(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            # BSON date for the TTL index; "timestamp" stays an ISO string
+            "created_at": datetime.now(timezone.utc)
+        })
 
-    random.shuffle(filtered_questions)
-    selected_questions = filtered_questions[:num_questions]
+    # Assembled from the question fragments pre-encoded with the bank
+    return Response(
+        b'{"test_id":' + orjson.dumps(test_id)
+        + b',"questions":' + bank.questions_json(selected_indices)
+        + b',"duration_minutes":%d}' % num_questions,
+        media_type="application/json"
+    )
 
+async def start_adaptive_test(config: TestConfig):
+    # Adaptive tests always keep a session document, whatever
+    # TEST_SESSION_MODE says, since every answer updates it
+    bank = question_bank.current
+    first = adaptive_tester.first_item(bank, config.question_types)
+    if first is None:
+        raise HTTPException(status_code=400, detail="No questions match the selected types")
     test_id = str(uuid.uuid4())
-
-    questions_for_frontend = [
-        {
-            "id": str(i),
-            "question_text": q["question_text"],
-            "options": q["options"],
-            "category": q["category"]
-        }
-        for i, q in enumerate(selected_questions)
-    ]
-
-    await db.test_sessions.insert_one({
+    await mongo.db.test_sessions.insert_one({
         "test_id": test_id,
-        "questions": selected_questions,
+        "question_indices": pack_indices([first]),
+        "answers": [],
+        "answered": 0,
+        "bank_version": bank.version,
         "config": config.model_dump(),
-        "timestamp": datetime.now(timezone.utc).isoformat()
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "created_at": datetime.now(timezone.utc)
     })
+    return Response(
+        b'{"test_id":' + orjson.dumps(test_id) + b',"mode":"adaptive"'
+        + b',"questions":' + bank.questions_json([first])
+        + b',"max_questions":%d,"duration_minutes":%d}' % (adaptive_tester.max_items, adaptive_tester.max_items),
+        media_type="application/json"
+    )
+
+@api_router.post("/test/answer")
+async def answer_adaptive_question(answer: AdaptiveAnswer):
+    """Record one answer of an adaptive test and return the next question,
+    or `done` once the ability estimate is precise enough."""
+    test_session = await mongo.db.test_sessions.find_one({"test_id": answer.test_id})
+    if not test_session:
+        raise HTTPException(status_code=404, detail="Test session not found")
+    test_config = test_session.get("config") or {}
+    if test_config.get("mode") != "adaptive":
+        raise HTTPException(status_code=400, detail="Not an adaptive test")
+    bank = await question_bank.load(test_session["bank_version"])
+    if bank is None:
+        raise HTTPException(status_code=410, detail="Test questions are no longer available")
+
+    indices = unpack_indices(test_session["question_indices"])
+    answers = test_session["answers"]
+    if len(answers) >= len(indices):
+        raise HTTPException(status_code=409, detail="Test already finished")
+    answers = answers + [answer.answer]
+    step = adaptive_tester.step(bank, test_config["question_types"], indices, answers)
+
+    update = {"$push": {"answers": answer.answer}, "$inc": {"answered": 1}}
+    if step.next_index is not None:
+        indices.append(step.next_index)
+        update["$set"] = {"question_indices": pack_indices(indices)}
+    # Conditional on the answer count, so a retried or concurrent answer
+    # cannot be recorded twice
+    outcome = await mongo.db.test_sessions.update_one(
+        {"test_id": answer.test_id, "answered": len(answers) - 1}, update
+    )
+    if outcome.modified_count == 0:
+        raise HTTPException(status_code=409, detail="Answer already recorded")
+
+    response = {
+        "test_id": answer.test_id,
+        "answered": len(answers),
+        "ability": round(step.ability, 3),
+        "standard_error": round(step.standard_error, 3),
+        "done": step.next_index is None
+    }
+    if step.next_index is not None:
+        response["question"] = frontend_question(bank.questions[step.next_index], len(indices) - 1)
+    return response
 
+async def score_adaptive_session(test_session: dict):
+    """(correct, total, accuracy, iq) of an adaptive test, from the answers recorded so far."""
+    answers = test_session.get("answers") or []
+    if not answers:
+        raise HTTPException(status_code=400, detail="No answers recorded for this test")
+    questions = test_session["questions"][:len(answers)]
+    bank = await question_bank.load(test_session["bank_version"])
+    indices = unpack_indices(test_session["question_indices"])[:len(answers)]
+    ability, _ = adaptive_tester.estimate(bank, indices, answers)
+    correct = sum(1 for q, a in zip(questions, answers) if q["correct_answer"] == a)
+    return correct, len(answers), (correct / len(answers)) * 100, ability_iq(ability)
+
+async def token_session(test_id: str):
+    """Resolve a stateless test from its signed token alone."""
+    try:
+        token = session_signer.verify(test_id)
+    except ExpiredSessionToken:
+        raise HTTPException(status_code=410, detail="Test session expired")
+    except InvalidSessionToken:
+        raise HTTPException(status_code=400, detail="Invalid test token")
     return {
         "test_id": test_id,
-        "questions": questions_for_frontend,
-        "duration_minutes": num_questions
+        "questions": await resolve_questions(token.bank_version, token.indices),
+        "config": {"difficulty": token.difficulty, "duration": token.duration}
     }
 
-@api_router.post("/test/submit", response_model=TestResult)
-async def submit_test(result: TestResultCreate):
-    test_session = await db.test_sessions.find_one({"test_id": result.test_id})
+async def session_questions(test_session: dict) -> List[dict]:
+    if "questions" in test_session:
+        # Full session, written before sessions were compacted (or with
+        # COMPACT_SESSIONS=false)
+        return test_session["questions"]
+    return await resolve_questions(test_session["bank_version"], unpack_indices(test_session["question_indices"]))
+
+async def resolve_questions(version: str, indices: List[int]) -> List[dict]:
+    bank = await question_bank.load(version)
+    questions = bank.resolve(indices) if bank else None
+    if questions is None:
+        raise HTTPException(status_code=410, detail="Test questions are no longer available")
+    return questions
+
+async def load_test_session(test_id: str):
+    """Resolve a test's questions and config from its signed token or its session document."""
+    if is_token_session(test_id):
+        return await token_session(test_id)
+
+    test_session = await mongo.db.test_sessions.find_one({"test_id": test_id})
     if not test_session:
         raise HTTPException(status_code=404, detail="Test session not found")
+    test_session["questions"] = await session_questions(test_session)
+    return test_session
 
-    questions = test_session["questions"]
-    correct_count = 0
-
-    for i, answer in enumerate(result.answers):
-        if i < len(questions) and answer == questions[i]["correct_answer"]:
-            correct_count += 1
-
-    total_questions = len(questions)
-    accuracy_percentage = (correct_count / total_questions) * 100 if total_questions > 0 else 0
-    
-    performance_level = get_performance_level(accuracy_percentage)
-
-    base_iq = 100
-    iq_variation = (accuracy_percentage - 50) * 0.6
-    mock_iq = int(base_iq + iq_variation)
-    mock_iq = max(80, min(145, mock_iq))
-
-    test_result = TestResult(
-        test_id=result.test_id,
-        correct_answers=correct_count,
-        total_questions=total_questions,
-        iq_score=mock_iq,
-        accuracy_percentage=accuracy_percentage,
-        performance_level=performance_level
+# Submissions being graded by this worker, so a duplicate that arrives
+# meanwhile waits for the first instead of grading the test again
+submissions_in_flight: Dict[str, asyncio.Future] = {}
+
+def local_result(test_id: str) -> Optional[dict]:
+    """A stored result this worker already holds, without asking Mongo."""
+    doc = result_cache.peek(test_id)
+    if doc is None and result_writer:
+        doc = result_writer.get(test_id)
+    return doc
+
+def submission_response(result_doc: dict, idempotency_key: Optional[str] = None, replayed: bool = False):
+    if replayed and idempotency_key and result_doc.get("idempotency_key") not in (None, idempotency_key):
+        # A different submission attempt, not a retry of the one stored
+        raise HTTPException(status_code=409, detail="Test already submitted")
+    # Returning a response skips FastAPI's response_model round trip;
+    # the model still documents the shape
+    return ORJSONResponse(
+        {field: result_doc[field] for field in TestResult.model_fields},
+        headers={"Idempotent-Replayed": "true"} if replayed else None
     )
 
-    result_doc = test_result.model_dump()
-    result_doc["timestamp"] = result_doc["timestamp"].isoformat()
+@api_router.post("/test/submit", response_model=TestResult)
+async def submit_test(result: TestResultCreate, idempotency_key: Optional[str] = Header(None)):
+    """Grade and store a test, once.
 
-    await db.test_results.insert_one(result_doc)
+    Repeats (double clicks, client retries) get the stored result back,
+    marked with `Idempotent-Replayed: true`, without grading or writing
+    anything again; the unique index on `test_results.test_id` settles
+    duplicates that reach different workers at the same time (with
+    RESULT_WRITE_BEHIND only the first one is stored, but each of them
+    is answered with its own grading). A client
+    that sends an `Idempotency-Key` gets 409 instead when the test was
+    already submitted under a different key. A repeat whose session has
+    expired or been deleted since is answered from `test_results`.
+    """
+    while True:
+        stored = local_result(result.test_id)
+        if stored is None and result_writer and result.test_id not in submissions_in_flight:
+            # Buffered inserts cannot report a duplicate key, so look first
+            stored = await stored_result(result.test_id)
+        if stored is not None:
+            return submission_response(stored, idempotency_key, replayed=True)
+        in_flight = submissions_in_flight.get(result.test_id)
+        if in_flight is None:
+            break
+        await asyncio.shield(in_flight)
 
-    return test_result
+    done = asyncio.get_running_loop().create_future()
+    submissions_in_flight[result.test_id] = done
+    try:
+        return await grade_submission(result, idempotency_key)
+    finally:
+        del submissions_in_flight[result.test_id]
+        done.set_result(None)
 
-@api_router.get("/test/result/{test_id}")
-async def get_test_result(test_id: str):
-    test_result = await db.test_results.find_one({"test_id": test_id}, {"_id": 0})
-    if not test_result:
-        raise HTTPException(status_code=404, detail="Test result not found")
-    
-    # Add calculated fields
-    test_result["incorrect_answers"] = test_result["total_questions"] - test_result["correct_answers"]
-    test_result["average_time_per_question"] = 45  # Mock value
-    test_result["iq_score_estimate"] = test_result["iq_score"]
-    
-    return test_result
+async def stored_result(test_id: str) -> Optional[dict]:
+    stored = await mongo.db.test_results.find_one({"test_id": test_id}, {"_id": 0})
+    if stored is not None:
+        result_cache.put(stored)
+    return stored
 
-@api_router.post("/certificate/download")
-async def download_certificate(cert_request: CertificateRequest):
-    test_result = await db.test_results.find_one({"test_id": cert_request.test_id})
-    if not test_result:
-        raise HTTPException(status_code=404, detail="Test result not found")
-
-    # Save certificate request
-    await db.certificates.insert_one({
-        "test_id": cert_request.test_id,
-        "name": cert_request.name,
-        "email": cert_request.email,
-        "contact": cert_request.contact,
-        "timestamp": datetime.now(timezone.utc).isoformat()
+async def grade_submission(result: TestResultCreate, idempotency_key: Optional[str]):
+    try:
+        test_session = await load_test_session(result.test_id)
+    except HTTPException as e:
+        # Looked up only now, so a first submit costs no read: a test may
+        # have been graded before its session expired or was deleted
+        stored = await stored_result(result.test_id) if e.status_code in (404, 410) else None
+        if stored is None:
+            raise
+        return submission_response(stored, idempotency_key, replayed=True)
+    test_config = test_session.get("config") or {}
+    questions = answers = None
+    if test_config.get("mode") == "adaptive":
+        # Graded from the answers recorded by /test/answer
+        correct_count, total_questions, accuracy_percentage, mock_iq = await score_adaptive_session(test_session)
+        performance_level = get_performance_level(iq_accuracy(mock_iq))
+    else:
+        questions = test_session["questions"]
+        answers = result.answers
+        if len(answers) < len(questions):
+            answers = await completed_answers(test_session, answers, len(questions))
+        correct_count = 0
+
+        for i, answer in enumerate(answers):
+            if i < len(questions) and answer == questions[i]["correct_answer"]:
+                correct_count += 1
+
+        total_questions = len(questions)
+        accuracy_percentage = (correct_count / total_questions) * 100 if total_questions > 0 else 0
+
+        performance_level = get_performance_level(accuracy_percentage)
+
+        mock_iq = iq_score(accuracy_percentage)
+
+    # Built as a plain dict: every value is computed right here, so a
+    # TestResult model would only validate (and serialize) it twice
+    result_doc = {
+        "id": str(uuid.uuid4()),
+        "test_id": result.test_id,
+        "correct_answers": correct_count,
+        "total_questions": total_questions,
+        "iq_score": mock_iq,
+        "accuracy_percentage": accuracy_percentage,
+        "performance_level": performance_level,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        # Stored for the stats breakdowns; not part of the response model
+        "difficulty": test_config.get("difficulty"),
+        "duration": test_config.get("duration"),
+        "mode": test_config.get("mode") or "fixed",
+    }
+    if idempotency_key:
+        result_doc["idempotency_key"] = idempotency_key
+
+    if result_writer:
+        # Recorded by record_written_results once the insert lands, so a
+        # write that fails is never counted
+        await result_writer.put(result_doc, (questions, answers))
+        return submission_response(result_doc)
+    try:
+        await mongo.db.test_results.insert_one(result_doc)
+    except DuplicateKeyError:
+        # Another worker stored this test first; answer with its result
+        stored = await stored_result(result.test_id)
+        return submission_response(stored, idempotency_key, replayed=True)
+    # Adaptive tests are left out of the item statistics: they aim every
+    # question at about a 50% chance of success, which would flatten the p-values
+    await record_stored_results([(result_doc, questions, answers)])
+
+    return submission_response(result_doc)
+
+async def record_written_results(written: List[Tuple[dict, tuple]]):
+    """`record_stored_results` for the results a write-behind flush stored."""
+    await record_stored_results([(result_doc, *context) for result_doc, context in written])
+
+async def record_stored_results(stored: List[Tuple[dict, Optional[List[dict]], Optional[List[int]]]]):
+    """Caching and bookkeeping for (result, questions, answers) just stored.
+
+    Counted only once the results are stored, so duplicates never count.
+    Nothing here may fail the request: the results are stored either way,
+    and a retry would only be answered with them.
+    """
+    for result_doc, questions, answers in stored:
+        try:
+            result_cache.put(result_doc)
+            progress_writer.discard(result_doc["test_id"])
+            if questions is not None:
+                item_stats.record(questions, answers, result_doc["accuracy_percentage"])
+            norms.record(result_doc)
+        except Exception:
+            logger.exception(f"Recording the result of test {result_doc['test_id']} failed")
+    try:
+        await stats_counters.record_many([result_doc for result_doc, _, _ in stored])
+    except Exception:
+        logger.exception("Counting stored results failed")
+
+async def completed_answers(test_session: dict, answers: List[int], count: int) -> List[int]:
+    """The answers sent with a submit, completed from the test's autosaved progress."""
+    test_id = test_session["test_id"]
+    if "progress" in test_session or not is_token_session(test_id):
+        progress = test_session.get("progress")
+    else:
+        # Token tests keep their progress in a session document of its own
+        doc = await mongo.db.test_sessions.find_one({"test_id": test_id}, {"progress": 1})
+        progress = (doc or {}).get("progress")
+    saved = saved_answers({**(progress or {}), **progress_writer.pending(test_id)}, count)
+    return list(answers) + saved[len(answers):]
+
+def is_token_session(test_id: str) -> bool:
+    return bool(session_signer and is_session_token(test_id))
+
+@api_router.post("/test/progress", status_code=202)
+async def save_progress(update: ProgressUpdate):
+    """Autosave one answer of a test in progress.
+
+    Answers are buffered and written to the session in coalesced batches
+    (see PROGRESS_FLUSH_MS), so this returns before anything is stored.
+    A submit without answers is graded from what was saved.
+    """
+    stateless = is_token_session(update.test_id)
+    if stateless and update.position >= len((await token_session(update.test_id))["questions"]):
+        raise HTTPException(status_code=400, detail="No question at this position")
+    progress_writer.record(update.test_id, update.position, update.answer, upsert=stateless)
+    return {"test_id": update.test_id, "position": update.position, "status": "saved"}
+
+@api_router.get("/test/progress/{test_id}")
+async def get_progress(test_id: str):
+    """The questions and saved answers of a test in progress, to resume it after a reload."""
+    if local_result(test_id) is not None:
+        raise HTTPException(status_code=409, detail="Test already submitted")
+    test_session = await load_test_session(test_id)
+    if (test_session.get("config") or {}).get("mode") == "adaptive":
+        raise HTTPException(status_code=400, detail="Adaptive tests resume through /api/test/answer")
+    questions = test_session["questions"]
+    return {
+        "test_id": test_id,
+        "questions": [frontend_question(q, i) for i, q in enumerate(questions)],
+        "answers": await completed_answers(test_session, [], len(questions)),
+    }
+
+@api_router.post("/test/submit/batch")
+async def submit_tests_batch(batch: BatchSubmitRequest):
+    """Grade many answer sheets at once, e.g. scanned paper tests.
+
+    Sessions are fetched with one `$in` query, every sheet is scored in a
+    single vectorized pass and the results are stored with one
+    `insert_many`. Sheets that cannot be graded are reported per item
+    rather than failing the batch.
+    """
+    submissions = batch.submissions
+    if len(submissions) > BATCH_GRADING_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {BATCH_GRADING_MAX_ITEMS} submissions per request"
+        )
+
+    outcomes: List[Optional[dict]] = [None] * len(submissions)
+    sessions = {}
+    seen = set()
+    for i, submission in enumerate(submissions):
+        test_id = submission.test_id
+        if test_id in seen or (result_writer and result_writer.get(test_id) is not None):
+            outcomes[i] = {"test_id": test_id, "status": "already_submitted"}
+            continue
+        seen.add(test_id)
+        if session_signer and is_session_token(test_id):
+            try:
+                sessions[test_id] = await token_session(test_id)
+            except HTTPException as e:
+                outcomes[i] = {"test_id": test_id, "status": "error", "status_code": e.status_code, "detail": e.detail}
+
+    stored = [test_id for test_id in seen if test_id not in sessions]
+    if stored:
+        projection = {"_id": 0, "test_id": 1, "questions": 1, "question_indices": 1, "bank_version": 1, "config": 1}
+        async for doc in mongo.db.test_sessions.find({"test_id": {"$in": stored}}, projection):
+            sessions.setdefault(doc["test_id"], doc)
+
+    graded, answer_keys, responses = [], [], []
+    for i, submission in enumerate(submissions):
+        if outcomes[i] is not None:
+            continue
+        test_session = sessions.get(submission.test_id)
+        try:
+            if test_session is None:
+                raise HTTPException(status_code=404, detail="Test session not found")
+            if (test_session.get("config") or {}).get("mode") == "adaptive":
+                raise HTTPException(status_code=400, detail="Adaptive tests are graded by /api/test/submit")
+            questions = await session_questions(test_session)
+        except HTTPException as e:
+            outcomes[i] = {"test_id": submission.test_id, "status": "error",
+                           "status_code": e.status_code, "detail": e.detail}
+            continue
+        graded.append((i, test_session.get("config") or {}, questions))
+        answer_keys.append([q["correct_answer"] for q in questions])
+        responses.append(submission.answers)
+
+    timestamp = datetime.now(timezone.utc).isoformat()
+    result_docs = []
+    for (i, test_config, _), (correct, total, accuracy, iq, level) in zip(
+        graded, score_rows(grade_batch(answer_keys, responses))
+    ):
+        result_docs.append({
+            "id": str(uuid.uuid4()),
+            "test_id": submissions[i].test_id,
+            "correct_answers": correct,
+            "total_questions": total,
+            "iq_score": iq,
+            "accuracy_percentage": accuracy,
+            "performance_level": level,
+            "timestamp": timestamp,
+            "difficulty": test_config.get("difficulty"),
+            "duration": test_config.get("duration"),
+            "mode": "fixed",
+        })
+
+    rejected = set()
+    if result_docs:
+        try:
+            await mongo.db.test_results.insert_many([dict(doc) for doc in result_docs], ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                if error.get("code") != 11000:
+                    raise
+                rejected.add(error["index"])
+
+    recorded = []
+    for n, ((i, _, questions), doc) in enumerate(zip(graded, result_docs)):
+        if n in rejected:
+            outcomes[i] = {"test_id": doc["test_id"], "status": "already_submitted"}
+            continue
+        recorded.append((doc, questions, submissions[i].answers))
+        outcomes[i] = {
+            **{field: doc[field] for field in TestResult.model_fields},
+            "status": "graded"
+        }
+    await record_stored_results(recorded)
+
+    return ORJSONResponse({
+        "graded": len(recorded),
+        "failed": len(submissions) - len(recorded),
+        "results": outcomes
     })
 
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    # Decorative borders
-    c.setStrokeColor(colors.HexColor("#7c3aed"))
-    c.setLineWidth(3)
-    c.rect(40, 40, width - 80, height - 80)
-
-    c.setStrokeColor(colors.HexColor("#ec4899"))
-    c.setLineWidth(1)
-    c.rect(50, 50, width - 100, height - 100)
-
-    # Title
-    c.setFont("Helvetica-Bold", 36)
-    c.setFillColor(colors.HexColor("#7c3aed"))
-    c.drawCentredString(width / 2, height - 120, "Certificate of Achievement")
-
-    # Subtitle
-    c.setFillColor(colors.black)
-    c.setFont("Helvetica", 16)
-    c.drawCentredString(width / 2, height - 160, "MindMeter IQ Intelligence Test")
-
-    # This certifies that text
-    c.setFont("Helvetica", 14)
-    c.drawCentredString(width / 2, height - 230, "This certifies that")
-
-    # Name
-    c.setFont("Helvetica-Bold", 32)
-    c.setFillColor(colors.HexColor("#1f2937"))
-    c.drawCentredString(width / 2, height - 280, cert_request.name)
-
-    # Achievement text
-    c.setFillColor(colors.black)
-    c.setFont("Helvetica", 14)
-    c.drawCentredString(width / 2, height - 330, "has successfully completed the MindMeter IQ assessment")
-    c.drawCentredString(width / 2, height - 355, "with the following results:")
-
-    # Score section
-    c.setFont("Helvetica", 16)
-    c.drawCentredString(width / 2, height - 410, "IQ Score")
-
-    # IQ Score value
-    c.setFont("Helvetica-Bold", 48)
-    c.setFillColor(colors.HexColor("#7c3aed"))
-    c.drawCentredString(width / 2, height - 465, str(test_result["iq_score"]))
-
-    # Performance level
-    c.setFillColor(colors.black)
-    c.setFont("Helvetica", 14)
-    c.drawCentredString(width / 2, height - 505, f"Performance Level: {test_result.get('performance_level', 'N/A')}")
-
-    # Stats
-    c.setFont("Helvetica", 12)
-    accuracy = test_result.get('accuracy_percentage', 0)
-    c.drawCentredString(width / 2, height - 540, f"Accuracy: {accuracy:.0f}% | Questions: {test_result['correct_answers']}/{test_result['total_questions']} correct")
-
-    # Date
-    c.setFont("Helvetica-Oblique", 11)
-    c.drawCentredString(width / 2, 120, f"Issued on {datetime.now(timezone.utc).strftime('%B %d, %Y')}")
-
-    # Footer
-    c.setFont("Helvetica", 10)
-    c.drawCentredString(width / 2, 80, "MindMeter - Intelligence Testing Platform")
-    c.drawCentredString(width / 2, 65, f"Certificate ID: {cert_request.test_id[:16]}")
-
-    c.save()
-    buffer.seek(0)
+async def find_test_result(test_id: str):
+    """Look up a stored result, including ones still waiting in the write-behind buffer."""
+    if result_writer:
+        pending = result_writer.get(test_id)
+        if pending is not None:
+            return pending
+    return await mongo.db.test_results.find_one({"test_id": test_id}, {"_id": 0})
 
-    return StreamingResponse(
-        buffer,
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check; proxies that compress responses may weaken the tag."""
+    if not if_none_match:
+        return False
+    return any(
+        tag.strip().removeprefix("W/") in (etag, "*") for tag in if_none_match.split(",")
+    )
+
+def result_response(entry: CachedResult):
+    """The (etag, body) of a result; reused until its percentile rank moves."""
+    percentile = norms.percentile(entry.doc)
+    if entry.response is None or entry.response[0] != percentile:
+        test_result = {k: v for k, v in entry.doc.items() if k != "idempotency_key"}
+        # Add calculated fields
+        test_result["incorrect_answers"] = test_result["total_questions"] - test_result["correct_answers"]
+        test_result["average_time_per_question"] = 45  # Mock value
+        test_result["iq_score_estimate"] = test_result["iq_score"]
+        test_result["percentile"] = percentile
+        body = orjson.dumps(test_result, default=str)
+        entry.response = (percentile, f'"{hashlib.sha256(body).hexdigest()[:32]}"', body)
+    return entry.response[1:]
+
+@api_router.get("/test/result/{test_id}")
+async def get_test_result(test_id: str, if_none_match: Optional[str] = Header(None)):
+    entry = result_cache.get(test_id)
+    if entry is None:
+        test_result = await find_test_result(test_id)
+        if not test_result:
+            raise HTTPException(status_code=404, detail="Test result not found")
+        entry = result_cache.put(test_result)
+
+    etag, body = result_response(entry)
+    headers = {"ETag": etag, "Cache-Control": RESULT_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+@api_router.get("/results/cache")
+async def get_result_cache_stats():
+    return result_cache.stats()
+
+async def certificate_response(test_id: str, name: str, email: Optional[str] = None,
+                               contact: Optional[str] = None, if_none_match: Optional[str] = None):
+    issued_on = issue_date()
+    request_key = (test_id, name, email, contact, issued_on)
+    digest = certificate_cache.lookup(request_key)
+    first_request = digest is None
+
+    if digest and etag_matches(if_none_match, f'"{digest}"'):
+        return Response(status_code=304, headers={"ETag": f'"{digest}"'})
+
+    pdf = await certificate_cache.get(digest) if digest else None
+    if pdf is None:
+        test_result = await find_test_result(test_id)
+        if not test_result:
+            raise HTTPException(status_code=404, detail="Test result not found")
+
+        test_result["percentile"] = norms.percentile(test_result)
+        fields = certificate_fields(test_result, name, test_id, issued_on)
+        digest = certificate_digest(fields)
+        if etag_matches(if_none_match, f'"{digest}"'):
+            return Response(status_code=304, headers={"ETag": f'"{digest}"'})
+        pdf = await certificate_cache.get(digest)
+
+    if pdf is None:
+        try:
+            pdf = await certificate_renderer.render(fields)
+        except RendererSaturated:
+            raise HTTPException(
+                status_code=503,
+                detail="Certificate service is busy, please retry shortly",
+                headers={"Retry-After": "2"}
+            )
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Certificate generation timed out")
+        await certificate_cache.put(digest, pdf)
+
+    if first_request:
+        # Save certificate request
+        await mongo.db.certificates.insert_one({
+            "test_id": test_id,
+            "name": name,
+            "email": email,
+            "contact": contact,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        })
+        certificate_cache.remember(request_key, digest)
+
+    return Response(
+        pdf,
         media_type="application/pdf",
         headers={
             "Content-Disposition":
-            f"attachment; filename=MindMeter_Certificate_{cert_request.name.replace(' ', '_')}.pdf"
+            f"attachment; filename=MindMeter_Certificate_{name.replace(' ', '_')}.pdf",
+            "ETag": f'"{digest}"',
+            "Cache-Control": "private, no-cache"
+        }
+    )
+
+@api_router.post("/certificate/download")
+async def download_certificate(cert_request: CertificateRequest, if_none_match: Optional[str] = Header(None)):
+    return await certificate_response(
+        cert_request.test_id, cert_request.name, cert_request.email, cert_request.contact, if_none_match
+    )
+
+@api_router.get("/certificate/download")
+async def get_certificate(test_id: str, name: str, if_none_match: Optional[str] = Header(None)):
+    # Cacheable variant of the POST route, so browsers can revalidate by ETag
+    return await certificate_response(test_id, name, if_none_match=if_none_match)
+
+@api_router.post("/certificate/bulk")
+async def download_certificates_bulk(bulk_request: BulkCertificateRequest):
+    if len(bulk_request.items) > BULK_CERTIFICATE_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {BULK_CERTIFICATE_MAX_ITEMS} certificates per request"
+        )
+    # A repeated (test_id, name) is the same certificate: issue it once
+    items = list({(item.test_id, item.name): item.model_dump() for item in bulk_request.items}.values())
+    test_ids = list({item["test_id"] for item in items})
+
+    results = {}
+    async for doc in mongo.db.test_results.find({"test_id": {"$in": test_ids}}, {"_id": 0}):
+        results.setdefault(doc["test_id"], doc)
+    if result_writer:
+        for test_id in test_ids:
+            pending = result_writer.get(test_id)
+            if pending is not None:
+                results.setdefault(test_id, pending)
+
+    issued_on = issue_date()
+    # Recorded like single downloads, so cohort certificates are exported too
+    timestamp = datetime.now(timezone.utc).isoformat()
+    records = [
+        {"test_id": item["test_id"], "name": item["name"], "email": None, "contact": None, "timestamp": timestamp}
+        for item in items if item["test_id"] in results
+    ]
+    if records:
+        await mongo.db.certificates.insert_many(records, ordered=False)
+
+    async def render(test_result, item):
+        test_result["percentile"] = norms.percentile(test_result)
+        fields = certificate_fields(test_result, item["name"], item["test_id"], issued_on)
+        pdf = await certificate_cache.get(certificate_digest(fields))
+        while pdf is None:
+            try:
+                pdf = await certificate_renderer.render(fields)
+            except RendererSaturated:
+                # Yield the pool to interactive downloads and try again
+                await asyncio.sleep(0.05)
+        return pdf
+
+    return StreamingResponse(
+        stream_certificate_zip(items, results, render, window=max(1, certificate_renderer.max_queue // 2)),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=MindMeter_Certificates.zip"}
+    )
+
+def require_token(token: Optional[str], authorization: Optional[str], detail: str):
+    """403 unless `authorization` is "Bearer <token>"; always 403 when no token is configured."""
+    if not token or not hmac.compare_digest(authorization or "", f"Bearer {token}"):
+        raise HTTPException(status_code=403, detail=detail)
+
+@api_router.get("/questions/stats")
+async def get_question_stats(category: Optional[str] = None, difficulty: Optional[str] = None,
+                             min_attempts: int = 0, offset: int = 0, limit: int = 100,
+                             authorization: Optional[str] = Header(None)):
+    """p-values and option choice statistics per question of the current bank."""
+    require_token(ITEM_STATS_TOKEN, authorization, "Question statistics not permitted")
+    stats = await item_stats.get()
+    reports = []
+    for question in question_bank.current.questions:
+        if category and question["category"] != category:
+            continue
+        if difficulty and question["difficulty"] != difficulty:
+            continue
+        counts = stats.get(question["id"])
+        if (counts or {}).get("attempts", 0) < min_attempts:
+            continue
+        reports.append(question)
+    return {
+        "total": len(reports),
+        "questions": [item_report(q, stats.get(q["id"])) for q in reports[offset:offset + limit]]
+    }
+
+@api_router.get("/questions/{question_id}/stats")
+async def get_question_stat(question_id: str, authorization: Optional[str] = Header(None)):
+    require_token(ITEM_STATS_TOKEN, authorization, "Question statistics not permitted")
+    bank = question_bank.current
+    if question_id not in bank.by_id:
+        raise HTTPException(status_code=404, detail="Question not found")
+    question = bank.questions[bank.by_id[question_id]]
+    return item_report(question, (await item_stats.get()).get(question_id))
+
+@api_router.get("/export/{collection}")
+async def export_collection(collection: str, fmt: str = Query("ndjson", alias="format"),
+                            fields: Optional[str] = None, since: Optional[str] = None,
+                            until: Optional[str] = None, batch_size: int = 1000, gzip: bool = False,
+                            authorization: Optional[str] = Header(None)):
+    """Stream test_results or certificates as NDJSON/CSV. Pass the returned
+    X-Export-Watermark as `since` next time to export only newer rows."""
+    require_token(EXPORT_TOKEN, authorization, "Export not permitted")
+    spec = EXPORTS.get(collection)
+    if spec is None:
+        raise HTTPException(status_code=404, detail=f"Unknown export: {collection}")
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(FORMATS)}")
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    if field_list and any(f.startswith("$") for f in field_list):
+        raise HTTPException(status_code=400, detail="Invalid field name")
+    until = until or (datetime.now(timezone.utc) - timedelta(seconds=EXPORT_WATERMARK_LAG_SECONDS)).isoformat()
+
+    filename = f"{collection}.{fmt}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        stream_export(
+            mongo.db[spec.collection], spec, fmt, field_list,
+            since, until, max(1, min(batch_size, 10000)), gzip
+        ),
+        media_type="application/gzip" if gzip else ("application/x-ndjson" if fmt == "ndjson" else "text/csv"),
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "X-Export-Watermark": until
         }
     )
 
-# Add router
-app.include_router(api_router)
+@api_router.get("/certificate/cache")
+async def get_certificate_cache_stats():
+    return certificate_cache.stats()
+
+@api_router.get("/admission")
+async def get_admission_stats():
+    return admission.stats()
+
+@api_router.get("/ready")
+async def readiness():
+    # For load balancers and orchestrators: only route traffic to a worker
+    # whose Mongo connection answers
+    if not await mongo.ping():
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return {"status": "ready"}
+
+async def metrics_endpoint(request):
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
 
-@app.on_event("startup")
-async def startup_event():
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     logger.info("MindMeter IQ API starting up...")
+    boot.begin()
+    with boot.phase("mongo"):
+        await mongo.start()
+    db = mongo.db
+    # Builds on a large collection can take a while; serve traffic meanwhile
+    app.state.index_build = asyncio.create_task(
+        ensure_indexes(db, declared_indexes(int(SESSION_TTL_HOURS * 3600)))
+    )
+    with boot.phase("question bank"):
+        await question_bank.start(db.questions, db.question_bank_versions)
+    stats_counters.start(db.stats)
+    norms.start(db.norms)
+    item_stats.start(db.item_stats)
+    progress_writer.start(db.test_sessions)
+    with boot.phase("stats"):
+        try:
+            await stats_counters.ensure_initialized(db.test_results)
+        except Exception as e:
+            logger.error(f"Stats counters unavailable: {e}")
+    with boot.phase("norms"):
+        try:
+            await norms.ensure_initialized(db.test_results)
+        except Exception as e:
+            logger.error(f"Score norms unavailable: {e}")
+    if result_writer:
+        result_writer.start(db.test_results, on_written=record_written_results)
+    if METRICS_ENABLED and METRICS_DIR:
+        metrics.REGISTRY.share(METRICS_DIR)
+    boot.ready(STARTUP_BUDGET_MS)
+    # Not needed to serve the first request: warm up in the background
+    certificate_renderer.start()
+    # The item information table for unfiltered adaptive tests, now and
+    # whenever a new bank version is published (this is what loads numpy)
+    question_bank.subscribe(adaptive_tester.prepare)
+    adaptive_tester.prepare(question_bank.current)
+    try:
+        yield
+    finally:
+        logger.info("MindMeter IQ API shutting down...")
+        # Still running on a large collection, the build is picked up again
+        # at the next startup
+        app.state.index_build.cancel()
+        try:
+            await app.state.index_build
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception("Index build failed")
+        if result_writer:
+            # First, so the results it still holds are counted before the
+            # counters are flushed for the last time
+            await result_writer.close()
+        await question_bank.stop()
+        await adaptive_tester.close()
+        await norms.stop()
+        await item_stats.stop()
+        await progress_writer.stop()
+        await certificate_renderer.close()
+        await metrics.REGISTRY.stop()
+        mongo.close()
+
+def create_app(database=None) -> FastAPI:
+    """Build the ASGI app. Each worker process calls this (via `server:app`)
+    and connects to Mongo only once its lifespan starts; `database` swaps
+    the Mongo client for a stand-in, as the benchmarks do."""
+    if database is not None:
+        mongo.db = database
+    app = FastAPI(
+        title="MindMeter IQ API", version="1.0.0", description="Intelligence Testing Platform API",
+        lifespan=lifespan
+    )
+    if ADMISSION_ENABLED:
+        # Added first so it runs inside CORS: rejections carry CORS headers
+        # and preflight requests are answered before reaching it
+        app.add_middleware(AdmissionMiddleware, controller=admission)
+    # CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["Retry-After"],
+    )
+    app.include_router(api_router)
+    if METRICS_ENABLED:
+        # Outermost, so the time CORS handling takes is included
+        app.add_middleware(metrics.MetricsMiddleware, slow_request_ms=SLOW_REQUEST_MS)
+        app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+    return app
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    logger.info("MindMeter IQ API shutting down...")
-    client.close()
+app = create_app()
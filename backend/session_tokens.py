@@ -0,0 +1,108 @@
+import base64
+import hashlib
+import hmac
+import os
+import struct
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+# v1 payload: 6-byte bank version, uint32 issue time, 4-byte nonce,
+# difficulty and duration codes, then the selected bank indices as uint32s
+TOKEN_PREFIX = "v1."
+_HEADER = struct.Struct(">6sI4sBB")
+_SIGNATURE_BYTES = 16
+
+DIFFICULTIES = ("easy", "medium", "hard")
+DURATIONS = ("short", "medium", "long")
+_UNKNOWN = 0xFF
+
+
+def _encode_choice(value: Optional[str], choices: Sequence[str]) -> int:
+    return choices.index(value) if value in choices else _UNKNOWN
+
+
+def _decode_choice(code: int, choices: Sequence[str]) -> Optional[str]:
+    return choices[code] if code < len(choices) else None
+
+
+class InvalidSessionToken(Exception):
+    pass
+
+
+class ExpiredSessionToken(InvalidSessionToken):
+    pass
+
+
+@dataclass(frozen=True)
+class SessionToken:
+    bank_version: str
+    issued_at: int
+    indices: List[int]
+    difficulty: Optional[str] = None
+    duration: Optional[str] = None
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def is_session_token(test_id: str) -> bool:
+    return test_id.startswith(TOKEN_PREFIX)
+
+
+class SessionTokenSigner:
+    """Issues and verifies self-contained, HMAC-signed test ids.
+
+    A token carries everything `submit_test` needs to grade a test (bank
+    version and question indices), so no session document is stored.
+    """
+
+    def __init__(self, secret: str, ttl_seconds: int):
+        self._key = secret.encode()
+        self.ttl_seconds = ttl_seconds
+
+    def _sign(self, payload: bytes) -> bytes:
+        return hmac.new(self._key, payload, hashlib.sha256).digest()[:_SIGNATURE_BYTES]
+
+    def issue(self, bank_version: str, indices: Sequence[int], difficulty: Optional[str] = None,
+              duration: Optional[str] = None, issued_at: Optional[int] = None) -> str:
+        issued_at = int(time.time()) if issued_at is None else issued_at
+        payload = _HEADER.pack(
+            bytes.fromhex(bank_version), issued_at, os.urandom(4),
+            _encode_choice(difficulty, DIFFICULTIES), _encode_choice(duration, DURATIONS)
+        )
+        payload += struct.pack(f">{len(indices)}I", *indices)
+        return f"{TOKEN_PREFIX}{_b64encode(payload)}.{_b64encode(self._sign(payload))}"
+
+    def verify(self, token: str, now: Optional[int] = None) -> SessionToken:
+        try:
+            body, encoded_signature = token[len(TOKEN_PREFIX):].split(".")
+            payload, signature = _b64decode(body), _b64decode(encoded_signature)
+        except ValueError:
+            raise InvalidSessionToken("Malformed test token")
+        # Base64 decoding tolerates extra padding and stray characters, so
+        # several spellings would verify as one test; results are keyed by
+        # the test id string, so only the exact spelling issued is accepted
+        if _b64encode(payload) != body or _b64encode(signature) != encoded_signature:
+            raise InvalidSessionToken("Malformed test token")
+        if not is_session_token(token) or not hmac.compare_digest(signature, self._sign(payload)):
+            raise InvalidSessionToken("Test token signature mismatch")
+
+        if len(payload) < _HEADER.size or (len(payload) - _HEADER.size) % 4:
+            raise InvalidSessionToken("Malformed test token")
+        version, issued_at, _, difficulty, duration = _HEADER.unpack_from(payload)
+        count = (len(payload) - _HEADER.size) // 4
+        indices = list(struct.unpack_from(f">{count}I", payload, _HEADER.size))
+
+        now = int(time.time()) if now is None else now
+        if now - issued_at > self.ttl_seconds:
+            raise ExpiredSessionToken("Test token expired")
+        return SessionToken(
+            version.hex(), issued_at, indices,
+            _decode_choice(difficulty, DIFFICULTIES), _decode_choice(duration, DURATIONS)
+        )
@@ -0,0 +1,132 @@
+import builtins
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def process_age() -> Optional[float]:
+    """Seconds since this process was started, from /proc (10 ms resolution),
+    or None where that is unavailable. Covers the interpreter's own startup
+    and whatever ran before this module was imported (uvicorn, say)."""
+    try:
+        with open("/proc/self/stat") as f:
+            # The command name may contain spaces; fields resume after its ")"
+            started = int(f.read().rpartition(")")[2].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - started / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class ImportTimer:
+    """Time spent importing each top-level package while installed.
+
+    Wraps `builtins.__import__`, so it sees every `import` statement run in
+    the meantime. A package's time is its own only: packages it imports on
+    its way in (fastapi importing pydantic and starlette, say) are counted
+    under their own names, so the times add up to the total.
+    """
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        # Time spent in nested first imports, one entry per import in progress
+        self._nested: List[float] = []
+        self._original = None
+
+    def install(self):
+        self._original = builtins.__import__
+        builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self._original(name, globals, locals, fromlist, level)
+        self._nested.append(0.0)
+        started = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            top = name.partition(".")[0]
+            self.seconds[top] = self.seconds.get(top, 0.0) + elapsed - self._nested.pop()
+            if self._nested:
+                self._nested[-1] += elapsed
+
+    def slowest(self, count: int) -> List[Tuple[str, float]]:
+        return sorted(self.seconds.items(), key=lambda item: -item[1])[:count]
+
+
+class StartupTimer:
+    """Where a worker's time went between process start and serving traffic.
+
+    Created first thing in `server`, it times the module's imports per
+    package, then each `phase` of the lifespan's startup, and `ready()`
+    logs the breakdown once the app is about to accept requests.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        # Interpreter startup and anything imported before us
+        self.before = process_age()
+        self.imports = ImportTimer()
+        self.imported_in: Optional[float] = None
+        self.phases: List[Tuple[str, float]] = []
+        self._began = self.started
+        self.ready_after: Optional[float] = None
+        self.imports.install()
+
+    def imports_done(self):
+        self.imports.uninstall()
+        self.imported_in = time.perf_counter() - self.started
+
+    def begin(self):
+        """Mark the start of the app's startup; `phase`s are counted from here."""
+        self.phases = []
+        self._began = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def ready(self, budget_ms: float = 0) -> float:
+        """Log the breakdown; returns seconds from process start to now."""
+        phases = ", ".join(f"{name} {seconds * 1000:.0f}" for name, seconds in self.phases)
+        if self.ready_after is not None:
+            # Another app started in this process (benchmarks do that):
+            # only its own startup is news
+            logger.info(f"Ready again after {(time.perf_counter() - self._began) * 1000:.0f} ms ({phases})")
+            return self.ready_after
+        self.ready_after = (self.before or 0.0) + time.perf_counter() - self.started
+        modules = ", ".join(f"{name} {seconds * 1000:.0f}" for name, seconds in self.imports.slowest(8))
+        before = f"before server import {self.before * 1000:.0f} ms, " if self.before is not None else ""
+        logger.info(
+            f"Ready {self.ready_after * 1000:.0f} ms after process start: {before}"
+            f"imports {(self.imported_in or 0) * 1000:.0f} ms ({modules}), "
+            f"startup {(time.perf_counter() - self._began) * 1000:.0f} ms ({phases})"
+        )
+        if budget_ms and self.ready_after * 1000 > budget_ms:
+            logger.warning(f"Startup took {self.ready_after * 1000:.0f} ms, over its {budget_ms:.0f} ms budget")
+        return self.ready_after
+
+    def report(self) -> dict:
+        return {
+            "ready_ms": round(self.ready_after * 1000, 1) if self.ready_after is not None else None,
+            "before_import_ms": round(self.before * 1000, 1) if self.before is not None else None,
+            "imports_ms": round((self.imported_in or 0) * 1000, 1),
+            "modules_ms": {name: round(s * 1000, 1) for name, s in self.imports.slowest(len(self.imports.seconds))},
+            "phases_ms": {name: round(s * 1000, 1) for name, s in self.phases},
+        }
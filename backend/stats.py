@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import List, Optional
+
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+STATS_DOC_ID = "test_results"
+BREAKDOWNS = ("by_difficulty", "by_duration", "by_day")
+
+
+def _counter_key(value) -> str:
+    # Counter names become field paths, so keep them free of '.' and '$'
+    return str(value or "unknown").replace(".", "_").replace("$", "_")
+
+
+class StatsCounters:
+    """Materialized counters for `/api/stats`.
+
+    Each stored result bumps a single stats document with `$inc`, so reading
+    the totals never scans `test_results`. Reads go through a per-process
+    TTL cache; concurrent misses share one fetch.
+    """
+
+    def __init__(self, ttl: float = 10.0):
+        self.ttl = ttl
+        self._collection = None
+        self._cached: Optional[dict] = None
+        self._cached_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def start(self, collection):
+        self._collection = collection
+
+    async def ensure_initialized(self, results_collection):
+        """Build the counters from `test_results` the first time the app runs."""
+        if await self._collection.find_one({"_id": STATS_DOC_ID}, {"_id": 1}) is None:
+            await self.rebuild(results_collection)
+
+    async def record(self, result_doc: dict):
+        await self.record_many([result_doc])
+
+    async def record_many(self, result_docs: List[dict]):
+        """Count a batch of stored results with one `$inc`."""
+        if not result_docs:
+            return
+        inc = Counter()
+        for doc in result_docs:
+            inc["total_tests"] += 1
+            inc[f"by_difficulty.{_counter_key(doc.get('difficulty'))}"] += 1
+            inc[f"by_duration.{_counter_key(doc.get('duration'))}"] += 1
+            inc[f"by_day.{doc['timestamp'][:10]}"] += 1
+        try:
+            await self._collection.update_one({"_id": STATS_DOC_ID}, {"$inc": dict(inc)}, upsert=True)
+        except PyMongoError as e:
+            # The result itself is stored; a missed increment is repaired by a rebuild
+            logger.warning(f"Stats increment failed: {e}")
+
+    async def get(self) -> dict:
+        if self._cached is not None and time.monotonic() - self._cached_at < self.ttl:
+            return self._cached
+        async with self._lock:
+            if self._cached is None or time.monotonic() - self._cached_at >= self.ttl:
+                doc = await self._collection.find_one({"_id": STATS_DOC_ID}, {"_id": 0}) or {}
+                self._cached = {
+                    "total_tests": doc.get("total_tests", 0),
+                    **{name: doc.get(name, {}) for name in BREAKDOWNS},
+                }
+                self._cached_at = time.monotonic()
+        return self._cached
+
+    async def rebuild(self, results_collection):
+        """Recompute every counter from `test_results` with a single aggregation."""
+        def group_by(expr):
+            return [{"$group": {"_id": expr, "n": {"$sum": 1}}}]
+
+        pipeline = [{"$facet": {
+            "total_tests": [{"$count": "n"}],
+            "by_difficulty": group_by("$difficulty"),
+            "by_duration": group_by("$duration"),
+            "by_day": group_by({"$substrBytes": ["$timestamp", 0, 10]}),
+        }}]
+        facets = (await results_collection.aggregate(pipeline).to_list(length=1))[0]
+        doc = {
+            "total_tests": facets["total_tests"][0]["n"] if facets["total_tests"] else 0,
+            **{
+                name: {_counter_key(row["_id"]): row["n"] for row in facets[name]}
+                for name in BREAKDOWNS
+            },
+        }
+        await self._collection.replace_one({"_id": STATS_DOC_ID}, doc, upsert=True)
+        self._cached = None
+        logger.info(f"Rebuilt stats counters ({doc['total_tests']} results)")
+        return doc
+
+
+if __name__ == "__main__":
+    # Rebuild the counters from scratch: python stats.py
+    import os
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO)
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        db = client[os.environ.get('DB_NAME', 'mindmeter_db')]
+        counters = StatsCounters()
+        counters.start(db.stats)
+        await counters.rebuild(db.test_results)
+        client.close()
+
+    asyncio.run(main())
@@ -0,0 +1,11 @@
+import os
+import sys
+from pathlib import Path
+
+# The backend modules are imported top-level, as server.py imports them
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Tests that drive the app render certificates in-process and are not
+# subject to admission control, as the benchmarks are
+os.environ.setdefault("CERTIFICATE_WORKERS", "0")
+os.environ.setdefault("ADMISSION_ENABLED", "false")
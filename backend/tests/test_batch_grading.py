@@ -0,0 +1,78 @@
+import asyncio
+
+import server
+from benchmarks.asgi_client import lifespan, request
+from benchmarks.fake_mongo import FakeDatabase
+from grading import grade_batch, iq_score, get_performance_level, score_rows
+
+TEST_CONFIG = {"duration": "short", "question_types": ["all"], "difficulty": "medium"}
+COMPARED = ("correct_answers", "total_questions", "iq_score", "accuracy_percentage", "performance_level", "percentile")
+
+
+def sheets(key):
+    """Answer sheets covering every way an answer can be right or wrong."""
+    wrong = [(answer + 1) % 4 for answer in key]
+    return [
+        list(key),
+        wrong,
+        key[:2] + wrong[2:],
+        [-1] * len(key),                     # left blank, as the client sends it
+        key[:3],                             # stopped early
+        key + [0, 1, 2],                     # answers past the end
+        [99, -5, 2 ** 70] + key[3:],         # out of range, one beyond int64
+        [],
+    ]
+
+
+def test_batch_grades_exactly_as_single_submits(monkeypatch):
+    # Rank every result, so percentiles are compared too
+    monkeypatch.setattr(server.norms, "min_samples", 1)
+    database = FakeDatabase()
+
+    async def main():
+        async with lifespan(server.create_app(database=database)) as app:
+            start = await request(app, "POST", "/api/test/start", json=TEST_CONFIG)
+            session = await database.test_sessions.find_one({"test_id": start.json()["test_id"]})
+            key = [q["correct_answer"] for q in await server.session_questions(session)]
+
+            # Each sheet answers two copies of the same test: one submitted
+            # on its own, the other in one batch with the rest
+            single, batched = [], []
+            for n, answers in enumerate(sheets(key)):
+                for copies, name in ((single, f"single-{n}"), (batched, f"batch-{n}")):
+                    await database.test_sessions.insert_one({**session, "_id": name, "test_id": name})
+                    copies.append((name, answers))
+            for test_id, answers in single:
+                response = await request(app, "POST", "/api/test/submit", json={"test_id": test_id, "answers": answers})
+                assert response.status_code == 200
+            response = await request(app, "POST", "/api/test/submit/batch", json={
+                "submissions": [{"test_id": test_id, "answers": answers} for test_id, answers in batched]
+            })
+            assert response.json()["graded"] == len(batched)
+            await server.norms.flush()
+            await server.norms.refresh()
+
+            results = {}
+            for test_id, _ in single + batched:
+                response = await request(app, "GET", f"/api/test/result/{test_id}")
+                results[test_id] = {field: response.json()[field] for field in COMPARED}
+            return single, batched, results
+
+    single, batched, results = asyncio.run(main())
+    for (single_id, answers), (batch_id, _) in zip(single, batched):
+        assert results[single_id]["percentile"] is not None
+        assert results[batch_id] == results[single_id], answers
+
+
+def test_score_rows_match_the_scalar_mapping():
+    keys = [[0, 1, 2, 3]] * 5 + [[0, 1, 2]] * 3 + [[]]
+    responses = [[0, 1, 2, 3], [0, 1, 2, 0], [0, 1], [3, 3, 3, 3], [-1] * 4, [0, 1, 2], [0, 0], [9, 1, 2, 7], [1]]
+    for key, answers, (correct, total, accuracy, iq, level) in zip(
+        keys, responses, score_rows(grade_batch(keys, responses))
+    ):
+        expected = sum(1 for k, a in zip(key, answers) if k == a)
+        expected_accuracy = expected / len(key) * 100 if key else 0
+        assert (correct, total) == (expected, len(key))
+        assert accuracy == expected_accuracy
+        assert iq == iq_score(expected_accuracy)
+        assert level == get_performance_level(expected_accuracy)
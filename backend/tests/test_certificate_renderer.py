@@ -0,0 +1,29 @@
+import asyncio
+import logging
+
+from certificates import CertificateRenderer
+
+
+def test_close_joins_the_workers_without_blocking_the_loop(caplog):
+    async def main():
+        renderer = CertificateRenderer(workers=1)
+        renderer.start()
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.001)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        await asyncio.sleep(0)
+        await renderer.close()
+        ticker.cancel()
+        return ticks
+
+    with caplog.at_level(logging.ERROR, logger="certificates"):
+        # Worker processes take a while to exit; the loop serves meanwhile
+        assert asyncio.run(main()) > 0
+    # Closing before the warm-up finished is not a failure
+    assert not caplog.records
@@ -0,0 +1,45 @@
+from item_stats import INVALID, SKIPPED, ItemStats
+from progress import UNANSWERED, saved_answers
+
+
+def question(question_id=None, correct=1):
+    doc = {"question_text": "?", "options": ["a", "b", "c"], "correct_answer": correct}
+    if question_id is not None:
+        doc["id"] = question_id
+    return doc
+
+
+def test_record_tallies_attempts_choices_and_scores():
+    stats = ItemStats()
+    stats.record([question("q1"), question("q2"), question("q3")], [1, 7], 50.0)
+    stats.record([question("q1")], [0], 100.0)
+    q1, q2, q3 = (stats._pending[q] for q in ("q1", "q2", "q3"))
+    assert (q1["attempts"], q1["correct"]) == (2, 1)
+    assert (q1["choices.1"], q1["choices.0"]) == (1, 1)
+    assert (q1["score_sum.1"], q1["score_sum.0"]) == (50.0, 100.0)
+    assert (q2["correct"], q2[f"choices.{INVALID}"]) == (0, 1)
+    assert q3[f"choices.{SKIPPED}"] == 1
+
+
+def test_record_skips_questions_without_an_id():
+    # Sessions written before the bank moved to Mongo hold the raw seed questions
+    stats = ItemStats()
+    stats.record([question(), question("q2"), question()], [1, 1, 1], 100.0)
+    assert list(stats._pending) == ["q2"]
+
+
+def test_unanswered_counts_as_skipped():
+    # The client sends -1 for a question left blank, and answers completed
+    # from autosaved progress fill the gaps with the same
+    stats = ItemStats()
+    stats.record([question("q1"), question("q2")], [UNANSWERED] + saved_answers({}, 1), 50.0)
+    for counts in stats._pending.values():
+        assert counts[f"choices.{SKIPPED}"] == 1
+        assert counts[f"choices.{INVALID}"] == 0
+        assert counts["correct"] == 0
+
+
+def test_other_out_of_range_answers_count_as_invalid():
+    stats = ItemStats()
+    stats.record([question("q1"), question("q2")], [-2, 3], 50.0)
+    assert all(counts[f"choices.{INVALID}"] == 1 for counts in stats._pending.values())
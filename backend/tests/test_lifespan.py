@@ -0,0 +1,34 @@
+import asyncio
+import logging
+
+import server
+from benchmarks.asgi_client import lifespan
+from benchmarks.fake_mongo import FakeDatabase
+
+
+def run_app():
+    async def main():
+        async with lifespan(server.create_app(database=FakeDatabase())) as app:
+            await asyncio.sleep(0.01)
+            build = app.state.index_build
+        # Settled by the shutdown itself, not by asyncio.run's cleanup after it
+        assert build.done()
+        return build
+    return asyncio.run(main())
+
+
+def test_shutdown_cancels_an_index_build_still_running(monkeypatch):
+    async def slow_build(db, specs):
+        await asyncio.sleep(3600)
+    monkeypatch.setattr(server, "ensure_indexes", slow_build)
+    assert run_app().cancelled()
+
+
+def test_shutdown_logs_a_failed_index_build(monkeypatch, caplog):
+    async def failing_build(db, specs):
+        raise RuntimeError("index build exploded")
+    monkeypatch.setattr(server, "ensure_indexes", failing_build)
+    with caplog.at_level(logging.ERROR, logger="server"):
+        build = run_app()
+    assert build.done() and not build.cancelled()
+    assert any("Index build failed" in r.message and r.exc_info for r in caplog.records)
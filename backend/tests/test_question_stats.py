@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+import server
+from benchmarks.asgi_client import lifespan, request
+from benchmarks.fake_mongo import FakeDatabase
+
+TOKEN = "stats-secret"
+TEST_CONFIG = {"duration": "short", "question_types": ["all"], "difficulty": "medium"}
+
+
+@pytest.fixture
+def stats_token(monkeypatch):
+    monkeypatch.setattr(server, "ITEM_STATS_TOKEN", TOKEN)
+
+
+def fetch(path, headers=None):
+    async def scenario():
+        async with lifespan(server.create_app(database=FakeDatabase())) as app:
+            start = await request(app, "POST", "/api/test/start", json=TEST_CONFIG)
+            await request(app, "POST", "/api/test/submit",
+                          json={"test_id": start.json()["test_id"], "answers": [0] * 5})
+            await server.item_stats.flush()
+            return await request(app, "GET", path, headers=headers)
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("path", ["/api/questions/stats", "/api/questions/0/stats"])
+@pytest.mark.parametrize("headers", [None, {"Authorization": "Bearer wrong"}, {"Authorization": TOKEN}])
+def test_stats_need_the_token(stats_token, path, headers):
+    assert fetch(path, headers).status_code == 403
+
+
+def test_stats_are_disabled_without_a_configured_token(monkeypatch):
+    monkeypatch.setattr(server, "ITEM_STATS_TOKEN", None)
+    assert fetch("/api/questions/stats", {"Authorization": "Bearer "}).status_code == 403
+
+
+def test_stats_do_not_reveal_the_key(stats_token):
+    response = fetch("/api/questions/stats", {"Authorization": f"Bearer {TOKEN}"})
+    assert response.status_code == 200
+    questions = response.json()["questions"]
+    assert sum(q["attempts"] for q in questions) == 5
+    for question in questions:
+        for option in question["options"]:
+            assert set(option) == {"option", "count", "share", "mean_score"}
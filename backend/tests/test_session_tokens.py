@@ -0,0 +1,130 @@
+import pytest
+
+from session_tokens import (
+    TOKEN_PREFIX, ExpiredSessionToken, InvalidSessionToken, SessionTokenSigner,
+    _b64decode, _b64encode, is_session_token,
+)
+
+VERSION = "0123456789ab"
+ISSUED_AT = 1_700_000_000
+TTL = 3600
+
+
+@pytest.fixture
+def signer():
+    return SessionTokenSigner("test-secret", TTL)
+
+
+@pytest.fixture
+def token(signer):
+    return signer.issue(VERSION, [3, 1, 4, 1, 5], "hard", "short", issued_at=ISSUED_AT)
+
+
+def parts(token):
+    body, signature = token[len(TOKEN_PREFIX):].split(".")
+    return body, signature
+
+
+def signed(signer, payload):
+    """A correctly signed token around an arbitrary payload."""
+    return f"{TOKEN_PREFIX}{_b64encode(payload)}.{_b64encode(signer._sign(payload))}"
+
+
+def test_round_trip(signer, token):
+    session = signer.verify(token, now=ISSUED_AT + 10)
+    assert is_session_token(token)
+    assert session.bank_version == VERSION
+    assert session.issued_at == ISSUED_AT
+    assert session.indices == [3, 1, 4, 1, 5]
+    assert (session.difficulty, session.duration) == ("hard", "short")
+
+
+def test_unknown_choices_round_trip_as_none(signer):
+    token = signer.issue(VERSION, [0], "impossible", None, issued_at=ISSUED_AT)
+    session = signer.verify(token, now=ISSUED_AT)
+    assert (session.difficulty, session.duration) == (None, None)
+
+
+def test_tokens_are_unique_per_issue(signer):
+    assert signer.issue(VERSION, [1, 2]) != signer.issue(VERSION, [1, 2])
+
+
+@pytest.mark.parametrize("malformed", [
+    "",
+    TOKEN_PREFIX,
+    f"{TOKEN_PREFIX}abc",
+    f"{TOKEN_PREFIX}abc.def.ghi",
+    f"{TOKEN_PREFIX}a.b",
+    f"{TOKEN_PREFIX}é.é",
+    "not-a-token",
+])
+def test_malformed_tokens_are_rejected(signer, malformed):
+    with pytest.raises(InvalidSessionToken):
+        signer.verify(malformed, now=ISSUED_AT)
+
+
+def test_missing_prefix_is_rejected(signer, token):
+    with pytest.raises(InvalidSessionToken):
+        signer.verify("v2." + token[len(TOKEN_PREFIX):], now=ISSUED_AT)
+
+
+@pytest.mark.parametrize("payload", [b"", b"short", b"\x00" * 17])
+def test_signed_payloads_of_the_wrong_size_are_rejected(signer, payload):
+    with pytest.raises(InvalidSessionToken, match="Malformed"):
+        signer.verify(signed(signer, payload), now=ISSUED_AT)
+
+
+def test_signed_payload_with_a_partial_index_is_rejected(signer, token):
+    payload = _b64decode(parts(token)[0]) + b"\x00\x01"
+    with pytest.raises(InvalidSessionToken, match="Malformed"):
+        signer.verify(signed(signer, payload), now=ISSUED_AT)
+
+
+def test_tampered_payload_is_rejected(signer, token):
+    body, signature = parts(token)
+    payload = bytearray(_b64decode(body))
+    payload[-1] ^= 0x01  # a different last question index
+    with pytest.raises(InvalidSessionToken, match="signature"):
+        signer.verify(f"{TOKEN_PREFIX}{_b64encode(bytes(payload))}.{signature}", now=ISSUED_AT)
+
+
+def test_tampered_signature_is_rejected(signer, token):
+    body, signature = parts(token)
+    forged = bytearray(_b64decode(signature))
+    forged[0] ^= 0x80
+    with pytest.raises(InvalidSessionToken, match="signature"):
+        signer.verify(f"{TOKEN_PREFIX}{body}.{_b64encode(bytes(forged))}", now=ISSUED_AT)
+
+
+def test_token_of_another_secret_is_rejected(token):
+    with pytest.raises(InvalidSessionToken, match="signature"):
+        SessionTokenSigner("other-secret", TTL).verify(token, now=ISSUED_AT)
+
+
+def test_expiry(signer, token):
+    assert signer.verify(token, now=ISSUED_AT + TTL).indices == [3, 1, 4, 1, 5]
+    with pytest.raises(ExpiredSessionToken):
+        signer.verify(token, now=ISSUED_AT + TTL + 1)
+
+
+def test_expired_token_is_still_an_invalid_one(signer, token):
+    with pytest.raises(InvalidSessionToken):
+        signer.verify(token, now=ISSUED_AT + TTL + 1)
+
+
+@pytest.mark.parametrize("respell", [
+    lambda body, signature: (body, signature + "="),
+    lambda body, signature: (body, signature + "=="),
+    lambda body, signature: (body + "=", signature),
+    lambda body, signature: (body + "==", signature),
+    lambda body, signature: (body[:4] + "!" + body[4:], signature),
+    lambda body, signature: (body, signature[:2] + "\n" + signature[2:]),
+])
+def test_non_canonical_spellings_are_rejected(signer, token, respell):
+    # Each decodes to the same signed bytes, but would be stored as a
+    # different test id
+    body, signature = respell(*parts(token))
+    respelled = f"{TOKEN_PREFIX}{body}.{signature}"
+    assert respelled != token
+    with pytest.raises(InvalidSessionToken, match="Malformed"):
+        signer.verify(respelled, now=ISSUED_AT)
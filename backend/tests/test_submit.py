@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+import server
+from benchmarks.asgi_client import lifespan, request
+from benchmarks.fake_mongo import FakeDatabase
+from session_tokens import SessionTokenSigner
+from stats import STATS_DOC_ID
+
+TEST_CONFIG = {"duration": "short", "question_types": ["all"], "difficulty": "medium"}
+
+
+@pytest.fixture
+def database():
+    # A little latency, so concurrent submits interleave at every database call
+    return FakeDatabase(latency=0.001)
+
+
+@pytest.fixture(params=["stateful", "stateless"])
+def session_mode(request, monkeypatch):
+    monkeypatch.setattr(server, "TEST_SESSION_MODE", request.param)
+    monkeypatch.setattr(server, "session_signer", SessionTokenSigner("test-secret", 3600))
+    return request.param
+
+
+@pytest.fixture
+def stateless(monkeypatch):
+    monkeypatch.setattr(server, "TEST_SESSION_MODE", "stateless")
+    monkeypatch.setattr(server, "session_signer", SessionTokenSigner("test-secret", 3600))
+
+
+def run(database, scenario):
+    async def main():
+        async with lifespan(server.create_app(database=database)) as app:
+            # The unique index on test_results.test_id is what settles races between workers
+            await app.state.index_build
+            return await scenario(app)
+    return asyncio.run(main())
+
+
+async def start(app):
+    return (await request(app, "POST", "/api/test/start", json=TEST_CONFIG)).json()["test_id"]
+
+
+def submit(app, test_id, answers=(1, 0, 2, 1, 3)):
+    return request(app, "POST", "/api/test/submit", json={"test_id": test_id, "answers": list(answers)})
+
+
+async def total_tests(database):
+    return ((await database.stats.find_one({"_id": STATS_DOC_ID})) or {}).get("total_tests", 0)
+
+
+def test_parallel_duplicate_submits_store_and_count_one_result(database, session_mode):
+    async def scenario(app):
+        test_id = await start(app)
+        counted = await total_tests(database)
+        responses = await asyncio.gather(*(submit(app, test_id) for _ in range(8)))
+        # As if a retry reached a worker that never saw the first submit
+        server.result_cache._entries.pop(test_id, None)
+        responses.append(await submit(app, test_id))
+        stored = await database.test_results.count_documents({"test_id": test_id})
+        return responses, stored, await total_tests(database) - counted
+
+    responses, stored, counted = run(database, scenario)
+    assert [r.status_code for r in responses] == [200] * 9
+    assert len({r.json()["id"] for r in responses}) == 1
+    assert sum(r.headers.get("idempotent-replayed") != "true" for r in responses) == 1
+    assert stored == 1
+    assert counted == 1
+
+
+def test_first_stateless_submit_reads_no_result(database, stateless):
+    async def scenario(app):
+        test_id = await start(app)
+        reads = database.ops[("test_results", "find")]
+        response = await submit(app, test_id)
+        return response, database.ops[("test_results", "find")] - reads
+
+    response, reads = run(database, scenario)
+    assert response.status_code == 200
+    assert reads == 0
+
+
+def test_repeat_after_the_session_is_gone_gets_the_stored_result(database):
+    async def scenario(app):
+        test_id = await start(app)
+        first = await submit(app, test_id)
+        await database.test_sessions.delete_one({"test_id": test_id})
+        server.result_cache._entries.pop(test_id, None)
+        return first, await submit(app, test_id, answers=[0] * 5)
+
+    first, repeat = run(database, scenario)
+    assert repeat.status_code == 200
+    assert repeat.headers.get("idempotent-replayed") == "true"
+    assert repeat.json() == first.json()
+
+
+def test_submit_of_an_unknown_test_is_not_found(database):
+    async def scenario(app):
+        return await submit(app, "no-such-test")
+
+    assert run(database, scenario).status_code == 404
@@ -0,0 +1,165 @@
+import asyncio
+
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+import server
+from benchmarks.asgi_client import lifespan, request
+from benchmarks.fake_mongo import FakeDatabase
+from stats import STATS_DOC_ID
+from write_behind import DUPLICATE_KEY, WriteBehindQueue
+
+
+class Collection:
+    """Stores what `insert_many` is given, after raising each of `failures` once."""
+
+    def __init__(self, failures=(), taken=()):
+        self.docs = []
+        self.calls = 0
+        self.failures = list(failures)
+        # Keys another writer already stored: inserted as duplicates
+        self.taken = set(taken)
+
+    async def insert_many(self, docs, ordered=True):
+        self.calls += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        duplicates = [{"index": i, "code": DUPLICATE_KEY, "errmsg": "duplicate key"}
+                      for i, doc in enumerate(docs) if doc["test_id"] in self.taken]
+        self.docs.extend(doc for doc in docs if doc["test_id"] not in self.taken)
+        if duplicates:
+            raise BulkWriteError({"writeErrors": duplicates})
+
+
+def run(collection, scenario, **options):
+    async def main():
+        written = []
+
+        async def on_written(pairs):
+            written.extend(pairs)
+
+        queue = WriteBehindQueue("test_id", **{"flush_interval": 0.01, "retry_delay": 0.01, **options})
+        queue.start(collection, on_written=on_written)
+        try:
+            await scenario(queue)
+        finally:
+            await queue.close()
+        return written
+    return asyncio.run(main())
+
+
+def test_buffered_documents_are_readable_until_written():
+    collection = Collection()
+
+    async def scenario(queue):
+        await queue.put({"test_id": "a", "iq_score": 100}, "context")
+        assert queue.get("a") == {"test_id": "a", "iq_score": 100}
+        assert collection.docs == []
+        await asyncio.sleep(0.1)
+        assert queue.get("a") is None
+
+    written = run(collection, scenario)
+    assert collection.docs == [{"test_id": "a", "iq_score": 100}]
+    assert written == [({"test_id": "a", "iq_score": 100}, "context")]
+
+
+def test_close_writes_out_everything_buffered():
+    collection = Collection()
+
+    async def scenario(queue):
+        for n in range(25):
+            await queue.put({"test_id": str(n)})
+
+    written = run(collection, scenario, flush_interval=60, batch_size=10)
+    assert sorted(doc["test_id"] for doc in collection.docs) == sorted(map(str, range(25)))
+    assert len(written) == 25
+
+
+def test_failed_inserts_are_retried_and_recorded_once():
+    collection = Collection(failures=[AutoReconnect("primary stepped down")] * 2)
+
+    async def scenario(queue):
+        await queue.put({"test_id": "a"})
+        await asyncio.sleep(0.2)
+
+    written = run(collection, scenario)
+    assert collection.calls == 3
+    assert [doc["test_id"] for doc in collection.docs] == ["a"]
+    assert [doc["test_id"] for doc, _ in written] == ["a"]
+
+
+def test_documents_that_cannot_be_written_are_dropped_and_not_recorded():
+    collection = Collection(failures=[TypeError("cannot encode object")])
+
+    async def scenario(queue):
+        await queue.put({"test_id": "a"})
+        await asyncio.sleep(0.1)
+        # The flush loop survived the failure
+        await queue.put({"test_id": "b"})
+
+    written = run(collection, scenario)
+    assert [doc["test_id"] for doc in collection.docs] == ["b"]
+    assert [doc["test_id"] for doc, _ in written] == ["b"]
+
+
+def test_duplicates_are_not_recorded():
+    collection = Collection(taken={"a"})
+
+    async def scenario(queue):
+        await queue.put({"test_id": "a"})
+        await queue.put({"test_id": "b"})
+
+    written = run(collection, scenario)
+    assert [doc["test_id"] for doc, _ in written] == ["b"]
+
+
+def test_writes_failing_at_shutdown_are_lost_and_not_recorded():
+    collection = Collection(failures=[AutoReconnect("no primary")])
+
+    async def scenario(queue):
+        await queue.put({"test_id": "a"})
+
+    written = run(collection, scenario, flush_interval=60)
+    assert collection.docs == []
+    assert written == []
+
+
+def test_put_after_close_is_refused():
+    async def main():
+        queue = WriteBehindQueue("test_id")
+        queue.start(Collection())
+        await queue.close()
+        with pytest.raises(RuntimeError):
+            await queue.put({"test_id": "a"})
+    asyncio.run(main())
+
+
+@pytest.fixture
+def write_behind(monkeypatch):
+    monkeypatch.setattr(server, "result_writer", WriteBehindQueue("test_id", flush_interval=0.05))
+
+
+def test_submits_are_counted_once_written(write_behind):
+    database = FakeDatabase()
+
+    async def total_tests():
+        return ((await database.stats.find_one({"_id": STATS_DOC_ID})) or {}).get("total_tests", 0)
+
+    async def main():
+        async with lifespan(server.create_app(database=database)) as app:
+            start = await request(app, "POST", "/api/test/start",
+                                  json={"duration": "short", "question_types": ["all"], "difficulty": "medium"})
+            test_id = start.json()["test_id"]
+            counted = await total_tests()
+            submit = await request(app, "POST", "/api/test/submit", json={"test_id": test_id, "answers": [0] * 5})
+            buffered = (await total_tests() - counted,
+                        (await request(app, "GET", f"/api/test/result/{test_id}")).status_code)
+            await asyncio.sleep(0.2)
+            stored = await database.test_results.count_documents({"test_id": test_id})
+            return submit.status_code, buffered, stored, await total_tests() - counted
+
+    status, buffered, stored, counted = asyncio.run(main())
+    assert status == 200
+    # Readable, but not counted, while buffered
+    assert buffered == (0, 200)
+    assert (stored, counted) == (1, 1)
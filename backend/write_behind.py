@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class WriteBehindQueue:
+    """Coalesces single-document inserts into `insert_many` batches.
+
+    Documents are buffered in memory and flushed once `batch_size` of them
+    are waiting or `flush_interval` seconds after the first one arrived,
+    whichever comes first. At most `max_pending` documents are buffered;
+    further `put` calls wait for a flush to make room. Buffered documents
+    stay readable by key until they are written.
+
+    Whatever depends on a document being stored (counters, say) belongs in
+    `on_written`: it is called after each flush with the (document,
+    context) pairs that flush stored, the `context` given to `put`. The
+    documents of a failed write, or one another writer beat to the key,
+    are left out.
+    """
+
+    def __init__(self, key: str, batch_size: int = 500, flush_interval: float = 0.05,
+                 max_pending: int = 10000, retry_delay: float = 1.0):
+        self.key = key
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.retry_delay = retry_delay
+        # key -> (document, context)
+        self._pending: "OrderedDict[str, Tuple[dict, Any]]" = OrderedDict()
+        self._on_written: Optional[Callable[[List[Tuple[dict, Any]]], Awaitable[None]]] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._collection = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def start(self, collection, on_written: Optional[Callable[[List[Tuple[dict, Any]]], Awaitable[None]]] = None):
+        self._collection = collection
+        self._on_written = on_written
+        # Bound to the loop they are first used on, so made afresh per
+        # start, as is the open state a previous close() left behind
+        self._slots = asyncio.Semaphore(max(0, self.max_pending - len(self._pending)))
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._pending.get(key)
+        return dict(entry[0]) if entry is not None else None
+
+    async def put(self, doc: dict, context: Any = None):
+        if self._closing or self._task is None:
+            raise RuntimeError("Write-behind queue is not running")
+        key = doc[self.key]
+        if key not in self._pending:
+            await self._slots.acquire()
+            if key in self._pending:
+                self._slots.release()
+        self._pending[key] = (doc, context)
+        if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def close(self):
+        """Stop accepting documents and write out everything still buffered."""
+        self._closing = True
+        if self._task:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                if self._closing:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if len(self._pending) < self.batch_size and not self._closing:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            try:
+                await self._flush_batch()
+            except Exception:
+                # Keep flushing: with this task gone, put() would block for
+                # good once the buffer filled up
+                logger.exception("Write-behind flush failed unexpectedly, retrying")
+                await asyncio.sleep(self.retry_delay)
+
+    async def _flush_batch(self):
+        keys = list(self._pending)[:self.batch_size]
+        # insert_many adds an _id to the documents it is given, so hand it
+        # copies and keep the buffered versions as the API returns them
+        batch = [dict(self._pending[k][0]) for k in keys]
+        written = []
+        try:
+            await self._collection.insert_many(batch, ordered=False)
+            written = [self._pending[k] for k in keys]
+        except BulkWriteError as e:
+            failed = {err["index"] for err in e.details.get("writeErrors", [])}
+            errors = [err for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY]
+            if errors:
+                logger.error(f"Dropped {len(errors)} buffered writes: {errors[0].get('errmsg')}")
+            written = [self._pending[k] for i, k in enumerate(keys) if i not in failed]
+        except PyMongoError as e:
+            if not self._closing:
+                logger.warning(f"Write-behind flush of {len(batch)} documents failed, retrying: {e}")
+                await asyncio.sleep(self.retry_delay)
+                return
+            logger.error(f"Write-behind flush failed during shutdown, {len(batch)} documents lost: {e}")
+        except Exception:
+            # Not a database error (a document that cannot be encoded, say):
+            # retrying the same batch would fail the same way
+            logger.exception(f"Dropped {len(batch)} buffered writes")
+        for k in keys:
+            del self._pending[k]
+            self._slots.release()
+        if written and self._on_written is not None:
+            try:
+                await self._on_written(written)
+            except Exception:
+                logger.exception(f"Recording {len(written)} written documents failed")